@@ -0,0 +1,230 @@
+# api.py
+"""
+API HTTP (JSON) de recherche et de recommandation de sujets de mémoire
+Même moteur que l'interface Streamlit, sans l'interface : destinée aux autres
+portails de la faculté.
+
+Lancement : python api.py  (API_HOST, API_PORT, API_WORKERS)
+        ou : uvicorn api:app --workers 4
+Chaque worker charge une seule fois ses composants (modèle, index, Gemma 3) au
+démarrage et les partage entre toutes ses requêtes ; le cache des vecteurs sur
+disque est commun à tous les workers. Un seul worker (verrou de fichier dans
+chroma_db) indexe le CSV et surveille ses modifications, les autres lisent l'index.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from utils.local_recommender import LocalRecommender
+from utils.pipeline import RecommendationPipeline
+from utils.resources import create_warmup
+from utils.tracing import get_tracer
+
+Level = Literal["débutant", "intermédiaire", "avancé"]
+
+# Délai maximal d'attente des composants pour les premières requêtes (API_WARMUP_TIMEOUT_S)
+WARMUP_TIMEOUT_S = float(os.getenv("API_WARMUP_TIMEOUT_S", "30"))
+
+_pipeline_lock = threading.Lock()
+
+# ============================================================================
+# SCHÉMAS (validation des requêtes et réponses)
+# ============================================================================
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=3, max_length=500, description="Intérêts de l'étudiant")
+    departements: Optional[List[str]] = Field(None, max_length=10)
+    niveau: Optional[Level] = None
+    n_results: int = Field(5, ge=1, le=20)
+
+class RecommendRequest(BaseModel):
+    query: str = Field(..., min_length=3, max_length=500, description="Intérêts de l'étudiant")
+    student_level: Level = "intermédiaire"
+    departements: Optional[List[str]] = Field(None, max_length=10)
+    n_results: int = Field(4, ge=1, le=10)
+
+class Hit(BaseModel):
+    id: str
+    score: float
+    titre: str
+    resume: str
+    departement: str
+    niveau: str
+
+class SearchResponse(BaseModel):
+    hits: List[Hit]
+    took_ms: float
+
+class RecommendResponse(BaseModel):
+    recommendation: str
+    context: List[Dict[str, Any]]
+    local: bool = Field(description="Réponse construite localement (Gemma 3 indisponible ou en secours)")
+    fallback: bool = Field(description="Gemma 3 en échec ou hors délai : réponse de secours")
+    degraded: bool = Field(description="Échéance RECOMMENDATION_SLO_S dépassée")
+    from_cache: bool = Field(description="Réponse servie par le cache sémantique")
+    timings_ms: Dict[str, float] = Field(description="Durée de chaque étape du pipeline")
+    took_ms: float
+
+# ============================================================================
+# COMPOSANTS PARTAGÉS (un jeu par worker)
+# ============================================================================
+@asynccontextmanager
+async def lifespan(app):
+    load_dotenv()
+    # Chargement en arrière-plan : le worker accepte les connexions immédiatement
+    app.state.warmup = create_warmup(os.getenv("GOOGLE_API_KEY"), os.getenv("CSV_PATH")).start()
+    app.state.local = LocalRecommender()
+    app.state.pipeline = None
+    yield
+
+app = FastAPI(
+    title="Assistant de Sujets de Mémoire - FST",
+    description="Recherche sémantique dans les archives et recommandations Gemma 3",
+    lifespan=lifespan,
+)
+
+def _require(*names):
+    """Attend les composants demandés (WARMUP_TIMEOUT_S) ; 503 s'ils ne sont pas prêts"""
+    warmup = app.state.warmup
+    if not warmup.wait(*names, timeout=WARMUP_TIMEOUT_S):
+        failures = {name: error for name, error in warmup.failures().items() if name in names}
+        detail = f"Composants indisponibles: {failures}" if failures else "Initialisation en cours, réessayez"
+        raise HTTPException(status_code=503, detail=detail)
+    return [warmup.result(name) for name in names]
+
+def _recommender():
+    """Gemma 3 si disponible, sinon None (réponse locale construite depuis les archives)"""
+    warmup = app.state.warmup
+    warmup.wait("recommender", timeout=WARMUP_TIMEOUT_S)
+    return warmup.result("recommender") if warmup.is_ready("recommender") else None
+
+def _pipeline(with_llm=False):
+    """Pipeline du worker, construit une seule fois ; Gemma 3 y est rattaché dès qu'il est prêt"""
+    embedding_manager, (collection, corpus) = _require("embeddings", "index")
+    with _pipeline_lock:
+        if app.state.pipeline is None:
+            app.state.pipeline = RecommendationPipeline(embedding_manager, collection, corpus=corpus,
+                                                        local=app.state.local)
+    pipeline = app.state.pipeline
+    if with_llm and pipeline.recommender is None:
+        pipeline.recommender = _recommender()
+    return pipeline
+
+# ============================================================================
+# POINTS D'ACCÈS
+# Fonctions synchrones : FastAPI les exécute dans son pool de threads,
+# la boucle du worker reste libre pendant l'encodage et l'appel à Gemma
+# ============================================================================
+@app.get("/health")
+def health():
+    warmup = app.state.warmup
+    return {
+        'ready': warmup.is_ready("embeddings", "index"),
+        'llm': warmup.is_ready("recommender"),
+        'components': warmup.status(),
+        'cold_start_s': warmup.report()['cold_start_s'],
+        'stages': app.state.pipeline.get_stats() if app.state.pipeline is not None else {},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Latences par étape de ce worker (format texte Prometheus)"""
+    return get_tracer().metrics_text()
+
+@app.post("/search", response_model=SearchResponse)
+def search(request: SearchRequest):
+    pipeline = _pipeline()
+    start = time.perf_counter()
+    with get_tracer().span("request", endpoint="search"):
+        hits = pipeline.retrieve(request.query, request.departements or None, request.niveau, request.n_results)
+    return SearchResponse(hits=[hit.to_dict() for hit in hits], took_ms=(time.perf_counter() - start) * 1000)
+
+def _milliseconds(timings):
+    return {stage: seconds * 1000 for stage, seconds in timings.items()}
+
+@app.post("/recommend", response_model=RecommendResponse)
+def recommend(request: RecommendRequest):
+    pipeline = _pipeline(with_llm=True)
+    with get_tracer().span("request", endpoint="recommend", level=request.student_level):
+        # Échéance RECOMMENDATION_SLO_S mesurée depuis le début du pipeline
+        result = pipeline.run(request.query, request.student_level, request.departements,
+                              n_results=request.n_results)
+    return RecommendResponse(recommendation=result.text, context=result.context, local=result.local,
+                             fallback=result.fallback, degraded=result.degraded, from_cache=result.from_cache,
+                             timings_ms=_milliseconds(result.timings),
+                             took_ms=(time.perf_counter() - result.started_at) * 1000)
+
+def _ndjson(event):
+    return json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+@app.post("/recommend/stream")
+def recommend_stream(request: RecommendRequest):
+    """
+    Réponse en flux NDJSON, une ligne par événement :
+    {"event": "context"} puis des {"event": "delta"} (fragment à ajouter) ou
+    {"event": "replace"} (texte complet à afficher : réponse provisoire, cache,
+    secours, options JSON déjà rendues), et enfin {"event": "done"} avec le texte
+    final et l'objet structuré
+    """
+    pipeline = _pipeline(with_llm=True)
+    result = pipeline.prepare(request.query, request.student_level, request.departements,
+                              n_results=request.n_results)
+
+    def events():
+        yield _ndjson({'event': "context", 'context': result.context})
+        chunks = pipeline.stream(result)
+        shown = None
+        try:
+            for chunk in chunks:
+                stream = result.stream
+                if stream is None:
+                    # Réponse locale (Gemma 3 indisponible) : texte complet d'un bloc
+                    yield _ndjson({'event': "replace", 'text': chunk})
+                elif pipeline.recommender.structured:
+                    # Sortie JSON : on transmet le rendu Markdown des options terminées
+                    if stream.visible != shown:
+                        shown = stream.visible
+                        yield _ndjson({'event': "replace", 'text': shown})
+                else:
+                    event = "replace" if chunk == stream.visible else "delta"
+                    yield _ndjson({'event': event, 'text': chunk})
+        finally:
+            # Client déconnecté : ferme le flux (annule l'appel à Gemma en cours)
+            chunks.close()
+        elapsed = time.perf_counter() - result.started_at
+        # Le flux s'étend sur plusieurs threads du pool : span enregistré a posteriori
+        get_tracer().record("request", elapsed, endpoint="recommend_stream", level=request.student_level)
+        stream = result.stream
+        yield _ndjson({
+            'event': "done",
+            'text': result.text,
+            'data': result.data,
+            'model': stream.model if stream is not None else None,
+            'from_cache': result.from_cache,
+            'degraded': result.degraded,
+            'fallback': result.fallback,
+            'local': result.local,
+            'ttft_ms': stream.ttft * 1000 if stream is not None and stream.ttft is not None else None,
+            'timings_ms': _milliseconds(result.timings),
+            'took_ms': elapsed * 1000,
+        })
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    workers = int(os.getenv("API_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # Un pool de threads de calcul par worker : évite la sursouscription des cœurs
+    os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+    uvicorn.run(
+        "api:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=workers,
+    )
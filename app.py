@@ -8,44 +8,14 @@ import pandas as pd
 import time
 import os
 from dotenv import load_dotenv
-from utils.data_loader import load_subjects
-from utils.embeddings import EmbeddingManager
-from utils.recommender import RecommenderSystem  # Version Gemma 3
-
-from fpdf import FPDF
-from fpdf.enums import XPos, YPos
-
-def create_pdf(recommendation_text, student_name="Étudiant"):
-    # Initialisation (Helvetica remplace Arial par défaut pour éviter les warnings)
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Titre du rapport
-    pdf.set_font("Helvetica", "B", 16)
-    pdf.cell(190, 10, "Rapport d'Orientation Académique - FST", 
-             new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-    pdf.ln(10)
-    
-    # Infos étudiant
-    pdf.set_font("Helvetica", "", 12)
-    pdf.cell(190, 10, f"Destinataire : {student_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.cell(190, 10, f"Date : {time.strftime('%d/%m/%Y')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    pdf.ln(5)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(10)
-    
-    # Contenu de la recommandation
-    pdf.set_font("Helvetica", "", 11)
-    
-    # Nettoyage des caractères spéciaux (latin-1)
-    # Important : latin-1 ne supporte pas tous les emojis, on les remplace par du texte ou on les ignore
-    clean_text = recommendation_text.replace('📘', '').replace('🎯', '-').replace('✅', 'OK').replace('⚙️', '*')
-    clean_text = clean_text.encode('latin-1', 'ignore').decode('latin-1')
-    
-    pdf.multi_cell(0, 8, clean_text)
-    
-    # Sortie en bytes (La nouvelle syntaxe retire le paramètre 'dest')
-    return pdf.output()
+from utils.data_loader import get_load_stats
+from utils.pipeline import RecommendationPipeline
+from utils.resources import create_warmup
+from utils.local_recommender import LocalRecommender
+from utils.structured_output import render_text, response_header
+from utils.events import PipelineEvents
+from utils.tracing import get_tracer, start_metrics_server
+from utils.pdf_export import get_pdf_renderer
 
 # Configuration de la page
 st.set_page_config(
@@ -233,100 +203,67 @@ if 'api_initialized' not in st.session_state:
 # ============================================================================
 @st.cache_resource
 def initialize_system():
-    """Initialise le système de recommandation avec Google Gemma 3"""
-    with st.spinner("🔄 Initialisation du système intelligent..."):
-        try:
-            # 1. Gestion hybride de la clé API (Local .env vs Streamlit Cloud Secrets)
-            load_dotenv() # Tente de charger le .env local
-            
-            # On cherche dans st.secrets (Cloud) puis dans os.getenv (.env local)
-            api_key = st.secrets.get("GOOGLE_API_KEY") or os.getenv("GOOGLE_API_KEY")
-            
-            if not api_key:
-                st.error("""
-                ❌ Clé API Google non trouvée !
-                
-                **En local :** Vérifiez votre fichier `.env`.
-                **Sur le Cloud :** Ajoutez `GOOGLE_API_KEY` dans les Secrets de votre application.
-                """)
-                return None, None, None, None
-            
-            # 2. Chargement des données (CSV)
-            # Utilise un chemin relatif robuste
-            csv_path = os.path.join(os.path.dirname(__file__), "data/sujets_memoires.csv")
-            df = load_subjects(csv_path)
-            
-            if df.empty:
-                st.error("❌ Base de données des sujets vide ou introuvable.")
-                return None, None, None, None
-            
-            # 3. Initialisation des composants NLP
-            embedding_manager = EmbeddingManager()
-            
-            # Préparation des données pour ChromaDB
-            texts = df['texte_complet'].tolist()
-            metadatas = df[['departement', 'niveau']].to_dict('records')
-            
-            collection = embedding_manager.create_embeddings(
-                texts=texts,
-                metadatas=metadatas
-            )
-            
-            # 4. Initialisation du Recommender avec la clé récupérée
-            recommender = RecommenderSystem(api_key=api_key)
-            
-            st.session_state.api_initialized = True
-            return df, embedding_manager, collection, recommender
-            
-        except Exception as e:
-            st.error(f"❌ Erreur critique lors de l'initialisation : {str(e)}")
-            return None, None, None, None
-
-# Classe de démo fallback
-class DemoRecommender:
-    """Recommandateur de démo en cas d'erreur API"""
-    def generate_recommendations(self, query, context, student_level="intermédiaire"):
-        import random
-        subjects = [
-            "Application web éducative avec Django",
-            "Système de recommandation intelligent avec Python",
-            "Application mobile de gestion avec Flutter",
-            "Analyse de données avec machine learning",
-            "Site e-commerce moderne avec React",
-            "Chatbot conversationnel avec IA",
-            "Système IoT domestique avec Arduino",
-            "Jeu éducatif mobile avec Unity"
-        ]
-        
-        selected = random.sample(subjects, 3)
-        
-        return f"""
-        📘 **RECOMMANDATIONS PERSONNALISÉES** (Mode démo)
-        
-        🎯 **Demande:** {query}
-        📊 **Niveau:** {student_level}
-        ⚠️ **Note:** Mode démo (l'API rencontre des limitations)
-        
-        🔵 **1. {selected[0]}**
-           📍 Département: Génie Informatique
-           🎯 Objectif pédagogique: Développer un projet complet avec les technologies modernes
-           ⚙️ Technologies: Adaptées au niveau {student_level}
-           ✅ Pourquoi ce sujet: Excellente introduction pratique aux concepts fondamentaux
-        
-        🟢 **2. {selected[1]}**
-           📍 Département: Génie Informatique
-           🎯 Objectif pédagogique: Acquérir des compétences en développement logiciel
-           ⚙️ Technologies: Adaptées au niveau {student_level}
-           ✅ Pourquoi ce sujet: Projet concret avec résultats mesurables
-        
-        🟡 **3. {selected[2]}**
-           📍 Département: Génie Informatique
-           🎯 Objectif pédagogique: Maîtriser un domaine spécifique de l'informatique
-           ⚙️ Technologies: Adaptées au niveau {student_level}
-           ✅ Pourquoi ce sujet: Permet de se spécialiser dans un domaine porteur
+    """
+    Lance l'initialisation du système en arrière-plan et retourne immédiatement
+    Chaque composant (corpus, modèle, index, Gemma 3) est chargé dans son propre thread
+    """
+    # 1. Gestion hybride de la clé API (Local .env vs Streamlit Cloud Secrets)
+    load_dotenv() # Tente de charger le .env local
+    
+    # On cherche dans st.secrets (Cloud) puis dans os.getenv (.env local)
+    api_key = st.secrets.get("GOOGLE_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    
+    if not api_key:
+        st.error("""
+        ❌ Clé API Google non trouvée !
         
-        💡 *Pour des recommandations personnalisées avec IA, assurez-vous que l'API Google est configurée correctement.*
-        """
+        **En local :** Vérifiez votre fichier `.env`.
+        **Sur le Cloud :** Ajoutez `GOOGLE_API_KEY` dans les Secrets de votre application.
+        """)
+        return None
+    
+    # Utilise un chemin relatif robuste
+    csv_path = os.path.join(os.path.dirname(__file__), "data/sujets_memoires.csv")
+    
+    # 2-4. Corpus, modèle d'embeddings, index vectoriel et Gemma 3 (un thread chacun)
+    warmup = create_warmup(api_key, csv_path)
+    # 5. Latences par étape : /metrics au format Prometheus (METRICS_PORT)
+    start_metrics_server()
+    return warmup.start()
+
+COMPONENT_LABELS = {
+    "corpus": "📚 Base des sujets",
+    "embeddings": "🧠 Modèle d'embeddings",
+    "index": "🔍 Index vectoriel",
+    "recommender": "🤖 Google Gemma 3",
+}
+
+def get_pipeline():
+    """Pipeline de la session, construit sur les composants chargés (ou le mode démo)"""
+    if st.session_state.get('pipeline') is None:
+        st.session_state.pipeline = RecommendationPipeline(
+            embedding_manager=st.session_state.get('embedding_manager'),
+            collection=st.session_state.get('collection'),
+            corpus=st.session_state.get('corpus'),
+            df=st.session_state.get('df'),
+            recommender=st.session_state.get('recommender')
+        )
+    return st.session_state.pipeline
+
+@st.fragment(run_every=0.5)
+def show_warmup_status(warmup):
+    """Affiche l'état de chaque composant pendant le chargement en arrière-plan"""
+    for name, info in warmup.status().items():
+        icon = {"prêt": "✅", "échec": "❌"}.get(info['state'], "⏳")
+        duration = f" ({info['seconds']:.1f}s)" if info['seconds'] is not None else ""
+        st.markdown(f"{icon} {COMPONENT_LABELS.get(name, name)} : *{info['state']}*{duration}")
+    
+    report = warmup.report()
+    st.caption(f"⏱️ Démarrage : {report['cold_start_s']:.1f}s (budget {report['budget_s']:.0f}s)")
+    
+    if warmup.is_done():
+        # Tous les composants sont chargés : réexécution complète de la page
+        st.rerun()
 
 # ============================================================================
 # INTERFACE PRINCIPALE
@@ -385,44 +322,86 @@ with st.sidebar:
         4. Propose un accompagnement complet
         """)
         
+        load_stats = get_load_stats()
+        if load_stats.get('rows'):
+            st.caption(f"📚 {load_stats['rows']} sujets chargés ({load_stats['source']}) en {load_stats['load_time_s'] * 1000:.0f} ms")
+        if st.session_state.get('embedding_manager'):
+            query_stats = st.session_state.embedding_manager.get_query_cache_stats()
+            st.caption(f"⚡ Cache des requêtes : {query_stats['hits']} hits / {query_stats['misses']} misses")
+        if st.session_state.get('recommender') and hasattr(st.session_state.recommender, 'get_cache_stats'):
+            response_stats = st.session_state.recommender.get_cache_stats()
+            st.caption(f"🧠 Cache des réponses : {response_stats['hit_rate']:.0%} de hits, {response_stats['saved_latency_s']:.0f}s économisées")
+            quota_stats = st.session_state.recommender.get_quota_stats()
+            st.caption(f"📊 Quota Gemma : {quota_stats['requests']} requêtes, {quota_stats['tokens']} tokens, {quota_stats['rate_limited']} refus 429")
+            resilience_stats = quota_stats['resilience']
+            st.caption(f"🛡️ Relances : {resilience_stats['retries']} • doublées : {resilience_stats['hedged']} • secours : {resilience_stats['fallbacks']} • circuit {resilience_stats['circuit']}")
+            cascade = st.session_state.recommender.get_cascade_stats()
+            st.caption("🪜 Cascade : " + " → ".join(
+                f"{name} ({stats['passed']}/{stats['calls']} acceptées)" for name, stats in cascade.items()
+            ))
+            structured_stats = st.session_state.recommender.get_structured_stats()
+            if structured_stats['enabled']:
+                st.caption(f"🧩 Sortie JSON : {structured_stats['responses']} réponses, {structured_stats['early_stops']} arrêts anticipés, {structured_stats['parse_failures']} JSON invalides")
+            flight_stats = st.session_state.recommender.get_flight_stats()
+            st.caption(f"🔗 Requêtes regroupées : {flight_stats['coalesced']} • facteur {flight_stats['fan_out']:.1f}")
+        
+        # Latences par étape (p50/p95/p99), détail complet sur /metrics
+        stage_stats = get_tracer().get_stats()
+        if stage_stats:
+            with st.expander("⏱️ Latences par étape", expanded=False):
+                for (stage, backend), stats in sorted(stage_stats.items()):
+                    label = f"{stage} ({backend})" if backend else stage
+                    st.caption(f"{label} : p50 {stats['p50'] * 1000:.0f} ms • p95 {stats['p95'] * 1000:.0f} ms • p99 {stats['p99'] * 1000:.0f} ms • n={stats['count']}")
+                # Étapes du pipeline de la session (filtres, recherche, contexte, génération)
+                if st.session_state.get('pipeline'):
+                    for stage, stats in st.session_state.pipeline.get_stats().items():
+                        if stats['count']:
+                            st.caption(f"pipeline · {stage} : p50 {stats['p50'] * 1000:.0f} ms • p95 {stats['p95'] * 1000:.0f} ms • n={stats['count']}")
+
     if st.button("🔄 Réinitialiser", use_container_width=True):
         for key in list(st.session_state.keys()):
             if key not in ['initialized', 'api_initialized']:
                 del st.session_state[key]
         st.rerun()
 
-# Initialisation automatique
+# Initialisation automatique (en arrière-plan, l'interface reste utilisable)
 if not st.session_state.initialized:
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col2:
-        st.markdown("""
-        <div class="card" style="text-align: center;">
-            <h3>👋 Bienvenue dans l'Assistant IA !</h3>
-            <p>Je suis votre conseiller académique intelligent.</p>
-            <p>Je vais vous aider à trouver le sujet de mémoire parfait.</p>
-            <div style="margin: 1.5rem 0;">
-                <div class="ai-badge" style="margin: 0.5rem;">Google Gemma 3</div>
-                <div class="ai-badge" style="background: linear-gradient(135deg, #3B82F6, #1D4ED8); margin: 0.5rem;">IA Gratuite</div>
-                <div class="ai-badge" style="background: linear-gradient(135deg, #10B981, #059669); margin: 0.5rem;">Français</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    system = initialize_system()
     
-    # Initialiser le système
-    with st.spinner("🚀 Initialisation du moteur IA..."):
-        system_data = initialize_system()
-    
-    if system_data[0] is not None:
-        df, embedding_manager, collection, recommender = system_data
+    if system is not None and system.is_ready():
+        df = system.result("corpus")
+        collection, corpus = system.result("index")
         st.session_state.df = df
-        st.session_state.embedding_manager = embedding_manager
+        st.session_state.corpus = corpus
+        st.session_state.embedding_manager = system.result("embeddings")
         st.session_state.collection = collection
-        st.session_state.recommender = recommender
+        st.session_state.recommender = system.result("recommender")
         st.session_state.initialized = True
+        st.session_state.api_initialized = True
         st.success("✅ Système initialisé avec succès !")
-        time.sleep(1)
-        st.rerun()
+    elif system is not None and not system.failures():
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            st.markdown("""
+            <div class="card" style="text-align: center;">
+                <h3>👋 Bienvenue dans l'Assistant IA !</h3>
+                <p>Je suis votre conseiller académique intelligent.</p>
+                <p>Je vais vous aider à trouver le sujet de mémoire parfait.</p>
+                <div style="margin: 1.5rem 0;">
+                    <div class="ai-badge" style="margin: 0.5rem;">Google Gemma 3</div>
+                    <div class="ai-badge" style="background: linear-gradient(135deg, #3B82F6, #1D4ED8); margin: 0.5rem;">IA Gratuite</div>
+                    <div class="ai-badge" style="background: linear-gradient(135deg, #10B981, #059669); margin: 0.5rem;">Français</div>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # État du moteur IA, rafraîchi pendant le chargement
+            show_warmup_status(system)
     else:
+        if system is not None:
+            for name, error in system.failures().items():
+                st.warning(f"{COMPONENT_LABELS.get(name, name)} : {error}")
+        
         st.error("""
         ❌ Échec de l'initialisation
         
@@ -436,7 +415,8 @@ if not st.session_state.initialized:
         if st.button("🎮 Activer le mode démonstration", type="secondary"):
             st.session_state.initialized = True
             st.session_state.demo_mode = True
-            st.session_state.recommender = DemoRecommender()
+            # Propositions construites localement à partir des archives, sans IA
+            st.session_state.recommender = LocalRecommender()
             st.session_state.df = pd.DataFrame({
                 'titre': ['Sujet démo 1', 'Sujet démo 2'],
                 'departement': ['Génie Informatique'],
@@ -496,115 +476,76 @@ with col2:
         "🚀 Générer mes recommandations IA",
         type="primary",
         use_container_width=True,
-        disabled=not user_query.strip()
+        disabled=not user_query.strip() or not st.session_state.initialized
     )
 
 # ============================================================================
 # TRAITEMENT ET AFFICHAGE DES RÉSULTATS
 # ============================================================================
 
+# Progression affichée pour chaque étape réelle du pipeline
+STAGE_PROGRESS = {
+    "embedding": (15, "🔍 Analyse de votre demande..."),
+    "search": (35, "🤖 Consultation de la base de connaissances..."),
+    "hydration": (50, "📚 Sujets de référence identifiés..."),
+    "prompt": (60, "🎯 Génération des recommandations..."),
+    "first_token": (80, "✍️ Rédaction en cours..."),
+    "escalation": (85, "🔁 Réponse incomplète, passage au modèle supérieur..."),
+    "done": (100, "✨ Recommandations prêtes !"),
+}
+
 if generate_btn and user_query.strip():
-    with st.spinner("🧠 L'IA analyse votre demande..."):
+    # Span racine : toutes les étapes de la requête y sont rattachées (traces JSONL)
+    with st.spinner("🧠 L'IA analyse votre demande..."), get_tracer().span("request", level=st.session_state.student_level):
+        context_docs = []
         try:
-            # Préparer la recherche
-            if hasattr(st.session_state, 'df'):
-                # Filtrer par départements
-                if st.session_state.selected_departments and "Tous départements" not in st.session_state.selected_departments:
-                    filtered_df = st.session_state.df[
-                        st.session_state.df['departement'].isin(st.session_state.selected_departments)
-                    ]
-                else:
-                    filtered_df = st.session_state.df
-                
-                # Recherche sémantique
-                results = st.session_state.embedding_manager.search_similar(
-                    query=user_query,
-                    collection=st.session_state.collection,
-                    n_results=6,
-                    filters={"niveau": st.session_state.student_level} if st.session_state.student_level != "intermédiaire" else None
-                )
-                
-                # Préparer le contexte
-                context_docs = []
-                if results and results['documents']:
-                    for i in range(min(4, len(results['documents'][0]))):
-                        doc_text = results['documents'][0][i]
-                        # Chercher correspondance dans les données
-                        match_found = False
-                        for _, row in filtered_df.iterrows():
-                            if row['texte_complet'] in doc_text:
-                                context_docs.append({
-                                    'titre': row['titre'],
-                                    'resume': row.get('resume', ''),
-                                    'departement': row['departement'],
-                                    'niveau': row['niveau']
-                                })
-                                match_found = True
-                                break
-                        
-                        # Si pas de correspondance exacte, utiliser le texte brut
-                        if not match_found and i < 3:
-                            context_docs.append({
-                                'titre': f"Sujet référence {i+1}",
-                                'resume': doc_text[:200] + "...",
-                                'departement': "Génie Informatique",
-                                'niveau': st.session_state.student_level
-                            })
-                
-                # Si pas assez de résultats, prendre des sujets aléatoires
-                if len(context_docs) < 2:
-                    context_docs = filtered_df.sample(min(3, len(filtered_df))).to_dict('records')
-            
-            else:
-                # Mode sans données
-                context_docs = [
-                    {
-                        'titre': 'Projets académiques références',
-                        'departement': 'Génie Informatique',
-                        'niveau': st.session_state.student_level
-                    }
-                ]
-            
-            # Barre de progression
+            # Barre de progression pilotée par les événements du pipeline
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            for i in range(100):
-                progress_bar.progress(i + 1)
-                if i < 30:
-                    status_text.text("🔍 Analyse de votre demande...")
-                elif i < 60:
-                    status_text.text("🤖 Consultation de la base de connaissances...")
-                elif i < 90:
-                    status_text.text("🎯 Génération des recommandations...")
-                else:
-                    status_text.text("✅ Finalisation...")
-                time.sleep(0.02)
+            def on_stage(event):
+                percent, label = STAGE_PROGRESS.get(event['stage'], (None, None))
+                if event.get('degraded'):
+                    label = "⏱️ Propositions provisoires affichées, la réponse de l'IA arrive..."
+                if percent is not None:
+                    progress_bar.progress(percent)
+                    status_text.text(label)
             
-            status_text.text("✨ Recommandations prêtes !")
-            time.sleep(0.5)
+            events = PipelineEvents().subscribe(on_stage)
+            
+            # Filtres, recherche sémantique et contexte (complété par un tirage du corpus
+            # filtré si la recherche retourne trop peu de sujets)
+            pipeline = get_pipeline()
+            result = pipeline.prepare(
+                user_query,
+                student_level=st.session_state.student_level,
+                departements=st.session_state.selected_departments,
+                events=events
+            )
+            context_docs = result.context
             
             # Générer les recommandations
             start_time = time.time()
             
-            if hasattr(st.session_state, 'recommender'):
-                recommendations = st.session_state.recommender.generate_recommendations(
-                    query=user_query,
-                    context=context_docs,
-                    student_level=st.session_state.student_level
-                )
-            else:
-                # Mode démo
-                recommendations = DemoRecommender().generate_recommendations(
-                    query=user_query,
-                    context=context_docs,
-                    student_level=st.session_state.student_level
-                )
+            # Génération en flux : le texte s'affiche au fil de sa réception
+            stream_placeholder = st.empty()
+            for _ in pipeline.stream(result, events):
+                # visible : réponse provisoire locale (échéance dépassée) puis texte du LLM
+                if result.stream is not None:
+                    stream_placeholder.markdown(result.stream.visible + "▌")
+            stream_placeholder.empty()
+            recommendations = result.text
+            recommendation_data = result.data
+            first_token_time = result.stream.ttft if result.stream is not None else None
             
             generation_time = time.time() - start_time
+            if not events.events or events.events[-1]['stage'] != "done":
+                events.emit("done")
             
             # Stocker les résultats
             st.session_state.recommendations = recommendations
+            # Forme structurée (mode JSON) : sert à l'export PDF
+            st.session_state.recommendation_data = recommendation_data
             st.session_state.generation_time = generation_time
             st.session_state.user_query = user_query
             st.session_state.context_used = context_docs
@@ -612,19 +553,23 @@ if generate_btn and user_query.strip():
             progress_bar.empty()
             status_text.empty()
             
-            st.success(f"✅ Recommandations générées en {generation_time:.1f} secondes")
+            if first_token_time is not None:
+                st.success(f"✅ Recommandations générées en {generation_time:.1f} secondes (premier fragment après {first_token_time:.1f} s)")
+            else:
+                st.success(f"✅ Recommandations générées en {generation_time:.1f} secondes")
             st.balloons()
             
         except Exception as e:
             st.error(f"❌ Erreur lors de la génération: {str(e)}")
             
-            # Fallback vers le mode démo
+            # Secours local : propositions tirées des sujets déjà retrouvés
             st.info("🔄 Activation du mode de secours...")
-            st.session_state.recommendations = DemoRecommender().generate_recommendations(
+            st.session_state.recommendations = LocalRecommender().generate_recommendations(
                 query=user_query,
-                context=[],
+                context=context_docs,
                 student_level=st.session_state.student_level
             )
+            st.session_state.recommendation_data = None
             st.session_state.user_query = user_query
 
 # --- BLOC D'AFFICHAGE DES RÉSULTATS ---
@@ -668,17 +613,29 @@ if st.session_state.get('recommendations'):
     # 1. BOUTON PDF (Logique Réelle)
     with col_export1:
         try:
-            # On utilise la fonction create_pdf définie plus tôt
-            # Note : Assure-toi que la fonction create_pdf est bien dans ton code
-            pdf_bytes = create_pdf(st.session_state.recommendations, st.session_state.get('user_name', 'Étudiant FST'))
-            
-            st.download_button(
-                label="📄 Télécharger en PDF",
-                data=pdf_bytes,
-                file_name=f"Rapport_Orientation_{pd.Timestamp.now().strftime('%Y%m%d')}.pdf",
-                mime="application/pdf",
-                use_container_width=True
-            )
+            # Réponse structurée : rendu texte dédié, sinon le Markdown tel quel
+            data = st.session_state.get('recommendation_data')
+            text = st.session_state.recommendations
+            pdf_source = render_text(data, response_header(text)) if data else text
+            student_name = st.session_state.get('user_name', 'Étudiant FST')
+
+            # Rendu en arrière-plan, mis en cache par empreinte du contenu :
+            # les réexécutions suivantes réutilisent le même PDF
+            renderer = get_pdf_renderer()
+            renderer.prefetch(pdf_source, student_name)
+            pdf_bytes = renderer.get(pdf_source, student_name)
+            if pdf_bytes is None and st.button("📄 Préparer le PDF", use_container_width=True):
+                with st.spinner("Mise en page du PDF..."):
+                    pdf_bytes = renderer.render(pdf_source, student_name, timeout=30)
+
+            if pdf_bytes is not None:
+                st.download_button(
+                    label="📄 Télécharger en PDF",
+                    data=pdf_bytes,
+                    file_name=f"Rapport_Orientation_{pd.Timestamp.now().strftime('%Y%m%d')}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True
+                )
         except Exception as e:
             st.error("Erreur génération PDF")
 
@@ -718,7 +675,8 @@ if st.session_state.get('recommendations'):
             fav = {
                 "date": pd.Timestamp.now().strftime('%d/%m/%Y'),
                 "query": st.session_state.user_query,
-                "content": st.session_state.recommendations
+                "content": st.session_state.recommendations,
+                "data": st.session_state.get('recommendation_data')
             }
             st.session_state.favorites.append(fav)
             st.success("✅ Ajouté à votre profil !")
@@ -0,0 +1,289 @@
+# batch.py
+"""
+Recommandations pour toute une promotion, en ligne de commande
+
+    python batch.py promotion.csv --output rapports --workers 4
+
+Le CSV contient une ligne par étudiant : etudiant, requete, niveau, departements
+(départements séparés par « ; »). La recherche est faite par lots vectorisés, puis
+les appels à Gemma 3 sont répartis sur un pool borné de workers ; les quotas du
+client (GEMMA_RPM, GEMMA_TPM) cadencent les appels. Chaque étudiant terminé est
+consigné dans checkpoint.jsonl : une relance reprend là où le traitement s'est arrêté.
+Les réponses de secours (Gemma 3 indisponible, en échec ou hors délai) sont écrites
+mais pas consignées : la relance suivante les retente.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from dotenv import load_dotenv
+from utils.pdf_export import create_pdf
+from utils.pipeline import RecommendationPipeline
+from utils.resources import create_warmup
+from utils.structured_output import render_text, response_header
+
+LEVELS = ("débutant", "intermédiaire", "avancé")
+
+# Noms de colonnes acceptés (français ou anglais)
+COLUMN_ALIASES = {
+    'etudiant': ("etudiant", "étudiant", "student", "nom", "name"),
+    'requete': ("requete", "requête", "query", "interets", "intérêts"),
+    'niveau': ("niveau", "level"),
+    'departements': ("departements", "départements", "departments"),
+}
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+SUMMARY_FILE = "summary.json"
+
+def read_cohort(path):
+    """Lit le CSV de la promotion ; retourne une liste de dicts (etudiant, requete, niveau, departements)"""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    columns = {column.strip().lower(): column for column in df.columns}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in columns:
+                mapping[field] = columns[alias]
+                break
+    if 'requete' not in mapping:
+        raise ValueError(f"Colonne de requête introuvable dans {path} (attendu : {', '.join(COLUMN_ALIASES['requete'])})")
+
+    students = []
+    for row, record in enumerate(df.to_dict('records'), 1):
+        query = record[mapping['requete']].strip()
+        if not query:
+            print(f"⚠️ Ligne {row} ignorée : requête vide")
+            continue
+        level = record.get(mapping.get('niveau'), "").strip().lower() or "intermédiaire"
+        if level not in LEVELS:
+            print(f"⚠️ Ligne {row} : niveau inconnu « {level} », intermédiaire utilisé")
+            level = "intermédiaire"
+        departements = [d.strip() for d in re.split(r"[;|]", record.get(mapping.get('departements'), "")) if d.strip()]
+        students.append({
+            'row': row,
+            'etudiant': record.get(mapping.get('etudiant'), "").strip() or f"Étudiant {row}",
+            'requete': query,
+            'niveau': level,
+            'departements': departements,
+        })
+    return students
+
+def student_key(student):
+    """Empreinte de la demande : une ligne modifiée dans le CSV est recalculée à la reprise"""
+    payload = json.dumps([student['etudiant'], student['requete'], student['niveau'], student['departements']],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def slugify(text, max_length=40):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:max_length] or "etudiant"
+
+def _write_atomic(path, content):
+    """Écrit dans un fichier temporaire puis le renomme (pas de fichier tronqué après une interruption)"""
+    tmp_path = f"{path}.tmp"
+    mode = "wb" if isinstance(content, (bytes, bytearray)) else "w"
+    with open(tmp_path, mode, **({} if mode == "wb" else {'encoding': "utf-8"})) as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+class Checkpoint:
+    """Journal JSONL des étudiants terminés (ajout seul, une ligne par étudiant)"""
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "rb+") as f:
+                content = f.read()
+                complete = content.rfind(b"\n") + 1
+                if complete < len(content):
+                    # Dernière ligne tronquée par une interruption : retirée avant les ajouts suivants
+                    f.truncate(complete)
+            for line in content[:complete].decode("utf-8", errors="replace").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # ligne illisible
+                if entry.get('local') or entry.get('fallback'):
+                    continue  # réponse de secours d'un journal antérieur : à retenter
+                self.done[entry['key']] = entry
+
+    def record(self, entry):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done[entry['key']] = entry
+
+def process_student(pipeline, result, student, output_dir, pdf=True):
+    """Génère la recommandation d'un étudiant et écrit ses fichiers ; retourne l'entrée du journal"""
+    # Échéance comptée depuis la prise en charge par un worker, pas depuis la recherche par lot
+    result.started_at = time.perf_counter()
+    pipeline.generate(result)
+
+    base = os.path.join(output_dir, f"{student['row']:04d}_{slugify(student['etudiant'])}")
+    header = f"# Rapport d'orientation : {student['etudiant']}\n\n"
+    _write_atomic(f"{base}.md", header + result.text)
+    files = [f"{base}.md"]
+    if pdf:
+        source = render_text(result.data, response_header(result.text)) if result.data else result.text
+        _write_atomic(f"{base}.pdf", create_pdf(source, student['etudiant']))
+        files.append(f"{base}.pdf")
+
+    return {
+        'key': student['key'],
+        'row': student['row'],
+        'etudiant': student['etudiant'],
+        'files': files,
+        'local': result.local,
+        'fallback': result.fallback,
+        'degraded': result.degraded,
+        'seconds': round(sum(result.timings.values()), 3),
+    }
+
+def _format_stage(stage, stats):
+    if not stats['count']:
+        return None
+    return f"   {stage:<11} p50 {stats['p50'] * 1000:8.1f} ms • p95 {stats['p95'] * 1000:8.1f} ms • n={stats['count']}"
+
+def _write_summary(output_dir, summary):
+    _write_atomic(os.path.join(output_dir, SUMMARY_FILE),
+                  json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+
+def run_batch(cohort_path, output_dir="rapports", workers=4, pdf=True, resume=True, slo=None):
+    """Traite toute la promotion ; retourne le résumé (dict), également écrit dans summary.json"""
+    load_dotenv()
+    os.makedirs(output_dir, exist_ok=True)
+    students = read_cohort(cohort_path)
+    for student in students:
+        student['key'] = student_key(student)
+
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = [student for student in students if student['key'] not in checkpoint.done]
+    print(f"📋 {len(students)} étudiants, {len(students) - len(pending)} déjà traités, {len(pending)} à traiter")
+
+    summary = {
+        'students': len(students),
+        'skipped': len(students) - len(pending),
+        'completed': 0,
+        'retryable': 0,   # réponses de secours écrites, non consignées (retentées à la relance)
+        'failed': 0,
+        'local': 0,
+        'fallback': 0,
+        'degraded': 0,
+    }
+    if not pending:
+        # Promotion déjà traitée : le résumé reflète tout de même cette relance
+        summary.update({'elapsed_s': 0, 'retrieval_s': 0, 'students_per_minute': None, 'workers': workers,
+                        'stages': {}, 'quota': None})
+        _write_summary(output_dir, summary)
+        return summary
+
+    # Composants : échéance longue, un lot peut attendre son tour dans les quotas
+    warmup = create_warmup(os.getenv("GOOGLE_API_KEY"), os.getenv("CSV_PATH"),
+                           slo=slo or float(os.getenv("BATCH_SLO_S", "300"))).start()
+    if not warmup.wait("embeddings", "index"):
+        raise RuntimeError(f"Initialisation impossible : {warmup.failures()}")
+    collection, corpus = warmup.result("index")
+    recommender = warmup.result("recommender") if warmup.wait("recommender") else None
+    if recommender is None:
+        print("⚠️ Gemma 3 indisponible : propositions construites localement à partir des archives")
+    pipeline = RecommendationPipeline(warmup.result("embeddings"), collection, corpus=corpus,
+                                      recommender=recommender)
+
+    start = time.perf_counter()
+    # 1. Recherche vectorisée : un lot par combinaison de filtres
+    results = pipeline.prepare_many([(s['requete'], s['niveau'], s['departements']) for s in pending])
+    retrieval_s = time.perf_counter() - start
+    print(f"🔍 Recherche par lot : {len(pending)} requêtes en {retrieval_s:.2f}s")
+
+    # 2. Génération répartie sur un pool borné (les quotas du client cadencent les appels)
+    # Pool géré sans « with » : une interruption n'attend pas les étudiants encore en file
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    futures = {
+        executor.submit(process_student, pipeline, result, student, output_dir, pdf): student
+        for result, student in zip(results, pending)
+    }
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            student = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                summary['failed'] += 1
+                print(f"❌ [{done}/{len(pending)}] {student['etudiant']} : {e}")
+                continue
+            for flag in ('local', 'fallback', 'degraded'):
+                summary[flag] += entry[flag]
+            if entry['local'] or entry['fallback']:
+                # Réponse de secours : rapport écrit, mais retenté à la prochaine relance
+                summary['retryable'] += 1
+                print(f"⚠️ [{done}/{len(pending)}] {student['etudiant']} : réponse de secours ({entry['seconds']:.1f}s)")
+                continue
+            checkpoint.record(entry)
+            summary['completed'] += 1
+            print(f"✅ [{done}/{len(pending)}] {student['etudiant']} ({entry['seconds']:.1f}s)")
+    except KeyboardInterrupt:
+        # Les étudiants terminés sont déjà consignés : la relance reprendra ici
+        print("⏹️ Interruption : relancez la même commande pour reprendre")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    summary.update({
+        'elapsed_s': round(elapsed, 2),
+        'retrieval_s': round(retrieval_s, 3),
+        'students_per_minute': round((summary['completed'] + summary['retryable']) / elapsed * 60, 2) if elapsed else None,
+        'workers': workers,
+        'stages': pipeline.get_stats(),
+        'quota': recommender.get_quota_stats() if recommender is not None else None,
+    })
+    _write_summary(output_dir, summary)
+
+    print(f"\n📊 {summary['completed']} rapports consignés en {elapsed:.1f}s "
+          f"({summary['students_per_minute']} étudiants/min, {workers} workers)")
+    print(f"   {summary['failed']} échecs • {summary['retryable']} réponses de secours à retenter "
+          f"({summary['local']} locales, {summary['degraded']} hors délai) • {summary['skipped']} repris du journal")
+    for stage, stats in summary['stages'].items():
+        line = _format_stage(stage, stats)
+        if line:
+            print(line)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommandations de sujets de mémoire pour une promotion")
+    parser.add_argument("cohort", help="CSV : etudiant, requete, niveau, departements (séparés par ;)")
+    parser.add_argument("-o", "--output", default="rapports", help="dossier des rapports (défaut : rapports)")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.getenv("BATCH_WORKERS", "4")),
+                        help="appels Gemma simultanés (défaut : BATCH_WORKERS ou 4)")
+    parser.add_argument("--no-pdf", action="store_true", help="rapports Markdown uniquement")
+    parser.add_argument("--restart", action="store_true", help="ignore le journal et retraite toute la promotion")
+    parser.add_argument("--slo", type=float, default=None, help="échéance par étudiant en secondes (défaut : BATCH_SLO_S ou 300)")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = run_batch(args.cohort, args.output, max(1, args.workers), pdf=not args.no_pdf,
+                            resume=not args.restart, slo=args.slo)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"❌ {e}")
+        return 1
+    # Échecs ou réponses de secours : une relance reste nécessaire
+    return 1 if summary['failed'] or summary['retryable'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
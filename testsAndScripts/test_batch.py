@@ -0,0 +1,141 @@
+"""
+Tests de la reprise du mode batch (batch.py) : journal, étudiants à traiter, --restart
+Composants factices : aucun modèle ni appel à Gemma
+Lancement : python -m pytest testsAndScripts/test_batch.py
+        ou : python testsAndScripts/test_batch.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch
+from utils.recommender import RecommendationStream
+
+COHORT = """etudiant,requete,niveau,departements
+Ana,détection d'intrusions réseau,avancé,Génie Informatique
+Bob,énergie solaire,débutant,
+Cyd,irrigation connectée,,Génie Civil
+"""
+
+class StubRecommender:
+    """Réponse de secours pour les requêtes listées dans failing, réponse du LLM sinon"""
+    structured = False
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def stream_recommendations(self, **kwargs):
+        raise NotImplementedError
+
+    def generate_result(self, query, **kwargs):
+        self.calls.append(query)
+        outcome = RecommendationStream()
+        outcome.text = f"# Propositions pour {query}"
+        outcome.fallback = outcome.degraded = query in self.failing
+        return outcome
+
+    def get_quota_stats(self):
+        return {}
+
+class StubWarmup:
+    def __init__(self, recommender):
+        self.recommender = recommender
+
+    def start(self):
+        return self
+
+    def wait(self, *names, timeout=None):
+        return True
+
+    def failures(self):
+        return {}
+
+    def result(self, name):
+        return {'embeddings': None, 'index': (None, None), 'recommender': self.recommender}[name]
+
+def run(directory, recommender, restart=False):
+    batch.create_warmup = lambda *args, **kwargs: StubWarmup(recommender)
+    return batch.run_batch(os.path.join(directory, "promotion.csv"), os.path.join(directory, "rapports"),
+                           workers=2, pdf=False, resume=not restart)
+
+def make_cohort(directory):
+    with open(os.path.join(directory, "promotion.csv"), "w", encoding="utf-8") as f:
+        f.write(COHORT)
+
+def read_summary(directory):
+    with open(os.path.join(directory, "rapports", batch.SUMMARY_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+def test_checkpoint_ignores_truncated_line_and_fallback_entries():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, batch.CHECKPOINT_FILE)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({'key': "a", 'local': False, 'fallback': False}) + "\n")
+            f.write(json.dumps({'key': "b", 'local': True}) + "\n")       # journal antérieur
+            f.write(json.dumps({'key': "c", 'fallback': True}) + "\n")
+            f.write('{"key": "d", "loc')                                  # interruption
+        checkpoint = batch.Checkpoint(path)
+        assert set(checkpoint.done) == {"a"}
+
+        checkpoint.record({'key': "e", 'local': False, 'fallback': False})
+        assert set(batch.Checkpoint(path).done) == {"a", "e"}
+        with open(path, encoding="utf-8") as f:
+            assert '"d"' not in f.read()
+
+def test_resume_retries_only_fallback_answers():
+    with tempfile.TemporaryDirectory() as directory:
+        make_cohort(directory)
+        first = StubRecommender(failing={"énergie solaire"})
+        summary = run(directory, first)
+        assert (summary['completed'], summary['retryable'], summary['fallback'], summary['degraded']) == (2, 1, 1, 1)
+        assert len(first.calls) == 3
+        # Le rapport de secours est écrit, mais pas consigné
+        reports = sorted(os.listdir(os.path.join(directory, "rapports")))
+        assert reports == ["0001_Ana.md", "0002_Bob.md", "0003_Cyd.md", "checkpoint.jsonl", "summary.json"]
+
+        second = StubRecommender()
+        summary = run(directory, second)
+        assert second.calls == ["énergie solaire"]
+        assert (summary['skipped'], summary['completed'], summary['retryable']) == (2, 1, 0)
+
+def test_summary_written_when_nothing_is_pending():
+    with tempfile.TemporaryDirectory() as directory:
+        make_cohort(directory)
+        run(directory, StubRecommender())
+        os.remove(os.path.join(directory, "rapports", batch.SUMMARY_FILE))
+
+        recommender = StubRecommender()
+        summary = run(directory, recommender)
+        assert recommender.calls == []
+        assert read_summary(directory) == summary
+        assert (summary['skipped'], summary['completed'], summary['elapsed_s']) == (3, 0, 0)
+
+def test_restart_ignores_checkpoint():
+    with tempfile.TemporaryDirectory() as directory:
+        make_cohort(directory)
+        run(directory, StubRecommender())
+        recommender = StubRecommender()
+        summary = run(directory, recommender, restart=True)
+        assert len(recommender.calls) == 3
+        assert (summary['skipped'], summary['completed']) == (0, 3)
+
+def test_edited_row_is_processed_again():
+    with tempfile.TemporaryDirectory() as directory:
+        make_cohort(directory)
+        run(directory, StubRecommender())
+        with open(os.path.join(directory, "promotion.csv"), "w", encoding="utf-8") as f:
+            f.write(COHORT.replace("irrigation connectée", "irrigation goutte à goutte"))
+        recommender = StubRecommender()
+        run(directory, recommender)
+        assert recommender.calls == ["irrigation goutte à goutte"]
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
@@ -0,0 +1,96 @@
+"""
+Tests de la synchronisation incrémentale de l'index (utils/ingestion.py)
+Encodeur factice et backend NumPy : aucun modèle chargé
+Lancement : python -m pytest testsAndScripts/test_ingestion.py
+        ou : python testsAndScripts/test_ingestion.py
+"""
+import csv
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_loader import subject_id
+from utils.ingestion import IngestionPipeline
+from utils.vector_backends import NumpyBackend
+
+SUBJECTS = [
+    ("Détection d'intrusions réseau", "Apprentissage automatique sur le trafic", "Génie Informatique", "avancé"),
+    ("Gestion de l'énergie photovoltaïque", "Optimisation d'un micro-réseau", "Génie Électrique", "intermédiaire"),
+    ("Suivi des canaux d'irrigation", "Application mobile de suivi", "Génie Civil", "débutant"),
+]
+
+class FakeEmbeddingManager:
+    """Vecteur déterministe dérivé du texte ; compte les textes encodés"""
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[b / 255 for b in hashlib.sha1(t.encode('utf-8')).digest()[:8]] for t in texts],
+                        dtype=np.float32)
+
+def write_csv(path, subjects):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["titre", "resume", "departement", "niveau"])
+        writer.writerows(subjects)
+
+def expected_id(subject):
+    titre, resume, departement, niveau = subject
+    return subject_id(f"Titre: {titre}. Résumé: {resume}. Département: {departement}. Niveau: {niveau}.")
+
+def sync(path, backend):
+    manager = FakeEmbeddingManager()
+    result = IngestionPipeline(manager, backend, chunk_size=2, batch_size=2).sync(path)
+    return result, manager
+
+def test_first_sync_indexes_every_row():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sujets.csv")
+        write_csv(path, SUBJECTS + [SUBJECTS[0]])   # doublon : indexé une seule fois
+        backend = NumpyBackend()
+        result, manager = sync(path, backend)
+        assert (result['added'], result['removed'], result['unchanged']) == (3, 0, 0)
+        assert sorted(backend.list_ids()) == sorted(expected_id(s) for s in SUBJECTS)
+        assert len(manager.encoded) == 3
+
+def test_sync_add_edit_remove():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sujets.csv")
+        write_csv(path, SUBJECTS)
+        backend = NumpyBackend()
+        sync(path, backend)
+
+        edited = (SUBJECTS[1][0], "Stockage par batteries", *SUBJECTS[1][2:])
+        added = ("Cartographie des sols", "Télédétection", "Génie Civil", "avancé")
+        # Ordre des lignes changé : les identifiants de contenu ne dépendent pas de la position
+        current = [added, SUBJECTS[2], edited]
+        write_csv(path, current)
+        result, manager = sync(path, backend)
+
+        assert (result['added'], result['removed'], result['unchanged']) == (2, 2, 1)
+        assert sorted(backend.list_ids()) == sorted(expected_id(s) for s in current)
+        assert len(manager.encoded) == 2          # seules les lignes nouvelles ou modifiées
+        assert backend.count() == 3
+
+def test_sync_without_changes_encodes_nothing():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sujets.csv")
+        write_csv(path, SUBJECTS)
+        backend = NumpyBackend()
+        sync(path, backend)
+        result, manager = sync(path, backend)
+        assert (result['added'], result['removed'], result['unchanged']) == (0, 0, 3)
+        assert manager.encoded == []
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
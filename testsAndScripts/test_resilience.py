@@ -0,0 +1,196 @@
+"""
+Tests du disjoncteur et des relances (utils/resilience.py), sans appel réseau
+Lancement : python -m pytest testsAndScripts/test_resilience.py
+        ou : python testsAndScripts/test_resilience.py
+"""
+import asyncio
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+class ServiceUnavailable(Exception):
+    """Erreur transitoire simulée (même nom que l'exception de l'API Google)"""
+
+def make_caller(**options):
+    options.setdefault('breaker', CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+    return ResilientCaller(max_attempts=1, base_delay=0.0, hedge=False, **options)
+
+def fragments(*texts, fail_after=None):
+    async def stream():
+        for i, text in enumerate(texts):
+            if fail_after == i:
+                raise ServiceUnavailable("503")
+            yield text
+        if fail_after == len(texts):
+            raise ServiceUnavailable("503")
+    return stream
+
+async def consume(caller, factory, limit=None, admit=None):
+    """Lit le flux (limit fragments au plus, puis fermeture anticipée)"""
+    received = []
+    chunks = caller.stream(factory, admit=admit)
+    try:
+        async for text in chunks:
+            received.append(text)
+            if limit is not None and len(received) >= limit:
+                break
+    finally:
+        await chunks.aclose()
+    return received
+
+def test_breaker_opens_then_half_opens_then_closes():
+    async def scenario():
+        caller = make_caller()
+        for _ in range(2):
+            try:
+                await consume(caller, fragments("a", fail_after=0))
+            except ServiceUnavailable:
+                pass
+        assert caller.breaker.state == CircuitBreaker.OPEN
+        try:
+            await consume(caller, fragments("a"))
+            raise AssertionError("le disjoncteur ouvert doit rejeter l'appel")
+        except CircuitOpenError:
+            pass
+        assert caller.counters['short_circuited'] == 1
+
+        await asyncio.sleep(0.06)
+        # Essai en semi-ouvert : flux fermé par le lecteur après le premier fragment
+        assert await consume(caller, fragments("a", "b", "c"), limit=1) == ["a"]
+        assert caller.breaker.state == CircuitBreaker.CLOSED
+        assert caller.counters['success'] == 1
+    asyncio.run(scenario())
+
+def test_half_open_failure_reopens():
+    async def scenario():
+        caller = make_caller()
+        for _ in range(2):
+            try:
+                await consume(caller, fragments(fail_after=0))
+            except ServiceUnavailable:
+                pass
+        await asyncio.sleep(0.06)
+        try:
+            await consume(caller, fragments(fail_after=0))
+        except ServiceUnavailable:
+            pass
+        assert caller.breaker.state == CircuitBreaker.OPEN
+    asyncio.run(scenario())
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()          # requête d'essai
+    assert not breaker.allow()      # rejetée pendant l'essai
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_abandoned_probe_expires():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    time.sleep(0.06)                # essai sans issue (flux fermé avant le premier fragment)
+    assert breaker.allow()
+
+def test_hedged_backup_goes_through_admission():
+    admissions = []
+
+    @asynccontextmanager
+    async def admit():
+        admissions.append(1)
+        yield
+
+    async def scenario():
+        caller = ResilientCaller(max_attempts=1, hedge=True)
+        for _ in range(caller.latencies.min_samples):
+            caller.latencies.add(0.01)
+        calls = []
+
+        async def slow_then_fast():
+            calls.append(1)
+            await asyncio.sleep(0.2 if len(calls) == 1 else 0.0)
+            return len(calls)
+        assert await caller.call(slow_then_fast, admit=admit) == 2
+        assert caller.counters['hedged'] == 1 and caller.counters['hedge_wins'] == 1
+        assert len(admissions) == 2
+    asyncio.run(scenario())
+
+def test_early_close_before_first_chunk_is_neutral():
+    async def scenario():
+        caller = make_caller()
+        chunks = caller.stream(fragments("a"))
+        await chunks.aclose()
+        assert caller.counters['failures'] == 0
+        assert caller.breaker.failures == 0
+    asyncio.run(scenario())
+
+def test_retry_only_before_first_chunk():
+    async def scenario():
+        caller = ResilientCaller(max_attempts=3, base_delay=0.0, hedge=False)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            return fragments("ok", fail_after=0 if len(attempts) == 1 else None)()
+        assert await consume(caller, flaky) == ["ok"]
+        assert caller.counters['retried_success'] == 1
+
+        try:
+            await consume(caller, fragments("a", fail_after=1))
+            raise AssertionError("une erreur après le premier fragment ne doit pas être relancée")
+        except ServiceUnavailable:
+            pass
+        assert caller.counters['failures'] == 1
+    asyncio.run(scenario())
+
+def test_deadline_covers_first_chunk_and_total():
+    async def slow_start():
+        await asyncio.sleep(1)
+        yield "trop tard"
+
+    async def slow_stream():
+        while True:
+            yield "fragment"
+            await asyncio.sleep(0.03)
+
+    async def scenario():
+        for factory in (slow_start, slow_stream):
+            caller = make_caller(deadline=0.1)
+            try:
+                await consume(caller, factory)
+                raise AssertionError("l'échéance doit interrompre le flux")
+            except asyncio.TimeoutError:
+                pass
+    asyncio.run(scenario())
+
+def test_admission_wait_excluded_from_deadline():
+    @asynccontextmanager
+    async def throttled():
+        await asyncio.sleep(0.15)  # attente des quotas
+        yield
+
+    async def scenario():
+        caller = make_caller(deadline=0.1)
+        assert await consume(caller, fragments("a", "b"), admit=throttled) == ["a", "b"]
+
+        async def once():
+            return "réponse"
+        assert await caller.call(once, admit=throttled) == "réponse"
+        assert caller.breaker.failures == 0
+    asyncio.run(scenario())
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
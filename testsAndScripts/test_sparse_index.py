@@ -0,0 +1,91 @@
+"""
+Tests de l'index BM25, de la fusion RRF et de la recherche hybride (utils/sparse_index.py)
+Lancement : python -m pytest testsAndScripts/test_sparse_index.py
+        ou : python testsAndScripts/test_sparse_index.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sparse_index import BM25Index, HybridBackend, reciprocal_rank_fusion, tokenize
+from utils.vector_backends import NumpyBackend
+
+SUBJECTS = [
+    ("s1", "Détection d'intrusions dans les réseaux par apprentissage automatique",
+     {'departement': "Génie Informatique", 'niveau': "avancé"}, [1.0, 0.0, 0.0]),
+    ("s2", "Gestion de l'énergie des systèmes photovoltaïques",
+     {'departement': "Génie Électrique", 'niveau': "intermédiaire"}, [0.0, 1.0, 0.0]),
+    ("s3", "Application mobile de suivi des canaux d'irrigation",
+     {'departement': "Génie Civil", 'niveau': "débutant"}, [0.0, 0.0, 1.0]),
+]
+
+def make_hybrid():
+    backend = HybridBackend(NumpyBackend(dim=3))
+    backend.upsert(
+        ids=[s[0] for s in SUBJECTS],
+        embeddings=[s[3] for s in SUBJECTS],
+        documents=[s[1] for s in SUBJECTS],
+        metadatas=[s[2] for s in SUBJECTS],
+    )
+    return backend
+
+def test_tokenize_french():
+    assert tokenize("Les Réseaux et les Systèmes") == ["reseau", "systeme"]
+    assert tokenize("canaux") == ["canal"]
+    assert tokenize("de la et") == []
+
+def test_bm25_incremental_updates():
+    index = BM25Index()
+    index.add([s[0] for s in SUBJECTS], [s[1] for s in SUBJECTS], [s[2] for s in SUBJECTS])
+    assert index.search("réseau intrusion")[0][0] == "s1"
+
+    index.add(["s1"], ["Cartographie des sols"], [SUBJECTS[0][2]])
+    assert all(doc_id != "s1" for doc_id, _ in index.search("réseau intrusion"))
+    assert index.search("sol")[0][0] == "s1"
+
+    index.remove(["s1"])
+    assert index.search("sol") == []
+    assert len(index) == 2
+
+def test_bm25_filters():
+    index = BM25Index()
+    index.add([s[0] for s in SUBJECTS], [s[1] for s in SUBJECTS], [s[2] for s in SUBJECTS])
+    assert index.search("énergie", where={'departement': "Génie Civil"}) == []
+    assert index.search("", n_results=5) == []
+
+def test_reciprocal_rank_fusion():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=60))
+    # Présent dans les deux classements : devant un premier rang isolé
+    assert max(fused, key=fused.get) == "b"
+    assert fused["a"] == 1 / 61
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert reciprocal_rank_fusion([[], []]) == []
+
+def test_hybrid_query_fuses_dense_and_sparse():
+    backend = make_hybrid()
+    results = backend.query([[0.0, 0.0, 1.0]], n_results=2, query_texts=["intrusions réseau"])
+    ids = results['ids'][0]
+    assert set(ids) == {"s1", "s3"}
+    assert len(results['scores'][0]) == 2
+
+def test_empty_filter_retrieval():
+    backend = make_hybrid()
+    where = {'departement': "Génie Mécanique"}  # aucun document ne correspond
+    for query_texts in (None, ["réseau"]):
+        results = backend.query([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], n_results=3, where=where,
+                                query_texts=query_texts and query_texts * 2)
+        assert results['ids'] == [[], []]
+        assert results['documents'] == [[], []]
+
+def test_empty_backend_retrieval():
+    backend = HybridBackend(NumpyBackend(dim=3))
+    assert backend.query([[1.0, 0.0, 0.0]], n_results=3)['ids'] == [[]]
+    assert backend.query([[1.0, 0.0, 0.0]], n_results=3, query_texts=["réseau"])['ids'] == [[]]
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
@@ -0,0 +1,103 @@
+"""
+Tests de l'analyse incrémentale des réponses JSON (utils/structured_output.py)
+Lancement : python -m pytest testsAndScripts/test_structured_output.py
+        ou : python testsAndScripts/test_structured_output.py
+"""
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.structured_output import (IncrementalJSONParser, is_valid_recommendation,
+                                     parse_recommendation, render_markdown, render_text,
+                                     response_header)
+
+def make_option(i, **fields):
+    option = {
+        'titre': f"Sujet {i}",
+        'problematique': f"Question {i} ?",
+        'lien_archives': "Prolonge les travaux de 2021",
+        'methodologie': "Prototypage",
+        'mots_cles': ["IA", "IoT"],
+    }
+    option.update(fields)
+    return option
+
+RESPONSE = {
+    'options': [
+        make_option(1, titre='Accolades { et } dans "un titre"'),
+        make_option(2, problematique="Échappements : \\ et \" et \\\" puis ]"),
+        make_option(3, methodologie="Ligne 1\nLigne 2 ✅"),
+    ],
+    'conseil': "Choisir un directeur tôt {vraiment}",
+}
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    done = False
+    for i in range(0, len(text), size):
+        done = parser.feed(text[i:i + size])
+        if done:
+            break
+    return parser, done
+
+def test_chunk_splits_inside_strings_and_escapes():
+    text = json.dumps(RESPONSE, ensure_ascii=False)
+    # Toutes les tailles de fragment : coupures au milieu des chaînes et des échappements
+    for size in range(1, 12):
+        parser, done = feed_in_chunks(text, size)
+        assert done, size
+        assert parser.data == RESPONSE, size
+        assert parser.options == RESPONSE['options'], size
+
+def test_options_available_before_completion():
+    text = json.dumps(RESPONSE, ensure_ascii=False)
+    cut = text.index('"conseil"')
+    parser = IncrementalJSONParser()
+    assert not parser.feed(text[:cut])
+    assert len(parser.partial()['options']) == 3
+    assert parser.feed(text[cut:])
+
+def test_code_fence_and_surrounding_text():
+    body = json.dumps(RESPONSE, ensure_ascii=False, indent=2)
+    for text in (f"```json\n{body}\n```", f"Voici la réponse :\n```\n{body}\n```\nBon courage !"):
+        assert parse_recommendation(text) == RESPONSE
+        parser, done = feed_in_chunks(text, 7)
+        assert done and parser.data == RESPONSE
+
+def test_trailing_commas_are_tolerated():
+    text = json.dumps(RESPONSE, ensure_ascii=False).replace("}]", "},]").replace('"IoT"]', '"IoT",]')
+    assert parse_recommendation(text) == RESPONSE
+
+def test_invalid_or_incomplete_responses():
+    assert parse_recommendation("") is None
+    assert parse_recommendation("Pas de JSON ici") is None
+    truncated = json.dumps(RESPONSE, ensure_ascii=False)[:-20]
+    parser, done = feed_in_chunks(truncated, 5)
+    assert not done and parser.data is None
+    assert not is_valid_recommendation({'options': RESPONSE['options'][:2]})
+
+def test_render_markdown_lists_every_option():
+    markdown = render_markdown(RESPONSE)
+    for i in (1, 2, 3):
+        assert f"Option {i} :" in markdown
+    assert "IA, IoT" in markdown
+    assert "CONSEIL DU PROFESSEUR" in markdown
+
+def test_pdf_text_keeps_response_header():
+    header = "\n---\n**Analyse pour :** réseaux | **Niveau :** avancé | **Temps :** 1.2s\n---\n"
+    text = header + render_markdown(RESPONSE)
+    assert response_header(text) == header[:-1]
+    pdf_text = render_text(RESPONSE, response_header(text))
+    assert "**Analyse pour :** réseaux" in pdf_text
+    assert pdf_text.index("Analyse pour") < pdf_text.index("PROPOSITIONS DE RECHERCHE")
+    assert response_header(render_markdown(RESPONSE)) == ""
+    assert render_text(RESPONSE).startswith("PROPOSITIONS DE RECHERCHE")
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
@@ -0,0 +1,102 @@
+"""
+Tests du backend NumPy : filtres ChromaDB, suppression, top-k (utils/vector_backends.py)
+Lancement : python -m pytest testsAndScripts/test_vector_backends.py
+        ou : python testsAndScripts/test_vector_backends.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vector_backends import NumpyBackend, matches_filter
+
+SUBJECTS = [
+    ("s1", [1.0, 0.0, 0.0], {'departement': "Génie Informatique", 'niveau': "avancé"}),
+    ("s2", [0.9, 0.1, 0.0], {'departement': "Génie Informatique", 'niveau': "débutant"}),
+    ("s3", [0.0, 1.0, 0.0], {'departement': "Génie Électrique", 'niveau': "intermédiaire"}),
+    ("s4", [0.0, 0.0, 1.0], {'departement': "Génie Civil", 'niveau': "débutant"}),
+]
+
+FILTERS = [
+    ({'departement': "Génie Informatique"}, {"s1", "s2"}),
+    ({'niveau': {"$eq": "débutant"}}, {"s2", "s4"}),
+    ({'departement': {"$ne": "Génie Informatique"}}, {"s3", "s4"}),
+    ({'departement': {"$in": ["Génie Civil", "Génie Électrique"]}}, {"s3", "s4"}),
+    ({'niveau': {"$nin": ["avancé", "débutant"]}}, {"s3"}),
+    ({'$and': [{'departement': "Génie Informatique"}, {'niveau': "débutant"}]}, {"s2"}),
+    ({'$or': [{'niveau': "avancé"}, {'departement': "Génie Civil"}]}, {"s1", "s4"}),
+    ({'$and': [{'niveau': "débutant"}, {'$or': [{'departement': "Génie Civil"},
+                                                {'departement': "Génie Mécanique"}]}]}, {"s4"}),
+    ({'departement': "Génie Mécanique"}, set()),
+]
+
+def make_backend():
+    backend = NumpyBackend(initial_capacity=2)   # croissance de la matrice au fil des ajouts
+    backend.upsert(
+        ids=[s[0] for s in SUBJECTS],
+        embeddings=[s[1] for s in SUBJECTS],
+        documents=[f"Sujet {s[0]}" for s in SUBJECTS],
+        metadatas=[s[2] for s in SUBJECTS],
+    )
+    return backend
+
+def test_filter_operators():
+    backend = make_backend()
+    for where, expected in FILTERS:
+        results = backend.query([[1.0, 1.0, 1.0]], n_results=10, where=where)
+        assert set(results['ids'][0]) == expected, where
+        assert backend.count_matching(where) == len(expected), where
+        # Même sémantique que l'évaluation ligne à ligne
+        assert {s[0] for s in SUBJECTS if matches_filter(s[2], where)} == expected, where
+
+def test_unsupported_operator():
+    try:
+        make_backend().query([[1.0, 0.0, 0.0]], where={'niveau': {"$gt": "a"}})
+        raise AssertionError("un opérateur inconnu doit être signalé")
+    except ValueError:
+        pass
+
+def test_ranking_and_distances():
+    results = make_backend().query([[1.0, 0.0, 0.0], [0.0, 0.0, 2.0]], n_results=2)
+    assert results['ids'][0] == ["s1", "s2"]
+    assert results['ids'][1][0] == "s4"     # vecteur de requête non normalisé
+    assert abs(results['distances'][0][0]) < 1e-6
+    assert results['documents'][0][0] == "Sujet s1"
+    assert results['metadatas'][0][0]['niveau'] == "avancé"
+
+def test_n_results_larger_than_matches():
+    backend = make_backend()
+    results = backend.query([[1.0, 0.0, 0.0]], n_results=50)
+    assert len(results['ids'][0]) == 4
+    results = backend.query([[1.0, 0.0, 0.0]], n_results=50, where={'niveau': "débutant"})
+    assert results['ids'][0] == ["s2", "s4"]
+    assert len(results['distances'][0]) == 2
+
+def test_delete_then_query():
+    backend = make_backend()
+    backend.delete(["s1", "absent"])
+    assert backend.count() == 3
+    assert sorted(backend.list_ids()) == ["s2", "s3", "s4"]
+    results = backend.query([[1.0, 0.0, 0.0]], n_results=4, where={'departement': "Génie Informatique"})
+    assert results['ids'][0] == ["s2"]
+    # La dernière ligne a pris la place de s1 : son vecteur et ses métadonnées la suivent
+    results = backend.query([[0.0, 0.0, 1.0]], n_results=1)
+    assert results['ids'][0] == ["s4"] and results['metadatas'][0][0]['departement'] == "Génie Civil"
+
+    backend.delete(["s2", "s3", "s4"])
+    assert backend.query([[1.0, 0.0, 0.0]], n_results=3)['ids'] == [[]]
+
+def test_upsert_replaces_existing_id():
+    backend = make_backend()
+    backend.upsert(ids=["s1"], embeddings=[[0.0, 1.0, 0.0]], documents=["Nouveau"],
+                   metadatas=[{'departement': "Génie Électrique", 'niveau': "avancé"}])
+    assert backend.count() == 4
+    assert set(backend.query([[0.0, 1.0, 0.0]], n_results=2)['ids'][0]) == {"s1", "s3"}
+    assert backend.count_matching({'departement': "Génie Informatique"}) == 1
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
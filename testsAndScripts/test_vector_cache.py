@@ -0,0 +1,76 @@
+"""
+Tests du cache d'embeddings en fragments mmap (utils/vector_cache.py)
+Lancement : python -m pytest testsAndScripts/test_vector_cache.py
+        ou : python testsAndScripts/test_vector_cache.py
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vector_cache import EmbeddingCache, text_hash
+
+MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+def vector(i):
+    return np.full(4, i, dtype=np.float32)
+
+def shard_files(cache):
+    return sorted(name for name in os.listdir(cache.directory) if name.endswith(".keys.json"))
+
+def test_put_then_get():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(MODEL, cache_dir=directory)
+        keys = [text_hash("réseaux"), text_hash("énergie")]
+        cache.put_many(keys, [vector(1), vector(2)])
+        found = cache.get_many(keys + [text_hash("absent")])
+        assert np.array_equal(found[0], vector(1)) and np.array_equal(found[1], vector(2))
+        assert found[2] is None
+        assert (cache.hits, cache.misses) == (2, 1)
+
+        cache.put_many(keys, [vector(9), vector(9)])    # déjà en cache : aucun fragment écrit
+        assert len(shard_files(cache)) == 1
+
+def test_compaction_keeps_every_key():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(MODEL, cache_dir=directory, max_shards=3)
+        keys = [text_hash(f"sujet {i}") for i in range(5)]
+        for i, key in enumerate(keys[:4]):
+            cache.put_many([key], [vector(i)])
+        # Le quatrième fragment dépasse max_shards : compactage automatique
+        assert len(shard_files(cache)) == 1
+        cache.put_many([keys[4]], [vector(4)])
+        assert len(shard_files(cache)) == 2
+        assert cache.compact()
+        assert len(shard_files(cache)) == 1
+        assert not os.path.exists(os.path.join(cache.directory, "compact.lock"))
+        assert cache.get_stats()['shards'] == 1
+
+        for i, found in enumerate(cache.get_many(keys)):
+            assert np.array_equal(found, vector(i))
+
+def test_second_instance_sees_vectors():
+    with tempfile.TemporaryDirectory() as directory:
+        writer = EmbeddingCache(MODEL, cache_dir=directory, max_shards=2)
+        reader = EmbeddingCache(MODEL, cache_dir=directory, read_only=True)
+        keys = [text_hash(f"sujet {i}") for i in range(4)]
+        for i, key in enumerate(keys):
+            writer.put_many([key], [vector(i)])
+
+        # Lecteur ouvert avant les écritures et les compactages : relecture à la demande
+        for i, found in enumerate(reader.get_many(keys)):
+            assert np.array_equal(found, vector(i))
+        assert len(EmbeddingCache(MODEL, cache_dir=directory)) == 4
+
+        reader.put_many([text_hash("lecture seule")], [vector(7)])
+        assert text_hash("lecture seule") not in EmbeddingCache(MODEL, cache_dir=directory)
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} tests réussis")
@@ -0,0 +1,107 @@
+# utils/context_packer.py
+"""
+Construction du contexte du prompt sous budget de tokens
+Les sujets sont classés par score de recherche ; les titres passent d'abord,
+puis les résumés (compressés) tant que le budget le permet
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    """
+    Nombre de tokens estimé, façon SentencePiece : les mots longs sont découpés
+    en plusieurs morceaux, chaque ponctuation compte pour un token (mis en cache)
+    """
+    return sum(1 + len(piece) // 6 for piece in _PIECE.findall(text))
+
+def compress_resume(resume, max_tokens, count=count_tokens):
+    """
+    Résumé réduit à max_tokens : phrases entières depuis le début,
+    sinon troncature au mot avec points de suspension
+    """
+    resume = re.sub(r"\s+", " ", str(resume or "")).strip()
+    if not resume or max_tokens <= 0:
+        return ""
+    if count(resume) <= max_tokens:
+        return resume
+
+    kept = []
+    for sentence in _SENTENCE.split(resume):
+        if count(" ".join(kept + [sentence])) > max_tokens:
+            break
+        kept.append(sentence)
+    if kept:
+        return " ".join(kept)
+
+    words = resume.split(" ")
+    while words and count(" ".join(words) + "…") > max_tokens:
+        words.pop()
+    return " ".join(words) + "…" if words else ""
+
+class ContextPacker:
+    """
+    Remplit un budget de tokens avec les sujets de contexte.
+    budget : tokens du contexte (CONTEXT_TOKEN_BUDGET, 400 par défaut)
+    resume_tokens : plafond par résumé compressé (en dessous de min_resume_tokens, résumé omis)
+    """
+    def __init__(self, budget=None, resume_tokens=60, min_resume_tokens=10, count=count_tokens):
+        self.budget = budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+        self.resume_tokens = resume_tokens
+        self.min_resume_tokens = min_resume_tokens
+        self.count = count
+
+    @staticmethod
+    def _title_line(doc):
+        return f"- {doc.get('titre')} (Dept: {doc.get('departement')})"
+
+    def pack(self, context: List[Dict]) -> Tuple[str, Dict]:
+        """
+        (contexte formaté ou message par défaut s'il n'y a aucun sujet, statistiques)
+        Statistiques : documents retenus, résumés inclus, tokens utilisés, budget
+        """
+        if not context:
+            return "Aucun sujet de référence disponible.", {'documents': 0, 'resumes': 0, 'tokens': 0,
+                                                            'budget': self.budget}
+
+        # Tri stable : à score égal (ou absent), l'ordre de la recherche est conservé
+        ranked = sorted(context, key=lambda doc: doc.get('score') or 0.0, reverse=True)
+
+        # 1) Titres, par score décroissant, tant qu'ils tiennent dans le budget
+        selected, used = [], 0
+        for doc in ranked:
+            line = self._title_line(doc)
+            cost = self.count(line) + 1  # + saut de ligne
+            if used + cost > self.budget:
+                break
+            selected.append([line, doc, ""])
+            used += cost
+
+        # 2) Résumés compressés avec le budget restant, même ordre de priorité
+        for entry in selected:
+            label_cost = self.count("  Résumé :") + 1
+            allowance = min(self.resume_tokens, self.budget - used - label_cost)
+            if allowance < self.min_resume_tokens:
+                break
+            resume = compress_resume(entry[1].get('resume'), allowance, self.count)
+            if resume:
+                entry[2] = resume
+                used += label_cost + self.count(resume)
+
+        lines = []
+        for line, _, resume in selected:
+            lines.append(line)
+            if resume:
+                lines.append(f"  Résumé : {resume}")
+        stats = {
+            'documents': len(selected),
+            'resumes': sum(1 for entry in selected if entry[2]),
+            'tokens': used,
+            'budget': self.budget,
+        }
+        return "\n".join(lines), stats
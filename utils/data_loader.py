@@ -2,42 +2,216 @@
 """
 Module de chargement et prétraitement des données
 """
+import hashlib
+import json
+import os
+import time
 import pandas as pd
 import re
+from utils.tracing import get_tracer
 
-def load_subjects(file_path="data/sujets_memoires.csv"):
+# Dossier de cache (créé à côté du CSV)
+CACHE_DIR_NAME = ".cache"
+
+# Version du format des DataFrames en cache : à incrémenter à chaque changement
+# des colonnes dérivées (texte_complet, id...) pour invalider les anciens fichiers
+CACHE_SCHEMA_VERSION = 2
+
+# Statistiques du dernier chargement
+_load_stats = {}
+
+def build_texte_complet(df):
+    """
+    Construit la colonne texte_complet de manière vectorisée
+    """
+    return (
+        "Titre: " + df['titre'].astype(str)
+        + ". Résumé: " + df['resume'].astype(str)
+        + ". Département: " + df['departement'].astype(str)
+        + ". Niveau: " + df['niveau'].astype(str) + "."
+    )
+
+def subject_id(texte):
+    """
+    Identifiant stable d'un sujet, dérivé du contenu (indépendant de sa position dans le CSV)
+    """
+    return "sub_" + hashlib.sha1(texte.encode('utf-8')).hexdigest()[:20]
+
+def build_subject_ids(df):
+    """
+    Calcule les identifiants de contenu de chaque ligne (texte_complet doit exister)
+    """
+    return df['texte_complet'].map(subject_id)
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """
+    Calcule l'empreinte SHA-256 du contenu d'un fichier
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_paths(file_path):
+    """
+    Retourne le dossier de cache et le préfixe des fichiers associés au CSV
+    """
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    prefix = os.path.splitext(os.path.basename(file_path))[0]
+    return cache_dir, prefix
+
+def _csv_digest(file_path, cache_dir, prefix):
+    """
+    Retourne le hash du CSV en réutilisant le dernier calcul si taille et mtime sont inchangées
+    """
+    stat = os.stat(file_path)
+    index_path = os.path.join(cache_dir, f"{prefix}.index.json")
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('size') == stat.st_size and index.get('mtime_ns') == stat.st_mtime_ns:
+            return index['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = file_hash(file_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}, f)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        pass
+    return digest
+
+def _write_cache(df, cache_dir, prefix, cache_path):
+    """
+    Écrit le DataFrame en Parquet (écriture atomique) et supprime les anciennes versions
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.startswith(prefix + ".") and name.endswith(".parquet") and path != cache_path:
+                os.remove(path)
+    except Exception as e:
+        # Le cache est optionnel (pyarrow absent, disque en lecture seule...)
+        print(f"⚠️ Cache Parquet non écrit: {e}")
+
+def load_subjects(file_path="data/sujets_memoires.csv", use_cache=True):
     """
     Charge les sujets de mémoire depuis un fichier CSV
+
+    Le résultat est mis en cache au format Parquet, indexé par le hash du CSV et
+    CACHE_SCHEMA_VERSION : tant que ni le fichier ni le format ne changent,
+    le rechargement évite le parsing.
     """
+    with get_tracer().span("csv_load") as span:
+        df = _load_subjects(file_path, use_cache)
+        # Backend : cache Parquet, CSV ou erreur
+        span['backend'] = _load_stats.get('source')
+        span['rows'] = len(df)
+        return df
+
+def _load_subjects(file_path, use_cache):
+    global _load_stats
+    start_time = time.perf_counter()
     try:
+        digest = None
+        cache_path = None
+        if use_cache:
+            cache_dir, prefix = _cache_paths(file_path)
+            digest = _csv_digest(file_path, cache_dir, prefix)
+            cache_path = os.path.join(cache_dir, f"{prefix}.v{CACHE_SCHEMA_VERSION}.{digest[:16]}.parquet")
+            if os.path.exists(cache_path):
+                try:
+                    df = pd.read_parquet(cache_path)
+                    _load_stats = {
+                        'source': 'cache',
+                        'rows': len(df),
+                        'load_time_s': time.perf_counter() - start_time,
+                        'csv_sha256': digest,
+                        'cache_path': cache_path,
+                    }
+                    print(f"⚡ {len(df)} sujets chargés depuis le cache ({_load_stats['load_time_s'] * 1000:.1f} ms)")
+                    return df
+                except Exception as e:
+                    print(f"⚠️ Cache Parquet illisible, rechargement du CSV: {e}")
+
         df = pd.read_csv(file_path)
         print(f"✅ {len(df)} sujets chargés depuis {file_path}")
-        
+
         # Nettoyage des textes
-        df['texte_complet'] = df.apply(
-            lambda row: f"Titre: {row['titre']}. Résumé: {row['resume']}. Département: {row['departement']}. Niveau: {row['niveau']}.",
-            axis=1
-        )
-        
+        df['texte_complet'] = build_texte_complet(df)
+        df['id'] = build_subject_ids(df)
+
+        if use_cache:
+            _write_cache(df, cache_dir, prefix, cache_path)
+
+        _load_stats = {
+            'source': 'csv',
+            'rows': len(df),
+            'load_time_s': time.perf_counter() - start_time,
+            'csv_sha256': digest,
+            'cache_path': cache_path,
+        }
         return df
     except Exception as e:
         print(f"❌ Erreur lors du chargement des données: {e}")
+        _load_stats = {
+            'source': 'error',
+            'rows': 0,
+            'load_time_s': time.perf_counter() - start_time,
+            'error': str(e),
+        }
         return pd.DataFrame()
 
+SUBJECT_FIELDS = ['titre', 'resume', 'departement', 'niveau']
+
+def build_subject_index(df):
+    """
+    Construit l'index id -> sujet (titre, résumé, département, niveau)
+    Permet de résoudre un résultat de recherche en O(1)
+    """
+    if df.empty or 'id' not in df.columns:
+        return {}
+    subjects = df.drop_duplicates('id').set_index('id')
+    return subjects[[c for c in SUBJECT_FIELDS if c in subjects.columns]].to_dict('index')
+
+def iter_subject_chunks(file_path="data/sujets_memoires.csv", chunksize=2000):
+    """
+    Lit le CSV par morceaux pour borner la mémoire utilisée
+    """
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        yield chunk
+
+def get_load_stats():
+    """
+    Retourne les statistiques du dernier chargement (source, nombre de lignes, durée)
+    """
+    return dict(_load_stats)
+
 def filter_by_department(df, departments=None):
     """
     Filtre les sujets par département
     """
     if departments and len(departments) > 0:
-        return df[df['departement'].isin(departments)]
+        with get_tracer().span("csv_filter", backend="departement"):
+            return df[df['departement'].isin(departments)]
     return df
 
 def filter_by_level(df, level):
     """
     Filtre les sujets par niveau (débutant/intermédiaire)
     """
-    if level == "débutant":
-        return df[df['niveau'] == "débutant"]
-    elif level == "intermédiaire":
-        return df[df['niveau'].isin(["intermédiaire", "avancé"])]
-    return df
\ No newline at end of file
+    with get_tracer().span("csv_filter", backend="niveau"):
+        if level == "débutant":
+            return df[df['niveau'] == "débutant"]
+        elif level == "intermédiaire":
+            return df[df['niveau'].isin(["intermédiaire", "avancé"])]
+        return df
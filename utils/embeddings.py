@@ -2,64 +2,218 @@
 """
 Module de gestion des embeddings et base vectorielle
 """
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
 import numpy as np
 import os
+import re
+import threading
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+from utils.data_loader import subject_id
+from utils.events import emit
+from utils.lru import LRUCache
+from utils.sparse_index import HybridBackend
+from utils.tracing import get_tracer
+from utils.vector_backends import ChromaBackend, NumpyBackend
+from utils.vector_cache import EmbeddingCache, text_hash
+
+def normalize_query(query):
+    """
+    Normalise une requête pour le cache (Unicode NFC, minuscules, espaces)
+    all-MiniLM-L6-v2 est insensible à la casse : le vecteur ne change pas
+    """
+    query = unicodedata.normalize("NFC", query).casefold()
+    return re.sub(r"\s+", " ", query).strip()
+
+@dataclass
+class SearchHit:
+    """Résultat de recherche résolu dans le corpus"""
+    id: str
+    score: float
+    titre: str
+    resume: str
+    departement: str
+    niveau: str
+    
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+def backend_name(collection):
+    """Nom court du backend vectoriel (label des métriques) : hybrid, chroma, numpy..."""
+    return type(collection).__name__.replace("Backend", "").lower() or "inconnu"
+
+def build_where(departements=None, niveau=None):
+    """
+    Construit un filtre composé (format ChromaDB) sur le département et le niveau
+    Chaque critère accepte une valeur ou une liste de valeurs
+    """
+    clauses = []
+    for key, value in (("departement", departements), ("niveau", niveau)):
+        if not value:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            values = list(value)
+            clauses.append({key: values[0]} if len(values) == 1 else {key: {"$in": values}})
+        else:
+            clauses.append({key: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 class EmbeddingManager:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", cache_dir=None,
+                 query_cache_size=512, query_cache_ttl=None, vector_backend=None, hybrid_search=None):
+        """
+        Initialise le gestionnaire d'embeddings
+        Le modèle et ChromaDB sont chargés à la première utilisation (voir warm_up)
+        vector_backend : 'chroma' (persistant) ou 'numpy' (exact, en mémoire),
+        par défaut la variable d'environnement VECTOR_BACKEND
+        hybrid_search : fusion BM25 + dense (variable HYBRID_SEARCH, activée par défaut)
+        """
+        self.model_name = model_name
+        self.vector_backend = vector_backend or os.getenv("VECTOR_BACKEND", "chroma")
+        if self.vector_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Backend vectoriel inconnu: {self.vector_backend}")
+        self._numpy_backends = {}
+        if hybrid_search is None:
+            hybrid_search = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+        self.hybrid_search = hybrid_search
+        self.persist_directory = "chroma_db"
+        self._model = None
+        self._chroma_client = None
+        self._model_lock = threading.Lock()
+        self._chroma_lock = threading.Lock()
+        
+        # Cache persistant des vecteurs (partagé entre processus via mmap)
+        self.vector_cache = EmbeddingCache(
+            model_name,
+            cache_dir=cache_dir or os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+        )
+        
+        # Cache LRU des vecteurs de requêtes (exemples et formulations fréquentes)
+        self.query_cache = LRUCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+    
+    @property
+    def model(self):
+        """Modèle SentenceTransformer (import et chargement différés)"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    print(f"🔧 Chargement du modèle d'embeddings: {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+    
+    @property
+    def embedding_dim(self):
+        return self.model.get_sentence_embedding_dimension()
+    
+    @property
+    def chroma_client(self):
+        """Client ChromaDB persistant (import différé)"""
+        if self._chroma_client is None:
+            with self._chroma_lock:
+                if self._chroma_client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+                    
+                    # Configuration de ChromaDB
+                    self._chroma_client = chromadb.PersistentClient(
+                        path=self.persist_directory,
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+        return self._chroma_client
+    
+    def warm_up(self):
+        """
+        Charge le modèle et exécute un encodage factice (initialise les noyaux de calcul)
         """
-        Initialise le modèle d'embeddings
+        self.model.encode(["échauffement du modèle"], show_progress_bar=False)
+        return self
+    
+    def get_or_create_collection(self, collection_name="sujets_memoire"):
+        """
+        Récupère la collection (backend vectoriel) ou la crée si elle n'existe pas
+        Retourne (collection, created)
         """
-        print(f"🔧 Chargement du modèle d'embeddings: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        if self.vector_backend == "numpy":
+            # Index en mémoire : reconstruit à chaque démarrage (encodage servi par le cache)
+            if collection_name in self._numpy_backends:
+                return self._numpy_backends[collection_name], False
+            print(f"🆕 Création de l'index NumPy en mémoire: {collection_name}")
+            backend = self._wrap_backend(NumpyBackend())
+            self._numpy_backends[collection_name] = backend
+            return backend, True
         
-        # Configuration de ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path="chroma_db",
-            settings=Settings(anonymized_telemetry=False)
+        # Création atomique : plusieurs processus (workers de l'API) peuvent ouvrir la même base
+        collection = self.chroma_client.get_or_create_collection(
+            name=collection_name,
+            metadata={"description": "Sujets de mémoire académiques"}
         )
+        if collection.count() == 0:
+            print(f"🆕 Collection vide, indexation complète: {collection_name}")
+            return self._wrap_backend(ChromaBackend(collection)), True
+        print(f"📁 Collection '{collection_name}' déjà existante")
+        return self._wrap_backend(ChromaBackend(collection)), False
+    
+    def _wrap_backend(self, backend):
+        """
+        Ajoute l'index BM25 au backend dense si la recherche hybride est activée
+        L'index BM25 d'une collection existante se remplit avec HybridBackend.index_sparse
+        """
+        return HybridBackend(backend) if self.hybrid_search else backend
+    
+    def encode(self, texts, batch_size=64):
+        """
+        Encode une liste de textes (un lot borné)
+        Seuls les textes absents du cache persistant passent par le modèle
+        """
+        keys = [text_hash(text) for text in texts]
+        vectors = self.vector_cache.get_many(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
         
-    def create_embeddings(self, texts, metadatas=None, collection_name="sujets_memoire"):
+        if missing:
+            encoded = self.model.encode([texts[i] for i in missing], batch_size=batch_size, show_progress_bar=False)
+            self.vector_cache.put_many([keys[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        
+        if not vectors:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        return np.asarray(vectors, dtype=np.float32)
+        
+    def create_embeddings(self, texts, metadatas=None, collection_name="sujets_memoire", batch_size=256):
         """
-        Crée les embeddings et les stocke dans ChromaDB
+        Crée les embeddings et les stocke dans ChromaDB, par lots de taille bornée
         """
         try:
-            # Vérifier si la collection existe déjà
-            existing_collections = [col.name for col in self.chroma_client.list_collections()]
+            collection, created = self.get_or_create_collection(collection_name)
             
-            if collection_name in existing_collections:
-                print(f"📁 Collection '{collection_name}' déjà existante")
-                collection = self.chroma_client.get_collection(collection_name)
-            else:
-                print(f"🆕 Création de la collection: {collection_name}")
-                collection = self.chroma_client.create_collection(
-                    name=collection_name,
-                    metadata={"description": "Sujets de mémoire académiques"}
-                )
-                
+            if created:
                 # Générer les embeddings
                 print(f"⚙️ Génération des embeddings pour {len(texts)} textes...")
-                embeddings = self.model.encode(texts, show_progress_bar=True)
-                
-                # Convertir en listes pour ChromaDB
-                embeddings_list = embeddings.tolist()
-                
-                # Ajouter les documents à la collection
-                ids = [f"doc_{i}" for i in range(len(texts))]
                 
                 if metadatas is None:
                     metadatas = [{} for _ in range(len(texts))]
                 
-                collection.add(
-                    embeddings=embeddings_list,
-                    documents=texts,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+                # Identifiants de contenu (les doublons exacts sont indexés une seule fois)
+                unique = {}
+                for text, metadata in zip(texts, metadatas):
+                    unique.setdefault(subject_id(text), (text, metadata))
+                ids = list(unique)
+                
+                for start in range(0, len(ids), batch_size):
+                    batch_ids = ids[start:start + batch_size]
+                    batch_texts = [unique[i][0] for i in batch_ids]
+                    embeddings = self.encode(batch_texts)
+                    
+                    # Ajouter les documents à la collection
+                    collection.upsert(
+                        embeddings=embeddings.tolist(),
+                        documents=batch_texts,
+                        metadatas=[unique[i][1] for i in batch_ids],
+                        ids=batch_ids
+                    )
                 
                 print(f"✅ {len(texts)} documents ajoutés à la collection")
             
@@ -69,32 +223,150 @@ class EmbeddingManager:
             print(f"❌ Erreur lors de la création des embeddings: {e}")
             return None
     
-    def search_similar(self, query, collection, n_results=5, filters=None):
+    def encode_query(self, query):
         """
-        Recherche les documents les plus similaires à la requête
+        Encode une requête, en réutilisant le vecteur si la requête normalisée est en cache
         """
-        try:
-            # Embedding de la requête
-            query_embedding = self.model.encode([query]).tolist()[0]
-            
-            # Recherche dans ChromaDB
+        key = normalize_query(query)
+        with get_tracer().span("query_encoding", backend="cache") as span:
+            embedding = self.query_cache.get(key)
+            if embedding is None:
+                span['backend'] = "model"
+                embedding = self.model.encode([key])[0].tolist()
+                self.query_cache.put(key, embedding)
+        return embedding
+    
+    def encode_queries(self, queries, batch_size=64):
+        """
+        Encode un lot de requêtes en un seul passage du modèle
+        Les requêtes déjà en cache (forme normalisée) ne sont pas réencodées
+        """
+        keys = [normalize_query(query) for query in queries]
+        with get_tracer().span("query_encoding", backend="batch", queries=len(keys)) as span:
+            embeddings = [self.query_cache.get(key) for key in keys]
+            missing = sorted({key for key, embedding in zip(keys, embeddings) if embedding is None})
+            span['encoded'] = len(missing)
+            if missing:
+                encoded = self.model.encode(missing, batch_size=batch_size, show_progress_bar=False)
+                for key, embedding in zip(missing, encoded):
+                    self.query_cache.put(key, embedding.tolist())
+                embeddings = [self.query_cache.get(key) for key in keys]
+        return embeddings
+    
+    def get_query_cache_stats(self):
+        return self.query_cache.get_stats()
+    
+    def query_index(self, query, collection, n_results=5, filters=None, departements=None, niveau=None,
+                    events=None):
+        """
+        Interroge le backend vectoriel et retourne les résultats bruts (format ChromaDB)
+        Les filtres département/niveau sont appliqués dans l'index lui-même :
+        le backend sur-échantillonne ou parcourt exactement les documents filtrés
+        pour toujours retourner n_results résultats pertinents s'ils existent
+        """
+        # Embedding de la requête
+        query_embedding = self.encode_query(query)
+        emit(events, "embedding")
+        
+        where = build_where(departements, niveau)
+        if filters:
+            where = {"$and": [filters, where]} if where else filters
+        
+        # Recherche dans le backend vectoriel (ChromaDB ou NumPy)
+        with get_tracer().span("vector_search", backend=backend_name(collection), filtered=where is not None):
             results = collection.query(
                 query_embeddings=[query_embedding],
                 n_results=n_results,
-                where=filters
+                where=where,
+                query_texts=[query]
             )
-            
-            return results
+        emit(events, "search", results=len(results['ids'][0]) if results.get('ids') else 0)
+        return results
+    
+    @staticmethod
+    def hydrate(results, subjects: Dict[str, Dict], row: int = 0) -> List[SearchHit]:
+        """
+        Résout les identifiants retournés par l'index via l'index id -> sujet (O(1) par résultat)
+        Score : score de fusion RRF si disponible, sinon 1 / (1 + distance)
+        """
+        hits = []
+        if not results or not results.get('ids'):
+            return hits
+        ids = results['ids'][row]
+        scores = results['scores'][row] if results.get('scores') else None
+        distances = results['distances'][row] if results.get('distances') else [None] * len(ids)
+        for i, doc_id in enumerate(ids):
+            subject = subjects.get(doc_id)
+            if subject is None:
+                # Index en avance sur le corpus chargé (synchronisation en cours)
+                continue
+            if scores is not None:
+                score = scores[i]
+            elif distances[i] is not None:
+                score = 1.0 / (1.0 + distances[i])
+            else:
+                score = 0.0
+            hits.append(SearchHit(
+                id=doc_id,
+                score=float(score),
+                titre=subject.get('titre', ''),
+                resume=subject.get('resume', ''),
+                departement=subject.get('departement', ''),
+                niveau=subject.get('niveau', '')
+            ))
+        return hits
+    
+    def search_similar(self, query, collection, subjects, n_results=5, filters=None,
+                       departements=None, niveau=None, events=None) -> List[SearchHit]:
+        """
+        Recherche les sujets les plus similaires à la requête
+        subjects : index id -> sujet construit au chargement (voir build_subject_index)
+        events : bus PipelineEvents optionnel (étapes embedding, search, hydration)
+        """
+        try:
+            results = self.query_index(query, collection, n_results, filters, departements, niveau, events)
+            with get_tracer().span("hydration"):
+                hits = self.hydrate(results, subjects)
+            emit(events, "hydration", hits=len(hits))
+            return hits
             
         except Exception as e:
             print(f"❌ Erreur lors de la recherche: {e}")
-            return None
+            return []
+    
+    def search_many(self, queries, collection, subjects, n_results=5, departements=None,
+                    niveau=None) -> List[List[SearchHit]]:
+        """
+        Variante par lot de search_similar (mêmes filtres pour toutes les requêtes) :
+        un encodage et une interrogation de l'index pour l'ensemble du lot
+        """
+        if not queries:
+            return []
+        try:
+            embeddings = self.encode_queries(queries)
+            where = build_where(departements, niveau)
+            with get_tracer().span("vector_search", backend=backend_name(collection), filtered=where is not None,
+                                   queries=len(queries)):
+                results = collection.query(
+                    query_embeddings=embeddings,
+                    n_results=n_results,
+                    where=where,
+                    query_texts=list(queries)
+                )
+            with get_tracer().span("hydration"):
+                return [self.hydrate(results, subjects, row) for row in range(len(queries))]
+        
+        except Exception as e:
+            print(f"❌ Erreur lors de la recherche par lot: {e}")
+            return [[] for _ in queries]
     
     def get_collection(self, collection_name="sujets_memoire"):
         """
         Récupère une collection existante
         """
+        if self.vector_backend == "numpy":
+            return self._numpy_backends.get(collection_name)
         try:
-            return self.chroma_client.get_collection(collection_name)
+            return ChromaBackend(self.chroma_client.get_collection(collection_name))
         except:
             return None
\ No newline at end of file
@@ -0,0 +1,35 @@
+# utils/events.py
+"""
+Bus d'événements du pipeline recherche -> recommandation
+Chaque étape réelle émet un événement : l'interface affiche une progression honnête
+"""
+import time
+
+# Étapes émises, dans l'ordre du pipeline
+STAGES = ("embedding", "search", "hydration", "prompt", "first_token", "done")
+
+class PipelineEvents:
+    """Diffuse les événements d'étape aux abonnés (appel synchrone, dans le thread émetteur)"""
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.events = []
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        return self
+
+    def emit(self, stage, **data):
+        event = dict(data, stage=stage, elapsed=time.perf_counter() - self.started_at)
+        self.events.append(event)
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ Abonné aux événements en erreur ({stage}): {e}")
+        return event
+
+def emit(events, stage, **data):
+    """Émet un événement si un bus est fourni (les appels sans bus restent silencieux)"""
+    if events is not None:
+        events.emit(stage, **data)
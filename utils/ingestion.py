@@ -0,0 +1,134 @@
+# utils/ingestion.py
+"""
+Pipeline d'ingestion en flux : CSV -> textes -> embeddings -> ChromaDB
+"""
+import time
+from utils.data_loader import iter_subject_chunks, build_texte_complet, build_subject_ids
+
+class StageStats:
+    """Compteurs de débit d'une étape du pipeline"""
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, rows, seconds):
+        self.rows += rows
+        self.seconds += seconds
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'seconds': round(self.seconds, 4),
+            'rows_per_sec': round(self.rows_per_sec, 1)
+        }
+
+class IngestionPipeline:
+    """
+    Ingestion par générateurs : lecture du CSV par morceaux, construction des textes,
+    encodage par lots bornés et upsert lot par lot. La mémoire reste constante
+    quelle que soit la taille du corpus.
+    """
+    STAGES = ("read", "texts", "encode", "upsert")
+
+    def __init__(self, embedding_manager, collection, chunk_size=2000, batch_size=256):
+        self.embedding_manager = embedding_manager
+        self.collection = collection
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+
+    def _read(self, csv_path):
+        """Étape 1 : lecture du CSV par morceaux"""
+        chunks = iter_subject_chunks(csv_path, chunksize=self.chunk_size)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.stats['read'].add(len(chunk), time.perf_counter() - start)
+            yield chunk
+
+    def _texts(self, chunks):
+        """Étape 2 : construction de texte_complet"""
+        for chunk in chunks:
+            start = time.perf_counter()
+            chunk['texte_complet'] = build_texte_complet(chunk)
+            chunk['id'] = build_subject_ids(chunk)
+            self.stats['texts'].add(len(chunk), time.perf_counter() - start)
+            yield chunk
+
+    def _batches(self, chunks, skip_ids=None, seen_ids=None):
+        """
+        Découpe les morceaux en lots de taille batch_size
+        Les identifiants déjà indexés (skip_ids) ou en double sont ignorés
+        """
+        skip_ids = skip_ids if skip_ids is not None else set()
+        seen_ids = seen_ids if seen_ids is not None else set()
+        for chunk in chunks:
+            fresh = ~chunk['id'].isin(skip_ids) & ~chunk['id'].isin(seen_ids) & ~chunk['id'].duplicated()
+            seen_ids.update(chunk['id'])
+            chunk = chunk[fresh]
+            for start in range(0, len(chunk), self.batch_size):
+                part = chunk.iloc[start:start + self.batch_size]
+                yield part['id'].tolist(), part['texte_complet'].tolist(), part[['departement', 'niveau']].to_dict('records')
+
+    def run(self, csv_path, skip_ids=None, seen_ids=None):
+        """
+        Exécute le pipeline complet et retourne les statistiques par étape
+        """
+        print(f"🚚 Ingestion en flux de {csv_path} (lots de {self.batch_size})")
+        batches = self._batches(self._texts(self._read(csv_path)), skip_ids, seen_ids)
+        for ids, texts, metadatas in batches:
+            # Étape 3 : encodage du lot
+            start = time.perf_counter()
+            embeddings = self.embedding_manager.encode(texts)
+            self.stats['encode'].add(len(texts), time.perf_counter() - start)
+
+            # Étape 4 : upsert du lot
+            start = time.perf_counter()
+            self.collection.upsert(
+                ids=ids,
+                embeddings=embeddings.tolist(),
+                documents=texts,
+                metadatas=metadatas
+            )
+            self.stats['upsert'].add(len(texts), time.perf_counter() - start)
+
+        self.report()
+        return self.get_stats()
+
+    def sync(self, csv_path):
+        """
+        Synchronise la collection avec le CSV : seules les lignes ajoutées ou modifiées
+        sont encodées, les lignes disparues sont supprimées.
+        Les ajouts précèdent les suppressions : une ligne modifiée n'est jamais absente de l'index.
+        """
+        start = time.perf_counter()
+        indexed_ids = set(self.collection.list_ids())
+        seen_ids = set()
+        self.run(csv_path, skip_ids=indexed_ids, seen_ids=seen_ids)
+
+        removed_ids = list(indexed_ids - seen_ids)
+        for i in range(0, len(removed_ids), self.batch_size):
+            self.collection.delete(ids=removed_ids[i:i + self.batch_size])
+
+        result = {
+            'added': self.stats['upsert'].rows,
+            'removed': len(removed_ids),
+            'unchanged': len(seen_ids & indexed_ids),
+            'seconds': round(time.perf_counter() - start, 4)
+        }
+        print(f"🔁 Synchronisation: +{result['added']} / -{result['removed']} ({result['unchanged']} inchangés)")
+        return result
+
+    def get_stats(self):
+        return {name: stage.as_dict() for name, stage in self.stats.items()}
+
+    def report(self):
+        for name, stage in self.stats.items():
+            print(f"   📈 {name:<7} {stage.rows} lignes en {stage.seconds:.2f}s ({stage.rows_per_sec:.0f} lignes/s)")
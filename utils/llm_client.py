@@ -0,0 +1,286 @@
+# utils/llm_client.py
+"""
+Client asynchrone pour Gemma avec limitation de débit (seaux à jetons)
+Les quotas (requêtes/min et tokens/min) sont partagés par tout le processus
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager
+from utils.resilience import get_resilient_caller
+
+def estimate_tokens(text):
+    """Estimation grossière du nombre de tokens (≈ 4 caractères par token)"""
+    return len(text) // 4 + 1
+
+def is_rate_limit_error(error):
+    """Détecte une erreur 429 / quota dépassé de l'API Google"""
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(error)
+
+class TokenBucket:
+    """
+    Seau à jetons : capacité maximale, remplissage continu à rate_per_minute.
+    Le niveau peut devenir négatif (dette) après une correction sur l'usage réel.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = None
+        # Niveau lu et corrigé depuis d'autres threads (télémétrie Streamlit/API, record_usage)
+        self._state_lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, amount):
+        """Prélève amount jetons s'ils sont disponibles ; sinon retourne le délai d'attente"""
+        with self._state_lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return None
+            return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount=1):
+        """Attend que amount jetons soient disponibles, retourne le temps d'attente"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                delay = self._take(amount)
+                if delay is None:
+                    return waited
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, delta):
+        """Corrige le niveau après coup (delta > 0 : consommation supplémentaire)"""
+        with self._state_lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+    def drain(self):
+        """Vide le seau (après un 429, on laisse le quota se reconstituer)"""
+        with self._state_lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+    def level(self):
+        """Niveau courant, calculé sans modifier le seau"""
+        with self._state_lock:
+            return min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+class QuotaManager:
+    """Quotas partagés requêtes/min et tokens/min, avec télémétrie"""
+    def __init__(self, requests_per_minute=30, tokens_per_minute=15000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.stats = {
+            'requests': 0,
+            'tokens': 0,
+            'throttled_s': 0.0,
+            'rate_limited': 0,
+            'errors': 0,
+        }
+
+    async def acquire(self, estimated_tokens):
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(estimated_tokens)
+        self.stats['requests'] += 1
+        self.stats['throttled_s'] += waited
+        return waited
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        if actual_tokens:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+        self.stats['tokens'] += actual_tokens or estimated_tokens
+
+    def record_error(self, error):
+        if is_rate_limit_error(error):
+            self.stats['rate_limited'] += 1
+            self.requests.drain()
+            self.tokens.drain()
+        else:
+            self.stats['errors'] += 1
+
+    def get_stats(self):
+        return dict(
+            self.stats,
+            throttled_s=round(self.stats['throttled_s'], 2),
+            requests_available=round(self.requests.level(), 1),
+            tokens_available=round(self.tokens.level()),
+        )
+
+# Boucle asyncio partagée (thread d'arrière-plan) et quotas par modèle
+_loop = None
+_loop_lock = threading.Lock()
+_quotas = {}
+
+def get_event_loop():
+    """Boucle asyncio du processus, exécutée dans un thread démon"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
+
+def get_quota_manager(model_name):
+    """
+    Quota partagé par modèle (GEMMA_RPM et GEMMA_TPM, par défaut 30 requêtes et 15000 tokens/min)
+    """
+    with _loop_lock:
+        if model_name not in _quotas:
+            _quotas[model_name] = QuotaManager(
+                requests_per_minute=int(os.getenv("GEMMA_RPM", "30")),
+                tokens_per_minute=int(os.getenv("GEMMA_TPM", "15000"))
+            )
+        return _quotas[model_name]
+
+class AsyncGemmaClient:
+    """
+    Enveloppe asynchrone d'un google.generativeai.GenerativeModel :
+    quotas partagés, concurrence bornée et télémétrie.
+    Les méthodes *_sync permettent l'appel depuis un thread synchrone (Streamlit).
+    """
+    def __init__(self, model, model_name, max_concurrency=None, quota=None, resilience=None):
+        self.model = model
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency or int(os.getenv("GEMMA_MAX_CONCURRENCY", "4"))
+        self.quota = quota or get_quota_manager(model_name)
+        # Relances, hedging et disjoncteur (partagés par modèle)
+        self.resilience = resilience or get_resilient_caller(model_name)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._semaphore = None
+
+    async def _slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _estimate(self, prompt, generation_config):
+        # Entrée + moitié du plafond de sortie, corrigé ensuite avec l'usage réel
+        return estimate_tokens(prompt) + generation_config.get("max_output_tokens", 1024) // 2
+
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", 0) or 0
+
+    @asynccontextmanager
+    async def _admission(self, estimated):
+        """Place de concurrence puis quotas, tenus pendant un essai"""
+        async with await self._slot():
+            await self.quota.acquire(estimated)
+            yield
+
+    async def generate(self, prompt, generation_config):
+        """Appel complet (avec relances et hedging), retourne la réponse de l'API"""
+        estimated = self._estimate(prompt, generation_config)
+        # L'attente des quotas est hors échéance : un étranglement n'ouvre pas le disjoncteur
+        return await self.resilience.call(lambda: self._generate_once(prompt, generation_config, estimated),
+                                          admit=lambda: self._admission(estimated))
+
+    async def stream(self, prompt, generation_config):
+        """Appel en flux (relances avant le premier fragment) : générateur asynchrone de textes"""
+        estimated = self._estimate(prompt, generation_config)
+        chunks = self.resilience.stream(lambda: self._stream_once(prompt, generation_config, estimated),
+                                        admit=lambda: self._admission(estimated))
+        try:
+            async for text in chunks:
+                yield text
+        finally:
+            await chunks.aclose()
+
+    async def _generate_once(self, prompt, generation_config, estimated):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            response = await self.model.generate_content_async(prompt, generation_config=generation_config)
+            self.quota.record_usage(estimated, self._usage(response))
+            return response
+        except Exception as e:
+            self.quota.record_error(e)
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def _stream_once(self, prompt, generation_config, estimated):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        response = None
+        try:
+            response = await self.model.generate_content_async(
+                prompt, generation_config=generation_config, stream=True
+            )
+            async for chunk in response:
+                yield chunk.text
+            self.quota.record_usage(estimated, self._usage(response))
+        except Exception as e:
+            self.quota.record_error(e)
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def submit(self, prompt, generation_config):
+        """Lance l'appel sur la boucle partagée, retourne un concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self.generate(prompt, generation_config), get_event_loop())
+
+    def generate_sync(self, prompt, generation_config, timeout=None):
+        return self.submit(prompt, generation_config).result(timeout)
+
+    def record_fallback(self):
+        self.resilience.record_fallback()
+
+    def stream_sync(self, prompt, generation_config, heartbeat=None):
+        """
+        Consomme le flux asynchrone depuis un thread synchrone
+        heartbeat : sans fragment pendant ce délai (s), produit None (surveillance d'échéance)
+        """
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for text in self.stream(prompt, generation_config):
+                    chunks.put(("chunk", text))
+                chunks.put(("end", None))
+            except Exception as e:
+                chunks.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), get_event_loop())
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # Lecteur arrêté avant la fin (arrêt anticipé) : on annule l'appel en cours
+            if not future.done():
+                future.cancel()
+
+    def get_stats(self):
+        return dict(
+            self.quota.get_stats(),
+            resilience=self.resilience.get_stats(),
+            model=self.model_name,
+            in_flight=self.in_flight,
+            max_in_flight=self.max_in_flight,
+            max_concurrency=self.max_concurrency,
+        )
@@ -0,0 +1,133 @@
+# utils/local_recommender.py
+"""
+Recommandateur local (sans LLM), construit à partir des sujets d'archives retrouvés
+Réponse en quelques millisecondes, au même format Markdown que Gemma : sert de
+réponse provisoire quand le LLM dépasse l'échéance, et de secours quand il échoue
+"""
+import re
+import time
+from typing import Dict, List
+from utils.context_packer import compress_resume
+from utils.sparse_index import tokenize
+from utils.structured_output import render_markdown
+
+# Démarche suggérée selon le verbe d'action du titre archivé
+METHODOLOGIES = (
+    (("conception", "développement", "realisation", "réalisation", "mise en place", "application"),
+     "Prototypage : cahier des charges, réalisation itérative puis tests utilisateurs"),
+    (("optimisation", "amélioration", "amelioration"),
+     "Expérimentation comparative : situation de référence, variante proposée, mesures avant/après"),
+    (("étude", "etude", "analyse", "évaluation", "evaluation"),
+     "Étude analytique : revue de littérature, collecte de données de terrain et analyse critique"),
+)
+DEFAULT_METHODOLOGY = "Étude de cas : état de l'art, modélisation puis validation sur un cas réel"
+
+LEVEL_SCOPE = {
+    "débutant": "périmètre volontairement réduit, réalisable avec des outils standards",
+    "intermédiaire": "périmètre réaliste pour 4 mois, avec une validation expérimentale",
+    "avancé": "contribution originale attendue, avec une évaluation quantitative approfondie",
+}
+
+LEVEL_ADVICE = {
+    "débutant": "Choisissez l'option dont le prototype peut être montré en 6 semaines, et validez le périmètre avec votre directeur dès le premier mois.",
+    "intermédiaire": "Réservez le premier mois à l'état de l'art et aux données : c'est ce qui décide de la faisabilité. Un directeur ayant encadré le sujet d'archive est un atout.",
+    "avancé": "Visez une contribution mesurable (gain chiffré, comparaison avec l'existant) et planifiez la rédaction en parallèle des expérimentations.",
+}
+
+# Mots trop génériques pour servir de mots-clés (forme normalisée par tokenize)
+GENERIC_TERMS = frozenset(tokenize(
+    "conception développement étude analyse réalisation optimisation amélioration évaluation "
+    "mise place système projet mémoire propose proposition utilisant permettant"
+))
+
+def format_output(response: str, query: str, level: str, time_taken: float, note: str = "") -> str:
+    """En-tête commun des réponses (LLM, cache ou local)"""
+    header = f"""
+---
+**Analyse pour :** {query} | **Niveau :** {level} | **Temps :** {time_taken:.1f}s
+---
+"""
+    if note:
+        header += f"\n> {note}\n"
+    return header + response
+
+def _keywords(doc, query, limit=3):
+    """Mots du titre (puis du résumé) absents de la requête, dans leur forme d'origine"""
+    query_terms = set(tokenize(query))
+    keywords, seen = [], set()
+    for field in ('titre', 'resume'):
+        for word in re.findall(r"[\w'-]+", str(doc.get(field) or "")):
+            word = word.split("'")[-1]
+            terms = tokenize(word)
+            if len(word) < 4 or not terms or terms[0] in GENERIC_TERMS or terms[0] in seen or terms[0] in query_terms:
+                continue
+            seen.add(terms[0])
+            keywords.append(word.lower())
+            if len(keywords) == limit:
+                return keywords
+    return keywords
+
+def _methodology(titre):
+    titre = titre.lower()
+    for verbs, methodology in METHODOLOGIES:
+        if any(titre.startswith(verb) or f" {verb}" in titre for verb in verbs):
+            return methodology
+    return DEFAULT_METHODOLOGY
+
+class LocalRecommender:
+    """
+    Propositions dérivées des sujets d'archives les mieux classés :
+    une variante par sujet, orientée vers l'intérêt de l'étudiant
+    """
+    def __init__(self, max_options=3, resume_tokens=40):
+        self.max_options = max_options
+        self.resume_tokens = resume_tokens
+
+    def build_data(self, query: str, context: List[Dict], student_level: str = "intermédiaire") -> Dict:
+        """Propositions structurées (même schéma que le mode JSON du LLM)"""
+        ranked = sorted(context or [], key=lambda doc: doc.get('score') or 0.0, reverse=True)
+        # Titres vides ou réduits à de la ponctuation ignorés
+        ranked = [(doc, str(doc.get('titre') or "").strip().rstrip('.').strip()) for doc in ranked]
+        ranked = [(doc, titre) for doc, titre in ranked if titre][:self.max_options]
+        scope = LEVEL_SCOPE.get(student_level, LEVEL_SCOPE["intermédiaire"])
+        query = query.strip()
+
+        options = []
+        if not ranked:
+            options.append({
+                'titre': f"{query[:1].upper() + query[1:]} — état de l'art et prototype",
+                'problematique': f"Quelles solutions existantes répondent à « {query} », et comment les améliorer dans le contexte local ?",
+                'lien_archives': "Aucun sujet d'archive proche : thème nouveau pour la faculté.",
+                'methodologie': f"{DEFAULT_METHODOLOGY} ({scope})",
+                'mots_cles': _keywords({'titre': query}, "", 3) or [query],
+            })
+
+        for doc, titre in ranked:
+            departement = doc.get('departement') or "département non précisé"
+            resume = compress_resume(doc.get('resume'), self.resume_tokens)
+            link = f"Prolonge « {titre} » ({departement})"
+            if resume:
+                link += f" : {resume}"
+            options.append({
+                'titre': f"{titre} — variante orientée « {query} »",
+                'problematique': f"Comment adapter l'approche « {titre[0].lower() + titre[1:]} » pour répondre à « {query} » ?",
+                'lien_archives': link,
+                'methodologie': f"{_methodology(titre)} ({scope})",
+                'mots_cles': _keywords(doc, query) or [departement.lower()],
+            })
+
+        return {
+            'options': options,
+            'conseil': LEVEL_ADVICE.get(student_level, LEVEL_ADVICE["intermédiaire"]),
+        }
+
+    def build(self, query: str, context: List[Dict], student_level: str = "intermédiaire") -> str:
+        """Corps Markdown (sans en-tête), au format du prompt Gemma"""
+        return render_markdown(self.build_data(query, context, student_level))
+
+    def generate_recommendations(self, query, context, student_level="intermédiaire", note=""):
+        """Réponse complète avec en-tête (même interface que RecommenderSystem)"""
+        start_time = time.time()
+        body = self.build(query, context, student_level)
+        return format_output(body, query, student_level, time.time() - start_time,
+                             note or "Propositions construites localement à partir des archives (sans IA).")
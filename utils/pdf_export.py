@@ -0,0 +1,242 @@
+# utils/pdf_export.py
+"""
+Export PDF des recommandations
+Police TrueType Unicode (accents, symboles, emojis si une police de secours est
+disponible), documents mis en cache par empreinte du contenu et rendus à la
+demande dans un thread d'arrière-plan : une réexécution Streamlit ne coûte
+plus qu'une recherche dans le cache
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from utils.lru import LRUCache
+from utils.tracing import get_tracer
+
+# Emplacements usuels des polices (PDF_FONT_PATH / PDF_FALLBACK_FONT_PATH prioritaires)
+FONT_CANDIDATES = (
+    "fonts/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/DejaVuSans.ttf",
+    "C:/Windows/Fonts/DejaVuSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+)
+FALLBACK_FONT_CANDIDATES = (
+    "fonts/Symbola.ttf",
+    "/usr/share/fonts/truetype/ancient-scripts/Symbola_hint.ttf",
+    "/usr/share/fonts/truetype/symbola/Symbola.ttf",
+    "C:/Windows/Fonts/seguisym.ttf",
+)
+
+# Plages Unicode conservées dans les polices réduites : latin (accents), grec,
+# ponctuation, symboles et flèches ; la police de secours garde symboles et emojis
+TEXT_UNICODE_RANGES = ((0x20, 0x3FF), (0x1E00, 0x1EFF), (0x2000, 0x2BFF), (0xFB00, 0xFB06))
+FALLBACK_UNICODE_RANGES = ((0x2000, 0x2BFF), (0x1F000, 0x1FAFF))
+FONT_CACHE_DIR = os.getenv("PDF_FONT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pdf_fonts"))
+
+# Marqueurs Markdown de fpdf2 hors gras (souligné, italique, barré) : échappés dans le texte
+_MARKDOWN_MARKERS = re.compile(r"(--|__|~~)")
+
+# Emojis et pictogrammes (retirés si aucune police ne peut les afficher)
+_EMOJI = re.compile("[\U0001F300-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]")
+_LATIN1_REPLACEMENTS = {'🎯': '-', '✅': 'OK', '⚙️': '*', '—': '-', '«': '"', '»': '"', '’': "'", '…': '...'}
+
+def _first_existing(env_var, candidates):
+    for path in (os.getenv(env_var),) + tuple(candidates):
+        if path and os.path.exists(path):
+            return path
+    return None
+
+@lru_cache(maxsize=1)
+def resolve_fonts():
+    """
+    (police principale, variante grasse, police de secours) ; None si introuvable
+    Résolu une seule fois par processus
+    """
+    regular = _first_existing("PDF_FONT_PATH", FONT_CANDIDATES)
+    bold = None
+    if regular:
+        root, ext = os.path.splitext(regular)
+        for candidate in (f"{root}-Bold{ext}", f"{root}bd{ext}"):
+            if os.path.exists(candidate):
+                bold = candidate
+                break
+    return regular, bold, _first_existing("PDF_FALLBACK_FONT_PATH", FALLBACK_FONT_CANDIDATES)
+
+@lru_cache(maxsize=8)
+def reduced_font(path, ranges):
+    """
+    Police réduite aux plages utiles, calculée une fois puis conservée sur disque
+    (FONT_CACHE_DIR, partagé entre processus) : chaque rendu analyse quelques
+    centaines de glyphes au lieu de la police complète
+    Retourne la police d'origine si la réduction échoue
+    """
+    try:
+        stat = os.stat(path)
+        signature = repr((os.path.abspath(path), stat.st_size, stat.st_mtime_ns, ranges))
+        digest = hashlib.sha256(signature.encode("utf-8")).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(path))[0]
+        target = os.path.join(FONT_CACHE_DIR, f"{name}.{digest}.ttf")
+        if not os.path.exists(target):
+            from fontTools import subset, ttLib
+            options = subset.Options()
+            options.layout_features = ["*"]
+            options.name_IDs = ["*"]
+            options.notdef_outline = True
+            font = ttLib.TTFont(path)
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=[c for start, end in ranges for c in range(start, end + 1)])
+            subsetter.subset(font)
+            os.makedirs(FONT_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            font.save(tmp_path)
+            os.replace(tmp_path, target)
+        return target
+    except Exception as e:
+        print(f"⚠️ Réduction de la police {path} impossible, police complète utilisée: {e}")
+        return path
+
+def _setup_fonts(pdf):
+    """Enregistre la police Unicode ; retourne (famille, gras disponible, emojis affichables)"""
+    regular, bold, fallback = resolve_fonts()
+    if regular is None:
+        return "Helvetica", True, False
+    pdf.add_font("Unicode", "", reduced_font(regular, TEXT_UNICODE_RANGES))
+    if bold:
+        pdf.add_font("Unicode", "B", reduced_font(bold, TEXT_UNICODE_RANGES))
+    emojis = False
+    if fallback and hasattr(pdf, "set_fallback_fonts"):
+        pdf.add_font("Secours", "", reduced_font(fallback, FALLBACK_UNICODE_RANGES))
+        pdf.set_fallback_fonts(["Secours"])
+        emojis = True
+    return "Unicode", bool(bold), emojis
+
+def _clean(text, unicode_font, emojis):
+    if not unicode_font:
+        # Police PDF standard (latin-1) : dernier recours si aucune police TTF n'est installée
+        for source, target in _LATIN1_REPLACEMENTS.items():
+            text = text.replace(source, target)
+        return _EMOJI.sub("", text).encode('latin-1', 'ignore').decode('latin-1')
+    return text if emojis else _EMOJI.sub("", text)
+
+def create_pdf(recommendation_text, student_name="Étudiant"):
+    """Rapport PDF (bytes) : titres Markdown en gras, séparateurs en filets"""
+    # Import différé : fpdf n'est nécessaire qu'à l'export
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+
+    pdf = FPDF()
+    family, has_bold, emojis = _setup_fonts(pdf)
+    unicode_font = family != "Helvetica"
+    bold = "B" if has_bold else ""
+    pdf.add_page()
+
+    # Titre du rapport
+    pdf.set_font(family, bold, 16)
+    pdf.cell(190, 10, "Rapport d'Orientation Académique - FST",
+             new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    pdf.ln(10)
+
+    # Infos étudiant
+    pdf.set_font(family, "", 12)
+    pdf.cell(190, 10, _clean(f"Destinataire : {student_name}", unicode_font, emojis),
+             new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.cell(190, 10, f"Date : {time.strftime('%d/%m/%Y')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(5)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(10)
+
+    # Contenu : rendu ligne à ligne du Markdown produit par le recommandeur
+    for line in _clean(recommendation_text, unicode_font, emojis).splitlines():
+        stripped = line.strip()
+        if stripped == "---":
+            pdf.ln(2)
+            pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+            pdf.ln(4)
+        elif stripped.startswith("#"):
+            pdf.set_font(family, bold, 13 if stripped.startswith("##") else 14)
+            pdf.multi_cell(0, 8, stripped.lstrip("#").strip(), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        elif stripped:
+            pdf.set_font(family, "", 11)
+            text = re.sub(r"^[*-]\s+", "• " if unicode_font else "- ", stripped)
+            # Markdown réservé aux lignes en gras ; « C-- » ou « __init__ » restent littéraux
+            markdown = has_bold and "**" in text
+            if markdown:
+                text = _MARKDOWN_MARKERS.sub(r"\\\1", text.replace("\\", "\\\\"))
+            pdf.multi_cell(0, 7, text, markdown=markdown, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        else:
+            pdf.ln(3)
+
+    return bytes(pdf.output())
+
+def pdf_key(recommendation_text, student_name="Étudiant"):
+    """Empreinte du document : contenu, destinataire et date (imprimée dans le rapport)"""
+    payload = "\x00".join((recommendation_text, student_name, time.strftime('%d/%m/%Y')))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PdfRenderer:
+    """
+    Cache LRU des PDF par empreinte du contenu, rendu en arrière-plan (un seul
+    rendu en cours par document, même si plusieurs sessions le demandent)
+    """
+    def __init__(self, maxsize=32, workers=1):
+        self.cache = LRUCache(maxsize=maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-render")
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def get(self, recommendation_text, student_name="Étudiant"):
+        """PDF déjà rendu, ou None (aucun rendu déclenché)"""
+        return self.cache.get(pdf_key(recommendation_text, student_name))
+
+    def prefetch(self, recommendation_text, student_name="Étudiant"):
+        """Lance le rendu en arrière-plan si le document n'est ni en cache ni en cours ; retourne le Future"""
+        key = pdf_key(recommendation_text, student_name)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            if key in self.cache:
+                return None
+            future = self._pending[key] = self._executor.submit(self._render, key, recommendation_text, student_name)
+            return future
+
+    def render(self, recommendation_text, student_name="Étudiant", timeout=None):
+        """PDF (bytes), rendu si nécessaire ; attend un rendu déjà en cours"""
+        pdf_bytes = self.get(recommendation_text, student_name)
+        if pdf_bytes is not None:
+            return pdf_bytes
+        future = self.prefetch(recommendation_text, student_name)
+        if future is None:
+            return self.get(recommendation_text, student_name)
+        return future.result(timeout)
+
+    def _render(self, key, recommendation_text, student_name):
+        try:
+            with get_tracer().span("pdf_render"):
+                pdf_bytes = create_pdf(recommendation_text, student_name)
+            self.cache.put(key, pdf_bytes)
+            self.renders += 1
+            return pdf_bytes
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def get_stats(self):
+        return dict(self.cache.get_stats(), renders=self.renders, pending=len(self._pending))
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_pdf_renderer():
+    """Moteur de rendu partagé par toutes les sessions du processus"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PdfRenderer()
+        return _renderer
@@ -0,0 +1,280 @@
+# utils/pipeline.py
+"""
+Pipeline de recommandation : filtres -> recherche -> contexte -> génération
+Chaque étape est une méthode publique, mesurable isolément ; les composants
+(embeddings, index, corpus, recommender) sont injectés au constructeur.
+Utilisé par l'interface Streamlit, l'API HTTP et le mode batch.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from utils.data_loader import build_subject_index, filter_by_department
+from utils.embeddings import SearchHit
+from utils.local_recommender import LocalRecommender
+from utils.tracing import QUANTILES, LatencyHistogram
+
+# Étapes mesurées, dans l'ordre d'exécution
+PIPELINE_STAGES = ("filters", "retrieval", "context", "generation")
+
+@dataclass
+class PipelineResult:
+    """État d'une requête au fil des étapes (timings en secondes)"""
+    query: str
+    student_level: str = "intermédiaire"
+    departements: Optional[List[str]] = None
+    niveau: Optional[str] = None
+    hits: List[SearchHit] = field(default_factory=list)
+    context: List[Dict] = field(default_factory=list)
+    text: Optional[str] = None
+    data: Optional[Dict] = None
+    local: bool = False         # réponse construite localement (sans LLM ou en secours)
+    fallback: bool = False      # LLM en échec ou échéance manquée : réponse de secours
+    degraded: bool = False      # échéance RECOMMENDATION_SLO_S dépassée
+    from_cache: bool = False    # servie par le cache sémantique des réponses
+    stream: object = None       # RecommendationStream (origine de la réponse)
+    timings: Dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.perf_counter)
+
+class RecommendationPipeline:
+    """
+    embedding_manager / collection : recherche sémantique (None : contexte tiré du corpus)
+    corpus : CorpusWatcher (version courante du corpus), ou df : DataFrame figé
+    recommender : RecommenderSystem ou LocalRecommender (None : réponse locale)
+    """
+    def __init__(self, embedding_manager=None, collection=None, corpus=None, df=None, recommender=None,
+                 local=None, n_results=4, min_context=2, sample_size=3):
+        self.embedding_manager = embedding_manager
+        self.collection = collection
+        self.corpus = corpus
+        self.df = df
+        self.recommender = recommender
+        self.local = local or LocalRecommender()
+        self.n_results = n_results
+        self.min_context = min_context
+        self.sample_size = sample_size
+        self._subjects = None
+        self._histograms = {stage: LatencyHistogram() for stage in PIPELINE_STAGES}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Mesure des étapes
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _stage(self, result, name):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._observe(result, name, time.perf_counter() - start, error)
+
+    def _observe(self, result, name, seconds, error=None):
+        result.timings[name] = result.timings.get(name, 0.0) + seconds
+        with self._lock:
+            self._histograms[name].observe(seconds, error is not None)
+
+    def get_stats(self):
+        """{étape: {'count', 'errors', 'p50', 'p95', 'p99'}} en secondes"""
+        with self._lock:
+            return {
+                stage: dict(
+                    count=h.count,
+                    errors=h.errors,
+                    **{f"p{int(q * 100)}": h.quantile(q) for q in QUANTILES}
+                )
+                for stage, h in self._histograms.items()
+            }
+
+    def snapshot(self):
+        """Version courante du corpus : (DataFrame ou None, index id -> sujet)"""
+        if self.corpus is not None:
+            return self.corpus.snapshot()
+        if self.df is None:
+            return None, {}
+        if self._subjects is None:
+            self._subjects = build_subject_index(self.df)
+        return self.df, self._subjects
+
+    # ------------------------------------------------------------------
+    # Étapes
+    # ------------------------------------------------------------------
+    @staticmethod
+    def filters(student_level, departements=None):
+        """
+        (départements, niveau) appliqués dans l'index
+        "Tous départements" ou aucune sélection : pas de filtre ; le niveau
+        intermédiaire (niveau par défaut) ne filtre pas le corpus
+        """
+        if not departements or "Tous départements" in departements:
+            departements = None
+        niveau = student_level if student_level != "intermédiaire" else None
+        return departements, niveau
+
+    def retrieve(self, query, departements=None, niveau=None, n_results=None, events=None) -> List[SearchHit]:
+        """Recherche sémantique (résultats typés, résolus via l'index id -> sujet)"""
+        if self.embedding_manager is None or self.collection is None:
+            return []
+        _, subjects = self.snapshot()
+        return self.embedding_manager.search_similar(
+            query=query,
+            collection=self.collection,
+            subjects=subjects,
+            n_results=n_results or self.n_results,
+            departements=departements,
+            niveau=niveau,
+            events=events
+        )
+
+    def retrieve_many(self, queries, departements=None, niveau=None, n_results=None) -> List[List[SearchHit]]:
+        """Recherche par lot (mêmes filtres) : un encodage et une interrogation de l'index"""
+        if self.embedding_manager is None or self.collection is None:
+            return [[] for _ in queries]
+        _, subjects = self.snapshot()
+        return self.embedding_manager.search_many(
+            queries,
+            collection=self.collection,
+            subjects=subjects,
+            n_results=n_results or self.n_results,
+            departements=departements,
+            niveau=niveau
+        )
+
+    def build_context(self, hits, student_level="intermédiaire", departements=None) -> List[Dict]:
+        """
+        Contexte du prompt : les sujets retrouvés, complétés par un tirage du corpus
+        filtré quand la recherche en retourne trop peu
+        """
+        context = [hit.to_dict() for hit in hits]
+        if len(context) >= self.min_context:
+            return context
+        df, _ = self.snapshot()
+        if df is None or df.empty:
+            # Mode sans données
+            return context or [{
+                'titre': 'Projets académiques références',
+                'departement': 'Génie Informatique',
+                'niveau': student_level
+            }]
+        filtered_df = filter_by_department(df, departements)
+        if filtered_df.empty:
+            return context
+        return filtered_df.sample(min(self.sample_size, len(filtered_df))).to_dict('records')
+
+    def generate(self, result):
+        """Génère la réponse complète (échéance comptée depuis le début de la requête)"""
+        with self._stage(result, "generation"):
+            if not hasattr(self.recommender, "stream_recommendations"):
+                # Pas de LLM (mode démo ou initialisation en échec) : propositions locales
+                result.local = True
+                result.text = (self.recommender or self.local).generate_recommendations(
+                    result.query, result.context, result.student_level
+                )
+            else:
+                result.stream = self.recommender.generate_result(
+                    query=result.query,
+                    context=result.context,
+                    student_level=result.student_level,
+                    query_embedding=self._query_embedding(result.query),
+                    started_at=result.started_at
+                )
+                self._record_outcome(result)
+        return result
+
+    @staticmethod
+    def _record_outcome(result):
+        """Texte et origine de la réponse, depuis le RecommendationStream terminé"""
+        stream = result.stream
+        result.text, result.data = stream.text, stream.data
+        result.fallback, result.degraded, result.from_cache = stream.fallback, stream.degraded, stream.from_cache
+        result.local = stream.fallback
+
+    def stream(self, result, events=None):
+        """
+        Variante en flux de generate : itère sur les fragments ; result.stream
+        (RecommendationStream) porte le texte visible à chaque instant
+        En fin de flux, result.text et result.data sont renseignés
+        """
+        if not hasattr(self.recommender, "stream_recommendations"):
+            self.generate(result)
+            yield result.text
+            return
+        start = time.perf_counter()
+        error = None
+        stream = result.stream = self.recommender.stream_recommendations(
+            query=result.query,
+            context=result.context,
+            student_level=result.student_level,
+            query_embedding=self._query_embedding(result.query),
+            events=events
+        )
+        chunks = iter(stream)
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            chunks.close()
+            self._record_outcome(result)
+            self._observe(result, "generation", time.perf_counter() - start, error)
+
+    def _query_embedding(self, query):
+        # Vecteur déjà en cache après la recherche : active le cache sémantique des réponses
+        if self.embedding_manager is None:
+            return None
+        return self.embedding_manager.encode_query(query)
+
+    # ------------------------------------------------------------------
+    # Enchaînement
+    # ------------------------------------------------------------------
+    def prepare(self, query, student_level="intermédiaire", departements=None, events=None,
+                n_results=None) -> PipelineResult:
+        """Étapes filtres, recherche et contexte ; la génération reste à lancer"""
+        result = PipelineResult(query=query, student_level=student_level)
+        with self._stage(result, "filters"):
+            result.departements, result.niveau = self.filters(student_level, departements)
+        with self._stage(result, "retrieval"):
+            result.hits = self.retrieve(query, result.departements, result.niveau, n_results, events)
+        with self._stage(result, "context"):
+            result.context = self.build_context(result.hits, student_level, result.departements)
+        return result
+
+    def prepare_many(self, requests, n_results=None) -> List[PipelineResult]:
+        """
+        prepare pour un lot de requêtes [(requête, niveau, départements)] :
+        les requêtes partageant les mêmes filtres sont recherchées en un seul lot
+        (durée de recherche répartie entre les requêtes du lot)
+        """
+        results, groups = [], {}
+        for query, student_level, departements in requests:
+            result = PipelineResult(query=query, student_level=student_level)
+            with self._stage(result, "filters"):
+                result.departements, result.niveau = self.filters(student_level, departements)
+            groups.setdefault((tuple(result.departements or ()), result.niveau), []).append(result)
+            results.append(result)
+
+        for group in groups.values():
+            start = time.perf_counter()
+            batch_hits = self.retrieve_many([result.query for result in group], group[0].departements,
+                                            group[0].niveau, n_results)
+            share = (time.perf_counter() - start) / len(group)
+            for result, hits in zip(group, batch_hits):
+                result.hits = hits
+                self._observe(result, "retrieval", share)
+
+        for result in results:
+            with self._stage(result, "context"):
+                result.context = self.build_context(result.hits, result.student_level, result.departements)
+        return results
+
+    def run(self, query, student_level="intermédiaire", departements=None, events=None,
+            n_results=None) -> PipelineResult:
+        """Pipeline complet, sans flux"""
+        result = self.prepare(query, student_level, departements, events, n_results)
+        return self.generate(result)
@@ -0,0 +1,38 @@
+# utils/quality.py
+"""
+Contrôle de qualité des recommandations générées
+Vérifie la structure attendue par le prompt (Option 1/2/3, chacune avec sa problématique)
+"""
+import re
+import unicodedata
+
+_OPTION = re.compile(r"option\s*(\d)", re.IGNORECASE)
+_FRENCH_WORDS = re.compile(r"\b(de|la|le|les|des|du|pour|et|une|dans)\b", re.IGNORECASE)
+
+# Contrôles bloquants : un échec déclenche l'escalade vers le modèle suivant
+REQUIRED_CHECKS = ("Contient 3 options", "Problématique par option", "Longueur suffisante")
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def check_recommendation_quality(recommendations, expected_options=3, min_length=400):
+    """
+    Vérifie la structure d'une réponse
+    Retourne {'checks': {nom: bool}, 'score': 0-100, 'passed': bool}
+    """
+    text = recommendations or ""
+    folded = _fold(text)
+    options = {int(n) for n in _OPTION.findall(text)}
+    checks = {
+        "Contient 3 options": all(n in options for n in range(1, expected_options + 1)),
+        "Problématique par option": folded.count("problematique") >= expected_options,
+        "Longueur suffisante": len(text) >= min_length,
+        "En français": len(_FRENCH_WORDS.findall(text)) >= 10,
+        "Conseil du professeur": "conseil" in folded,
+    }
+    return {
+        'checks': checks,
+        'score': sum(checks.values()) / len(checks) * 100,
+        'passed': all(checks[name] for name in REQUIRED_CHECKS),
+    }
@@ -2,13 +2,85 @@
 Module de recommandation avec Google Gemma 3
 Version finale avec gestion d'erreurs robuste
 """
+import asyncio
+import concurrent.futures
+import math
 import os
-import google.generativeai as genai
+import re
 import time
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence
+from utils.context_packer import ContextPacker
+from utils.embeddings import normalize_query
+from utils.events import emit
+from utils.llm_client import AsyncGemmaClient, get_event_loop
+from utils.local_recommender import LocalRecommender, format_output
+from utils.quality import check_recommendation_quality
+from utils.response_cache import SemanticResponseCache
+from utils.single_flight import get_single_flight
+from utils.tracing import get_tracer
+from utils.structured_output import (
+    JSON_FORMAT_INSTRUCTIONS, IncrementalJSONParser, is_valid_recommendation,
+    parse_recommendation, render_markdown,
+)
+
+# Cascade de modèles, du plus rapide au plus coûteux (MODEL_CASCADE, séparés par des virgules)
+DEFAULT_MODEL_CASCADE = "gemma-3-4b-it,gemma-3-12b-it,gemma-3-27b-it"
+
+# Format Markdown libre (mode non structuré)
+MARKDOWN_FORMAT_INSTRUCTIONS = """### FORMAT DE SORTIE (Markdown strict) :
+# 🎓 PROPOSITIONS DE RECHERCHE PERSONNALISÉES
+
+---
+## 🏆 Option 1 : [Titre Scientifique Précis]
+* **Problématique :** [Question scientifique résolue]
+* **Lien avec les archives :** [Pourquoi c'est une amélioration des anciens travaux]
+* **Méthodologie suggérée :** [Étude/Prototypage/Analyse]
+* **Mots-clés :** [3 mots techniques]
+
+---
+## 🏆 Option 2 : [Titre Scientifique Précis]
+... (Répéter le format)
+
+---
+## 🏆 Option 3 : [Titre Scientifique Précis]
+... (Répéter le format)
+
+---
+## 💡 CONSEIL DU PROFESSEUR
+[Conseil sur la gestion du temps ou le choix du directeur]"""
+
+GENERATION_CONFIG = {
+    "temperature": 0.4, # Baissée pour plus de rigueur académique
+    "max_output_tokens": 1500,
+}
+
+class RecommendationStream:
+    """
+    Génération en flux : itérer sur l'objet donne les fragments de texte au fil de l'eau.
+    visible contient le texte à afficher à chaque instant : la réponse provisoire locale
+    (échéance dépassée) est remplacée par celle du LLM dès son premier fragment.
+    En fin de flux, text contient la sortie finale formatée (en-tête compris).
+    """
+    def __init__(self):
+        self.text = ""
+        self.visible = ""
+        self.ttft = None        # temps jusqu'au premier fragment (s)
+        self.elapsed = None     # durée totale (s)
+        self.from_cache = False
+        self.shared = False     # résultat partagé avec une requête identique en cours
+        self.fallback = False
+        self.degraded = False   # réponse locale affichée en attendant le LLM
+        self.model = None       # modèle de la cascade ayant produit la réponse
+        self.data = None        # recommandation structurée (mode JSON), sinon None
+        self._chunks = iter(())
+
+    def __iter__(self):
+        return self._chunks
 
 class RecommenderSystem:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, response_cache: Optional[SemanticResponseCache] = None,
+                 context_budget: Optional[int] = None, slo: Optional[float] = None,
+                 models: Optional[Sequence[str]] = None, structured: Optional[bool] = None):
         # Utiliser st.secrets en priorité si disponible, sinon os.getenv
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
         
@@ -16,52 +88,445 @@ class RecommenderSystem:
             raise ValueError("❌ Clé API Google manquante ! Configurez-la dans les secrets de déploiement.")
         
         try:
+            # Import différé : google.generativeai est lent à importer
+            import google.generativeai as genai
             genai.configure(api_key=self.api_key)
-            self.model_name = "gemma-3-4b-it"
-            self.model = genai.GenerativeModel(self.model_name)
-            print(f"✅ Modèle {self.model_name} initialisé")
+            self.models = list(models or [
+                name.strip() for name in os.getenv("MODEL_CASCADE", DEFAULT_MODEL_CASCADE).split(",") if name.strip()
+            ])
+            # Un client par modèle : quotas et résilience propres à chaque modèle
+            self.clients = [AsyncGemmaClient(genai.GenerativeModel(name), name) for name in self.models]
+            self.client = self.clients[0]
+            self.model_name = self.client.model_name
+            self.model = self.client.model
+            self.cascade_stats = {name: {'calls': 0, 'passed': 0, 'failed': 0, 'errors': 0} for name in self.models}
+            print(f"✅ Cascade de modèles initialisée : {' → '.join(self.models)}")
         except Exception as e:
             print(f"❌ Erreur d'initialisation: {e}")
             raise
+        
+        # Cache sémantique : requêtes quasi identiques servies sans appel à l'API
+        self.response_cache = response_cache if response_cache is not None else SemanticResponseCache()
+        # Requêtes identiques simultanées (toutes sessions) : un seul appel à l'API
+        self.flights = get_single_flight()
+        # Contexte du prompt borné en tokens (taille d'entrée et coût prévisibles)
+        self.context_packer = ContextPacker(budget=context_budget)
+        # Échéance de bout en bout (RECOMMENDATION_SLO_S) : au-delà, réponse locale immédiate
+        self.slo = slo or float(os.getenv("RECOMMENDATION_SLO_S", "8"))
+        self.local = LocalRecommender()
+        # Sortie JSON (STRUCTURED_OUTPUT, désactivée par défaut) : flux analysé au fil de l'eau,
+        # arrêté dès l'objet complet ; l'affichage attend en revanche la première option terminée
+        if structured is None:
+            structured = os.getenv("STRUCTURED_OUTPUT", "false").lower() == "true"
+        self.structured = structured
+        self.structured_stats = {'responses': 0, 'early_stops': 0, 'parse_failures': 0}
 
     def generate_recommendations(self, 
                                 query: str, 
                                 context: List[Dict], 
-                                student_level: str = "intermédiaire") -> str:
+                                student_level: str = "intermédiaire",
+                                query_embedding: Optional[Sequence[float]] = None,
+                                started_at: Optional[float] = None) -> str:
+        """
+        Génère les recommandations
+        query_embedding : vecteur de la requête, active le cache sémantique des réponses
+        started_at : début du pipeline (time.perf_counter), point de départ de l'échéance
+        Si le LLM manque l'échéance, la réponse locale est retournée ; celle du LLM
+        alimente le cache des réponses à son arrivée
+        """
+        return self.generate_result(query, context, student_level, query_embedding, started_at).text
+
+    def generate_result(self,
+                        query: str,
+                        context: List[Dict],
+                        student_level: str = "intermédiaire",
+                        query_embedding: Optional[Sequence[float]] = None,
+                        started_at: Optional[float] = None) -> RecommendationStream:
+        """
+        generate_recommendations avec l'origine de la réponse : RecommendationStream
+        terminé (text, data, model, from_cache, shared, fallback ; degraded si la
+        réponse locale vient d'une échéance manquée)
+        """
+        outcome = RecommendationStream()
+        start_time = time.time()
+        deadline_at = (started_at or time.perf_counter()) + self.slo
+        cached = self._lookup_cache(query, context, student_level, query_embedding)
+        if cached is not None:
+            outcome.from_cache = True
+            outcome.text, outcome.data = cached
+            return self._finish_result(outcome, start_time)
+        
+        key = self._flight_key(query, context, student_level)
+        call, leader = self.flights.acquire(key)
+        if not leader:
+            outcome.shared = True
+            outcome.text, reason = self._join_flight(call, query, context, student_level, deadline_at)
+            outcome.fallback = reason is not None
+            outcome.degraded = reason == "timeout"
+            return self._finish_result(outcome, start_time)
+        
+        result, error = None, None
         try:
-            context_str = self._format_context(context)
-            prompt = self._create_prompt(query, context_str, student_level)
-            
-            generation_config = {
-                "temperature": 0.4, # Baissée pour plus de rigueur académique
-                "max_output_tokens": 1500,
-            }
+            prompt = self._build_prompt(query, context, student_level)
             
-            start_time = time.time()
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
+            # La cascade s'exécute sur la boucle partagée : span parent transmis explicitement
+            future = asyncio.run_coroutine_threadsafe(
+                self._cascade_generate(prompt, parent=get_tracer().current()), get_event_loop()
             )
+            try:
+                result, outcome.data, outcome.model = future.result(self._remaining(deadline_at))
+            except concurrent.futures.TimeoutError:
+                # Le LLM continue : sa réponse servira les prochaines requêtes proches
+                future.add_done_callback(
+                    lambda done: self._store_late(done, context, student_level, query_embedding, start_time)
+                )
+                outcome.degraded = True
+                raise TimeoutError(f"échéance de {self.slo:.0f}s dépassée")
             
             elapsed_time = time.time() - start_time
-            result = response.text.strip()
             
-            return self._format_output(result, query, student_level, elapsed_time)
+            self._store_cache(result, context, student_level, query_embedding, elapsed_time, outcome.data)
+            outcome.text = self._format_output(result, query, student_level, elapsed_time)
             
         except Exception as e:
-            return self._get_fallback_recommendations(query, student_level, str(e))
+            error = e
+            result = None
+            outcome.fallback = True
+            outcome.data = outcome.model = None
+            self.client.record_fallback()
+            outcome.text = self._get_fallback_recommendations(query, context, student_level, str(e))
+        finally:
+            self._release_flight(key, result, error)
+        return self._finish_result(outcome, start_time)
+
+    @staticmethod
+    def _finish_result(outcome, start_time):
+        outcome.visible = outcome.text
+        outcome.elapsed = time.time() - start_time
+        outcome._chunks = iter((outcome.text,))
+        return outcome
+
+    def stream_recommendations(self,
+                               query: str,
+                               context: List[Dict],
+                               student_level: str = "intermédiaire",
+                               query_embedding: Optional[Sequence[float]] = None,
+                               events=None) -> RecommendationStream:
+        """
+        Variante en flux de generate_recommendations : les fragments sont transmis dès leur
+        réception, la latence perçue devient le temps jusqu'au premier fragment
+        events : bus PipelineEvents optionnel (étapes prompt, first_token, done) ;
+        son instant de création sert de départ à l'échéance RECOMMENDATION_SLO_S
+        """
+        stream = RecommendationStream()
+        stream._chunks = self._stream_chunks(stream, query, context, student_level, query_embedding, events)
+        return stream
 
-    def _format_context(self, context: List[Dict]) -> str:
-        if not context:
-            return "Aucun sujet de référence disponible."
+    def _stream_chunks(self, stream, query, context, student_level, query_embedding, events=None):
+        start_time = time.time()
+        deadline_at = (events.started_at if events is not None else time.perf_counter()) + self.slo
+        cached = self._lookup_cache(query, context, student_level, query_embedding)
+        if cached is not None:
+            stream.from_cache = True
+            stream.text, stream.data = cached
+            stream.visible = stream.text
+            stream.ttft = stream.elapsed = time.time() - start_time
+            emit(events, "first_token", cached=True)
+            yield stream.text
+            emit(events, "done", cached=True)
+            return
         
-        context_lines = []
-        for i, doc in enumerate(context[:5], 1): # On peut monter à 5 sujets
-            line = f"- {doc.get('titre')} (Dept: {doc.get('departement')})"
-            context_lines.append(line)
-        return "\n".join(context_lines)
+        key = self._flight_key(query, context, student_level)
+        call, leader = self.flights.acquire(key)
+        if not leader:
+            # Requête identique déjà en cours : on attend son résultat complet
+            stream.shared = True
+            if not call.wait(self._remaining(deadline_at)):
+                stream.degraded = True
+                stream.visible = self._provisional(query, context, student_level)
+                stream.ttft = time.time() - start_time
+                emit(events, "first_token", shared=True, degraded=True)
+                yield stream.visible
+            stream.text, reason = self._join_flight(call, query, context, student_level)
+            stream.fallback = reason is not None
+            stream.elapsed = time.time() - start_time
+            if stream.ttft is None:
+                stream.ttft = stream.elapsed
+                emit(events, "first_token", shared=True)
+            if not (stream.fallback and stream.degraded):
+                stream.visible = stream.text
+                yield stream.text
+            emit(events, "done", shared=True, elapsed=stream.elapsed)
+            return
+        
+        shown = False  # du texte du LLM a déjà été affiché
+        result, error = None, None
+        try:
+            prompt = self._build_prompt(query, context, student_level)
+            emit(events, "prompt", chars=len(prompt))
+            best = None
+            for rank, client in enumerate(self.clients):
+                last = rank == len(self.clients) - 1
+                parts = []
+                parser = IncrementalJSONParser() if self.structured else None
+                # Pulsations (None) toutes les 0.25 s pour surveiller l'échéance
+                model_start = time.perf_counter()
+                chunks = client.stream_sync(prompt, GENERATION_CONFIG, heartbeat=0.25)
+                try:
+                    for text in chunks:
+                        if text is None:
+                            if not shown and not stream.degraded and time.perf_counter() >= deadline_at:
+                                # Échéance manquée : réponse locale immédiate, remplacée à l'arrivée du LLM
+                                stream.degraded = True
+                                stream.visible = self._provisional(query, context, student_level)
+                                stream.ttft = time.time() - start_time
+                                emit(events, "first_token", ttft=stream.ttft, degraded=True)
+                                yield stream.visible
+                            continue
+                        if not text:
+                            continue
+                        if stream.ttft is None:
+                            stream.ttft = time.time() - start_time
+                            emit(events, "first_token", ttft=stream.ttft)
+                        # Remplace la réponse provisoire ou celle du modèle précédent
+                        shown = True
+                        parts.append(text)
+                        if parser is None:
+                            stream.visible = "".join(parts)
+                            yield text
+                            continue
+                        complete = parser.feed(text)
+                        # Affichage des options déjà terminées, rendues en Markdown
+                        stream.visible = (render_markdown(parser.partial()) if parser.started
+                                          else re.sub(r"^\s*```(json)?\s*", "", "".join(parts)))
+                        yield text
+                        if complete:
+                            # Objet JSON complet : inutile de payer la suite de la génération
+                            self.structured_stats['early_stops'] += 1
+                            break
+                except Exception as e:
+                    self.cascade_stats[client.model_name]['errors'] += 1
+                    get_tracer().record("llm", time.perf_counter() - model_start, error=e, backend=client.model_name)
+                    print(f"⚠️ {client.model_name} en erreur: {e}")
+                    if last and best is None:
+                        raise
+                    continue
+                finally:
+                    # Ferme le flux : annule l'appel en cours après un arrêt anticipé
+                    chunks.close()
+                
+                candidate, data = self._finalize("".join(parts), parser)
+                report = self._judge(client.model_name, candidate)
+                get_tracer().record("llm", time.perf_counter() - model_start, backend=client.model_name,
+                                    passed=report['passed'], chars=len(candidate))
+                if best is None or report['passed'] or report['score'] > best[0]:
+                    best = (100 if report['passed'] else report['score'], candidate, client.model_name, data)
+                if report['passed']:
+                    break
+                if not last:
+                    emit(events, "escalation", model=self.clients[rank + 1].model_name, score=report['score'])
+            
+            result, stream.model, stream.data = best[1], best[2], best[3]
+            if not result:
+                raise ValueError("réponse vide")
+            stream.elapsed = time.time() - start_time
+            self._store_cache(result, context, student_level, query_embedding, stream.elapsed, stream.data)
+            stream.text = stream.visible = self._format_output(result, query, student_level, stream.elapsed)
+            emit(events, "done", elapsed=stream.elapsed, model=stream.model)
+            
+        except Exception as e:
+            error = e
+            result = None
+            stream.fallback = True
+            self.client.record_fallback()
+            stream.elapsed = time.time() - start_time
+            stream.text = self._get_fallback_recommendations(query, context, student_level, str(e))
+            if not shown and not stream.degraded:
+                emit(events, "first_token", fallback=True)
+                stream.visible = stream.text
+                yield stream.text
+            elif shown:
+                stream.visible = stream.text
+            emit(events, "done", fallback=True, elapsed=stream.elapsed)
+        finally:
+            self._release_flight(key, result, error)
+
+    def _judge(self, model_name, candidate) -> Dict:
+        """Contrôle de structure d'une réponse et comptage par modèle de la cascade"""
+        report = check_recommendation_quality(candidate)
+        stats = self.cascade_stats[model_name]
+        stats['calls'] += 1
+        stats['passed' if report['passed'] else 'failed'] += 1
+        return report
+
+    def _finalize(self, raw, parser=None):
+        """
+        Réponse brute -> (Markdown, objet structuré ou None)
+        En mode JSON, l'objet est rendu au format Markdown habituel ; un JSON
+        invalide est conservé tel quel (le contrôle de structure décidera de l'escalade)
+        """
+        if not self.structured:
+            return raw.strip(), None
+        data = parser.data if parser is not None else None
+        if not is_valid_recommendation(data):
+            data = parse_recommendation(raw)
+        if data is None:
+            self.structured_stats['parse_failures'] += 1
+            return raw.strip(), None
+        self.structured_stats['responses'] += 1
+        return render_markdown(data), data
+
+    async def _generate_once(self, client, prompt):
+        """Un appel complet ; en mode JSON, le flux est coupé dès que l'objet est complet"""
+        if not self.structured:
+            response = await client.generate(prompt, GENERATION_CONFIG)
+            return self._finalize(response.text)
+        parser = IncrementalJSONParser()
+        chunks = client.stream(prompt, GENERATION_CONFIG)
+        try:
+            async for text in chunks:
+                if parser.feed(text):
+                    self.structured_stats['early_stops'] += 1
+                    break
+        finally:
+            await chunks.aclose()
+        return self._finalize(parser.text, parser)
+
+    async def _cascade_generate(self, prompt, parent=None):
+        """
+        Interroge les modèles dans l'ordre de la cascade : on s'arrête au premier dont
+        la réponse passe le contrôle de structure, sinon on garde la meilleure
+        Retourne (Markdown, objet structuré ou None, modèle retenu)
+        """
+        best = None
+        for rank, client in enumerate(self.clients):
+            model_start = time.perf_counter()
+            try:
+                candidate, data = await self._generate_once(client, prompt)
+            except Exception as e:
+                get_tracer().record("llm", time.perf_counter() - model_start, parent=parent, error=e,
+                                    backend=client.model_name)
+                self.cascade_stats[client.model_name]['errors'] += 1
+                print(f"⚠️ {client.model_name} en erreur: {e}")
+                if rank == len(self.clients) - 1 and best is None:
+                    raise
+                continue
+            report = self._judge(client.model_name, candidate)
+            get_tracer().record("llm", time.perf_counter() - model_start, parent=parent,
+                                backend=client.model_name, passed=report['passed'], chars=len(candidate))
+            if report['passed']:
+                return candidate, data, client.model_name
+            if best is None or report['score'] > best[0]:
+                best = (report['score'], candidate, data, client.model_name)
+        return best[1], best[2], best[3]
+
+    @staticmethod
+    def _flight_key(query, context, student_level):
+        """Clé des requêtes identiques : requête normalisée, niveau et sujets de contexte"""
+        context_ids = tuple(sorted(str(doc.get('id')) for doc in context if doc.get('id') is not None))
+        return normalize_query(query), student_level, context_ids
+
+    def _release_flight(self, key, result, error):
+        if result is None and error is None:
+            # Flux abandonné par le lecteur avant la fin : les requêtes en attente repartent en secours
+            error = RuntimeError("requête identique interrompue")
+        self.flights.release(key, result=result, error=error)
+
+    def _join_flight(self, call, query, context, student_level, deadline_at=None):
+        """
+        Attend le meneur d'une requête identique et formate son résultat
+        (jusqu'à deadline_at si fourni, sinon jusqu'à l'échéance des appels au LLM)
+        Retourne (texte, cause du secours : None, "timeout" ou "error")
+        """
+        start_time = time.time()
+        timeout = self._remaining(deadline_at) if deadline_at is not None else self.client.resilience.deadline + 5
+        if not call.wait(timeout):
+            self.client.record_fallback()
+            return self._get_fallback_recommendations(query, context, student_level,
+                                                      f"échéance de {self.slo:.0f}s dépassée"), "timeout"
+        if call.error is not None:
+            self.client.record_fallback()
+            return self._get_fallback_recommendations(query, context, student_level, str(call.error)), "error"
+        return self._format_output(call.result, query, student_level, time.time() - start_time), None
+
+    @staticmethod
+    def _remaining(deadline_at):
+        """Temps restant avant l'échéance (None : pas d'échéance)"""
+        if not math.isfinite(deadline_at):
+            return None
+        return max(0.0, deadline_at - time.perf_counter())
+
+    def _provisional(self, query, context, student_level) -> str:
+        with get_tracer().span("local_answer", backend="provisoire"):
+            return self.local.generate_recommendations(
+                query, context, student_level,
+                note=f"⏱️ L'IA n'a pas répondu en {self.slo:.0f}s : propositions provisoires tirées des archives, "
+                     "remplacées automatiquement dès l'arrivée de sa réponse."
+            )
+
+    def _store_late(self, future, context, student_level, query_embedding, start_time):
+        """Réponse du LLM arrivée après l'échéance : conservée pour les requêtes suivantes"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            result, data, _ = future.result()
+            if result:
+                self._store_cache(result, context, student_level, query_embedding, time.time() - start_time, data)
+        except Exception as e:
+            print(f"⚠️ Réponse tardive ignorée: {e}")
+
+    def _lookup_cache(self, query, context, student_level, query_embedding):
+        """(réponse formatée, objet structuré ou None) issue du cache sémantique, ou None"""
+        if query_embedding is None or self.response_cache is None:
+            return None
+        start_time = time.time()
+        with get_tracer().span("response_cache", backend="miss") as span:
+            cached = self.response_cache.lookup(query_embedding, student_level, [doc.get('id') for doc in context])
+            if cached is not None:
+                span['backend'] = "hit"
+        if cached is None:
+            return None
+        text = self._format_output(cached['response'], query, student_level, time.time() - start_time)
+        return text, cached.get('data')
+
+    def _store_cache(self, result, context, student_level, query_embedding, elapsed_time, data=None):
+        if query_embedding is not None and self.response_cache is not None:
+            self.response_cache.store(query_embedding, student_level, [doc.get('id') for doc in context],
+                                      result, elapsed_time, data=data)
+
+    def get_quota_stats(self) -> Dict:
+        """Télémétrie des quotas (requêtes, tokens, attente, 429) et compteurs de résilience"""
+        return self.client.get_stats()
+
+    def get_structured_stats(self) -> Dict:
+        """Mode JSON : réponses analysées, flux arrêtés dès l'objet complet, JSON invalides"""
+        return dict(self.structured_stats, enabled=self.structured)
+
+    def get_cascade_stats(self) -> Dict:
+        """Par modèle de la cascade : appels, réponses acceptées, escalades (échecs de structure), erreurs"""
+        return self.cascade_stats
+
+    def get_flight_stats(self) -> Dict:
+        """Requêtes regroupées : meneurs, requêtes rattachées, facteur de regroupement"""
+        return self.flights.get_stats()
+
+    def get_cache_stats(self) -> Dict:
+        return self.response_cache.get_stats() if self.response_cache is not None else {}
+
+    def _build_prompt(self, query, context, student_level) -> str:
+        """Contexte empaqueté + prompt (étape « prompt_build » des traces)"""
+        with get_tracer().span("prompt_build") as span:
+            # Titres par score décroissant, puis résumés compressés dans le budget restant
+            context_str, stats = self.context_packer.pack(context)
+            prompt = self._create_prompt(query, context_str, student_level)
+            span.update(chars=len(prompt), context_tokens=stats['tokens'])
+            return prompt
 
     def _create_prompt(self, query: str, context_str: str, student_level: str) -> str:
+        if self.structured:
+            output_format, answer = JSON_FORMAT_INSTRUCTIONS, "Réponse (JSON uniquement, textes en français) :"
+        else:
+            output_format, answer = MARKDOWN_FORMAT_INSTRUCTIONS, "Réponse (en français) :"
         return f"""Tu es le Professeur Virtuel de la FST, expert en méthodologie de recherche. 
 Ton objectif est de guider l'étudiant vers un sujet de mémoire INNOVANT, RÉALISABLE et ACADÉMIQUEMENT VALIDE.
 
@@ -77,37 +542,17 @@ Ton objectif est de guider l'étudiant vers un sujet de mémoire INNOVANT, RÉAL
 2. ÉVITEMENT DU PLAGIAT : Propose une ÉVOLUTION ou une VARIANTE des archives, jamais un titre identique.
 3. STRUCTURE : Chaque proposition doit inclure une problématique centrale.
 
-### FORMAT DE SORTIE (Markdown strict) :
-# 🎓 PROPOSITIONS DE RECHERCHE PERSONNALISÉES
+{output_format}
 
----
-## 🏆 Option 1 : [Titre Scientifique Précis]
-* **Problématique :** [Question scientifique résolue]
-* **Lien avec les archives :** [Pourquoi c'est une amélioration des anciens travaux]
-* **Méthodologie suggérée :** [Étude/Prototypage/Analyse]
-* **Mots-clés :** [3 mots techniques]
-
----
-## 🏆 Option 2 : [Titre Scientifique Précis]
-... (Répéter le format)
-
----
-## 🏆 Option 3 : [Titre Scientifique Précis]
-... (Répéter le format)
-
----
-## 💡 CONSEIL DU PROFESSEUR
-[Conseil sur la gestion du temps ou le choix du directeur]
-
-Réponse (en français) :"""
+{answer}"""
 
     def _format_output(self, response: str, query: str, level: str, time_taken: float) -> str:
-        header = f"""
----
-**Analyse pour :** {query} | **Niveau :** {level} | **Temps :** {time_taken:.1f}s
----
-"""
-        return header + response
+        return format_output(response, query, level, time_taken)
 
-    def _get_fallback_recommendations(self, query: str, student_level: str, error: str = "") -> str:
-        return f"# 🎓 PROPOSITIONS (MODE SECOURS)\n\nL'IA est indisponible ({error[:50]})...\n\n1. Étude de l'impact du numérique en Génie Civil\n2. Optimisation de réseaux locaux\n3. Analyse des systèmes automatisés."
\ No newline at end of file
+    def _get_fallback_recommendations(self, query: str, context: List[Dict], student_level: str, error: str = "") -> str:
+        """Propositions locales construites à partir des sujets retrouvés"""
+        with get_tracer().span("local_answer", backend="secours"):
+            return self.local.generate_recommendations(
+                query, context, student_level,
+                note=f"⚠️ IA indisponible ({error[:80]}) : propositions construites localement à partir des archives."
+            )
@@ -0,0 +1,286 @@
+# utils/resilience.py
+"""
+Résilience des appels au LLM : relances avec backoff exponentiel et gigue,
+requêtes doublées (hedging) au-delà du p95, disjoncteur (circuit breaker)
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Erreurs transitoires de l'API Google pour lesquelles une relance a un sens
+RETRYABLE_ERRORS = (
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "TimeoutError", "ConnectionError",
+)
+
+def is_retryable(error):
+    return type(error).__name__ in RETRYABLE_ERRORS or "429" in str(error) or "503" in str(error)
+
+class CircuitOpenError(RuntimeError):
+    """Le disjoncteur est ouvert : l'API est considérée indisponible"""
+
+class LatencyTracker:
+    """Fenêtre glissante des latences observées"""
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, q):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+class CircuitBreaker:
+    """
+    Fermé -> ouvert après failure_threshold échecs consécutifs ; ouvert -> semi-ouvert
+    après reset_timeout secondes : une requête d'essai décide de la réouverture ou non.
+    En semi-ouvert, les autres appels sont rejetés tant que l'essai est en cours
+    (un essai sans issue, ex. flux fermé avant le premier fragment, expire après reset_timeout).
+    """
+    CLOSED, OPEN, HALF_OPEN = "fermé", "ouvert", "semi-ouvert"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None  # début de la requête d'essai en cours (semi-ouvert)
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+                    return False
+            else:
+                return True
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_started = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class ResilientCaller:
+    """
+    Exécute un appel asynchrone avec échéance globale, relances (backoff exponentiel,
+    gigue complète), hedging (call uniquement) et disjoncteur. Compteurs par chemin emprunté.
+    """
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, deadline=30.0,
+                 hedge=True, breaker=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self.counters = {
+            'success': 0,         # succès au premier essai
+            'retried_success': 0, # succès après relance
+            'retries': 0,
+            'hedged': 0,          # requêtes doublées
+            'hedge_wins': 0,      # la requête doublée a répondu la première
+            'short_circuited': 0, # rejet immédiat, disjoncteur ouvert
+            'failures': 0,
+            'fallbacks': 0,       # réponses de secours servies par l'appelant
+        }
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def record_fallback(self):
+        self.counters['fallbacks'] += 1
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.counters['short_circuited'] += 1
+            raise CircuitOpenError("API indisponible (disjoncteur ouvert)")
+
+    @staticmethod
+    async def _admitted_call(factory, admit):
+        if admit is None:
+            return await factory()
+        async with admit():
+            return await factory()
+
+    async def _hedged(self, factory, admit=None):
+        """
+        Lance l'appel ; s'il dépasse le p95 observé, lance un doublon et garde le premier
+        Le doublon passe par admit (sa propre place de concurrence et ses quotas)
+        """
+        primary = asyncio.ensure_future(factory())
+        tasks = [primary]
+        try:
+            threshold = self.latencies.percentile(95) if self.hedge else None
+            if threshold is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done:
+                return primary.result()
+
+            self.counters['hedged'] += 1
+            backup = asyncio.ensure_future(self._admitted_call(factory, admit))
+            tasks.append(backup)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.counters['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Annule l'appel perdant (ou tous, si l'échéance a été atteinte)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @asynccontextmanager
+    async def _admitted(self, admit):
+        """Entrée dans admit() (concurrence, quotas) ; produit le temps d'attente"""
+        if admit is None:
+            yield 0.0
+            return
+        start = time.monotonic()
+        async with admit():
+            yield time.monotonic() - start
+
+    async def call(self, factory, admit=None):
+        """
+        factory : fonction sans argument retournant une coroutine (un essai)
+        admit : fonction retournant un gestionnaire de contexte asynchrone tenu pendant
+        chaque essai (place de concurrence, quotas) ; son attente ne compte ni dans
+        l'échéance ni pour le disjoncteur (celle du doublon d'un hedging reste dans l'échéance).
+        """
+        self._check_breaker()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        last_error = None
+        for attempt in range(self.max_attempts):
+            async with self._admitted(admit) as waited:
+                deadline += waited
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                start = loop.time()
+                try:
+                    result = await asyncio.wait_for(self._hedged(factory, admit), remaining)
+                except Exception as e:
+                    last_error = e
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                    self.latencies.add(loop.time() - start)
+                    self.counters['retried_success' if attempt else 'success'] += 1
+                    return result
+            # Échéance globale atteinte (ou erreur définitive) : pas de nouvelle tentative
+            delay = self.backoff(attempt)
+            if last_error is None or not self._should_retry(last_error, attempt, loop.time() + delay, deadline):
+                break
+            self.counters['retries'] += 1
+            await asyncio.sleep(delay)
+        self.counters['failures'] += 1
+        raise last_error if last_error is not None else asyncio.TimeoutError("échéance dépassée")
+
+    def _should_retry(self, error, attempt, retry_at, deadline):
+        return (is_retryable(error) and attempt < self.max_attempts - 1
+                and retry_at < deadline and self.breaker.allow())
+
+    async def stream(self, factory, admit=None):
+        """
+        Variante en flux : relance possible tant qu'aucun fragment n'a été transmis.
+        L'échéance borne l'attente du premier fragment comme la durée totale du flux.
+        Pas de hedging ni de suivi du p95 (réservés à call) : un flux commencé ne peut
+        pas être remplacé et sa durée dépend de la longueur de la réponse.
+        Un flux fermé par le lecteur après le premier fragment compte comme un succès.
+        """
+        self._check_breaker()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        for attempt in range(self.max_attempts):
+            started = finished = False
+            error = None
+            async with self._admitted(admit) as waited:
+                deadline += waited
+                chunks = factory()
+                try:
+                    while True:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError("échéance dépassée")
+                        try:
+                            item = await asyncio.wait_for(chunks.__anext__(), remaining)
+                        except StopAsyncIteration:
+                            finished = True
+                            break
+                        started = True
+                        yield item
+                except Exception as e:
+                    error = e
+                    self.breaker.record_failure()
+                finally:
+                    # Exécuté aussi quand le lecteur ferme le flux (aclose) ou l'annule
+                    await chunks.aclose()
+                    if error is None and (started or finished):
+                        self.breaker.record_success()
+                        self.counters['retried_success' if attempt else 'success'] += 1
+            if error is None:
+                return
+            delay = self.backoff(attempt)
+            if started or not self._should_retry(error, attempt, loop.time() + delay, deadline):
+                self.counters['failures'] += 1
+                raise error
+            self.counters['retries'] += 1
+            await asyncio.sleep(delay)
+
+    def get_stats(self):
+        p95 = self.latencies.percentile(95)
+        return dict(
+            self.counters,
+            circuit=self.breaker.state,
+            p95_s=round(p95, 2) if p95 is not None else None,
+        )
+
+_callers = {}
+_callers_lock = threading.Lock()
+
+def get_resilient_caller(model_name):
+    """
+    Politique de résilience partagée par modèle (LLM_DEADLINE_S, LLM_MAX_ATTEMPTS, LLM_HEDGE)
+    """
+    with _callers_lock:
+        if model_name not in _callers:
+            _callers[model_name] = ResilientCaller(
+                max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+                deadline=float(os.getenv("LLM_DEADLINE_S", "30")),
+                hedge=os.getenv("LLM_HEDGE", "true").lower() == "true"
+            )
+        return _callers[model_name]
@@ -0,0 +1,113 @@
+# utils/resources.py
+"""
+Composants lourds partagés (corpus, modèle d'embeddings, index, Gemma 3)
+Même séquence de chargement pour l'interface Streamlit et l'API HTTP
+"""
+import os
+from contextlib import contextmanager, nullcontext
+from utils.data_loader import load_subjects
+from utils.embeddings import EmbeddingManager
+from utils.ingestion import IngestionPipeline
+from utils.recommender import RecommenderSystem
+from utils.sparse_index import HybridBackend
+from utils.warmup import Warmup
+from utils.watcher import CorpusWatcher
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul processus, pas de verrou entre processus
+    fcntl = None
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "data", "sujets_memoires.csv")
+
+def load_corpus(csv_path):
+    """Charge le corpus (cache Parquet si disponible)"""
+    df = load_subjects(csv_path)
+    if df.empty:
+        raise ValueError("Base de données des sujets vide ou introuvable.")
+    return df
+
+# Verrous tenus jusqu'à la fin du processus (libérés par le système à sa sortie)
+_held_locks = {}
+
+@contextmanager
+def _build_lock(path):
+    """Verrou exclusif bloquant entre processus : une seule construction de l'index à la fois"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _try_writer_lock(path):
+    """Verrou exclusif non bloquant, conservé par le processus ; True si ce processus l'obtient"""
+    if fcntl is None or path in _held_locks:
+        return True
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _held_locks[path] = f
+    return True
+
+def build_index(embedding_manager, df, csv_path):
+    """
+    Ouvre la collection, la synchronise avec le CSV et démarre la surveillance
+    Base ChromaDB partagée (plusieurs workers) : le premier processus devient le
+    rédacteur (indexation et surveillance du CSV) ; les suivants attendent la fin
+    de sa construction et ouvrent la collection en lecture
+    """
+    writer = True
+    lock = nullcontext()
+    if embedding_manager.vector_backend == "chroma":
+        os.makedirs(embedding_manager.persist_directory, exist_ok=True)
+        lock = _build_lock(os.path.join(embedding_manager.persist_directory, "build.lock"))
+
+    with lock:
+        collection, created = embedding_manager.get_or_create_collection()
+        if embedding_manager.vector_backend == "chroma":
+            writer = _try_writer_lock(os.path.join(embedding_manager.persist_directory, "writer.lock"))
+        if created and writer:
+            # Indexation en flux (CSV -> lots d'embeddings -> ChromaDB)
+            IngestionPipeline(embedding_manager, collection).run(csv_path)
+        else:
+            # Index lexical BM25 construit depuis le corpus chargé (aucun réencodage)
+            if isinstance(collection, HybridBackend):
+                collection.index_sparse(
+                    df['id'].tolist(),
+                    df['texte_complet'].tolist(),
+                    df[['departement', 'niveau']].to_dict('records')
+                )
+            if writer:
+                # Seules les lignes ajoutées/modifiées/supprimées sont traitées
+                IngestionPipeline(embedding_manager, collection).sync(csv_path)
+            else:
+                print("📖 Index partagé construit par un autre worker : ouverture en lecture")
+
+    # Surveillance du CSV : resynchronisation en arrière-plan (rédacteur) ou rechargement du corpus
+    corpus = CorpusWatcher(csv_path, embedding_manager, collection, df=df, writer=writer).start()
+    return collection, corpus
+
+def create_warmup(api_key, csv_path=None, **recommender_options):
+    """
+    Déclare les composants (non démarrés) : chacun est chargé dans son propre thread
+    par Warmup.start ; l'index attend le modèle et le corpus
+    recommender_options : paramètres de RecommenderSystem (slo, models...)
+    """
+    csv_path = csv_path or DEFAULT_CSV_PATH
+    warmup = Warmup()
+    # 1. Chargement des données (CSV)
+    warmup.add("corpus", lambda: load_corpus(csv_path))
+    # 2. Modèle d'embeddings (chargement + encodage factice) puis index vectoriel
+    warmup.add("embeddings", lambda: EmbeddingManager().warm_up())
+    warmup.add("index", lambda em, df: build_index(em, df, csv_path), depends_on=("embeddings", "corpus"))
+    # 3. Recommender Gemma 3
+    warmup.add("recommender", lambda: RecommenderSystem(api_key=api_key, **recommender_options))
+    return warmup
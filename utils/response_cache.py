@@ -0,0 +1,98 @@
+# utils/response_cache.py
+"""
+Cache sémantique des réponses du LLM
+Une requête proche (similarité cosinus) d'une requête déjà traitée, au même niveau
+et avec les mêmes sujets de contexte, réutilise la réponse sans appel à l'API
+"""
+import threading
+import time
+import numpy as np
+
+class SemanticResponseCache:
+    """
+    Petit index vectoriel des requêtes passées (matrice float32 normalisée),
+    avec éviction LRU et expiration (TTL).
+    """
+    def __init__(self, threshold=0.95, maxsize=256, ttl=3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._matrix = None
+        self._entries = [None] * maxsize  # slot -> dict (niveau, contexte, réponse, ...)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.saved_latency_s = 0.0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    @staticmethod
+    def context_key(context_ids):
+        return tuple(sorted(str(i) for i in context_ids if i is not None))
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry['created'] > self.ttl
+
+    def lookup(self, embedding, student_level, context_ids):
+        """
+        Retourne l'entrée la plus proche (similarité >= seuil) ou None
+        """
+        query = self._normalize(embedding)
+        key = self.context_key(context_ids)
+        now = time.monotonic()
+        with self._lock:
+            self.lookups += 1
+            if self._matrix is None:
+                return None
+            slots = [
+                i for i, entry in enumerate(self._entries)
+                if entry is not None and entry['level'] == student_level
+                and entry['context'] == key and not self._expired(entry, now)
+            ]
+            if not slots:
+                return None
+            similarities = self._matrix[slots] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            entry = self._entries[slots[best]]
+            entry['last_used'] = now
+            self.hits += 1
+            self.saved_latency_s += entry['latency']
+            return dict(entry, similarity=float(similarities[best]))
+
+    def store(self, embedding, student_level, context_ids, response, latency, data=None):
+        """data : forme structurée de la réponse (mode JSON), conservée avec le texte"""
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            # Emplacement libre ou expiré, sinon le moins récemment utilisé
+            free = [i for i, e in enumerate(self._entries) if e is None or self._expired(e, now)]
+            if free:
+                slot = free[0]
+            else:
+                slot = min(range(self.maxsize), key=lambda i: self._entries[i]['last_used'])
+            self._matrix[slot] = vector
+            self._entries[slot] = {
+                'level': student_level,
+                'context': self.context_key(context_ids),
+                'response': response,
+                'data': data,
+                'latency': latency,
+                'created': now,
+                'last_used': now,
+            }
+
+    def get_stats(self):
+        return {
+            'entries': sum(e is not None for e in self._entries),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'saved_latency_s': round(self.saved_latency_s, 2),
+        }
@@ -0,0 +1,87 @@
+# utils/single_flight.py
+"""
+Regroupement des requêtes identiques en cours (single-flight)
+Quand plusieurs sessions lancent la même demande au même moment, un seul appel
+au LLM est effectué : les autres attendent et partagent son résultat
+"""
+import threading
+
+class InFlightCall:
+    """Appel en cours : le premier demandeur (meneur) publie le résultat ou l'erreur"""
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self._done = threading.Event()
+
+    def resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Attend le meneur ; retourne False si le délai est dépassé"""
+        return self._done.wait(timeout)
+
+class SingleFlight:
+    """
+    Table des appels en cours, indexée par clé.
+    acquire(key) -> (appel, est_meneur) ; le meneur doit appeler release(key, ...)
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'coalesced': 0}
+
+    def acquire(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+                return call, False
+            call = self._calls[key] = InFlightCall()
+            self.stats['leaders'] += 1
+            return call, True
+
+    def release(self, key, result=None, error=None):
+        """Publie le résultat du meneur et libère la clé (les appels suivants repartent à zéro)"""
+        with self._lock:
+            call = self._calls.pop(key, None)
+        if call is not None:
+            call.resolve(result, error)
+
+    def do(self, key, fn, timeout=None):
+        """Exécute fn() une seule fois pour tous les appels concurrents de même clé"""
+        call, leader = self.acquire(key)
+        if leader:
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(key, error=e)
+                raise
+            self.release(key, result=result)
+            return result
+        if not call.wait(timeout):
+            raise TimeoutError("délai dépassé en attente d'une requête identique")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self):
+        total = self.stats['leaders'] + self.stats['coalesced']
+        return dict(
+            self.stats,
+            in_flight=self.in_flight(),
+            fan_out=total / self.stats['leaders'] if self.stats['leaders'] else 1.0,
+        )
+
+# Table partagée par tout le processus (toutes les sessions Streamlit)
+_flights = SingleFlight()
+
+def get_single_flight():
+    return _flights
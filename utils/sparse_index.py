@@ -0,0 +1,205 @@
+# utils/sparse_index.py
+"""
+Index lexical BM25 (index inversé) et fusion avec la recherche dense (RRF)
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from utils.vector_backends import VectorBackend, matches_filter
+
+# Mots vides français + libellés des champs de texte_complet
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du elle elles en est et etre il ils je
+l la le les leur leurs lui ma mais me mes moi mon ne nos notre nous on ou par pas
+plus pour qu que qui s sa se ses son sont sur ta te tes toi ton tu un une vos votre
+vous y c j m n t sans entre vers chez afin ainsi etc
+titre resume departement niveau
+""".split())
+
+@lru_cache(maxsize=4096)
+def _normalize_token(token):
+    # Pluriels simples : "réseaux" -> "reseau", "canaux" -> "canal", "systèmes" -> "systeme"
+    if len(token) > 4 and token.endswith("eaux"):
+        return token[:-1]
+    if len(token) > 4 and token.endswith("aux"):
+        return token[:-3] + "al"
+    if len(token) > 3 and token[-1] in "sx" and token[-2] not in "su":
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    """
+    Tokenisation adaptée au français : minuscules, suppression des accents,
+    des mots vides et des marques de pluriel
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [
+        _normalize_token(token)
+        for token in re.findall(r"[a-z0-9]+", text)
+        if token not in STOPWORDS
+    ]
+
+class BM25Index:
+    """
+    Index inversé BM25 avec mises à jour incrémentales (ajout, remplacement, suppression).
+    Seules les listes de postings des termes de la requête sont parcourues.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # terme -> {id: fréquence}
+        self._doc_terms = {}                # id -> Counter des termes
+        self._doc_len = {}
+        self._total_len = 0
+        self._store = {}                    # id -> (document, métadonnées)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add(self, ids, documents, metadatas=None):
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                if doc_id in self._doc_len:
+                    self._remove_one(doc_id)
+                terms = Counter(tokenize(document))
+                for term, tf in terms.items():
+                    self._postings[term][doc_id] = tf
+                self._doc_terms[doc_id] = terms
+                length = sum(terms.values())
+                self._doc_len[doc_id] = length
+                self._total_len += length
+                self._store[doc_id] = (document, metadata or {})
+
+    def _remove_one(self, doc_id):
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        self._store.pop(doc_id, None)
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+
+    def get(self, doc_id):
+        """Retourne (document, métadonnées) d'un identifiant indexé"""
+        return self._store.get(doc_id)
+
+    def search(self, query, n_results=10, where=None):
+        """
+        Retourne la liste [(id, score)] des meilleurs documents pour la requête
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not terms or n_docs == 0:
+                return []
+            avg_len = self._total_len / n_docs
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            if where:
+                scores = {i: s for i, s in scores.items() if matches_filter(self._store[i][1], where)}
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fusionne plusieurs classements (listes d'identifiants) par Reciprocal Rank Fusion
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class HybridBackend(VectorBackend):
+    """
+    Combine un backend dense et un index BM25 : les écritures sont appliquées aux deux,
+    les requêtes textuelles sont fusionnées par RRF.
+    """
+    def __init__(self, dense, sparse=None, rrf_k=60, fetch_factor=3):
+        self.dense = dense
+        self.sparse = sparse if sparse is not None else BM25Index()
+        self.rrf_k = rrf_k
+        self.fetch_factor = fetch_factor
+        self.name = f"hybrid+{dense.name}"
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.dense.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.sparse.add(ids, documents, metadatas)
+
+    def delete(self, ids):
+        self.dense.delete(ids=ids)
+        self.sparse.remove(ids)
+
+    def list_ids(self):
+        return self.dense.list_ids()
+
+    def count(self):
+        return self.dense.count()
+
+    def count_matching(self, where):
+        return self.dense.count_matching(where)
+
+    def invalidate(self):
+        self.dense.invalidate()
+
+    def index_sparse(self, ids, documents, metadatas):
+        """Construit l'index BM25 à partir du corpus chargé (sans réencoder)"""
+        self.sparse.add(ids, documents, metadatas)
+
+    def query(self, query_embeddings, n_results=5, where=None, query_texts=None):
+        if not query_texts:
+            return self.dense.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+        fetch_k = max(n_results * self.fetch_factor, 10)
+        dense = self.dense.query(query_embeddings=query_embeddings, n_results=fetch_k, where=where)
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'scores': []}
+
+        for i, query_text in enumerate(query_texts):
+            dense_ids = dense['ids'][i]
+            dense_rows = {
+                doc_id: (dense['documents'][i][j], dense['metadatas'][i][j], dense['distances'][i][j])
+                for j, doc_id in enumerate(dense_ids)
+            }
+            sparse_ids = [doc_id for doc_id, _ in self.sparse.search(query_text, fetch_k, where)]
+            fused = reciprocal_rank_fusion([dense_ids, sparse_ids], k=self.rrf_k)[:n_results]
+
+            ids, documents, metadatas, distances, scores = [], [], [], [], []
+            for doc_id, score in fused:
+                if doc_id in dense_rows:
+                    document, metadata, distance = dense_rows[doc_id]
+                else:
+                    stored = self.sparse.get(doc_id)
+                    if stored is None:
+                        continue
+                    document, metadata = stored
+                    distance = None
+                ids.append(doc_id)
+                documents.append(document)
+                metadatas.append(metadata)
+                distances.append(distance)
+                scores.append(score)
+            results['ids'].append(ids)
+            results['documents'].append(documents)
+            results['metadatas'].append(metadatas)
+            results['distances'].append(distances)
+            results['scores'].append(scores)
+        return results
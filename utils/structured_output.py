@@ -0,0 +1,167 @@
+# utils/structured_output.py
+"""
+Recommandations structurées (JSON) : analyse incrémentale du flux et rendu
+Le modèle renvoie {"options": [...3 options...], "conseil": "..."} ; la génération
+peut s'arrêter dès que l'objet JSON est complet. L'objet est ensuite rendu
+au format Markdown habituel (affichage) ou en texte simple (PDF).
+"""
+import json
+import re
+
+OPTION_FIELDS = ("titre", "problematique", "lien_archives", "methodologie", "mots_cles")
+
+# Consigne de format ajoutée au prompt en mode structuré
+JSON_FORMAT_INSTRUCTIONS = """### FORMAT DE SORTIE (JSON strict, aucun texte avant ou après) :
+{"options": [
+  {"titre": "[Titre Scientifique Précis]",
+   "problematique": "[Question scientifique résolue]",
+   "lien_archives": "[Pourquoi c'est une amélioration des anciens travaux]",
+   "methodologie": "[Étude/Prototypage/Analyse]",
+   "mots_cles": ["[mot 1]", "[mot 2]", "[mot 3]"]}
+  (exactement 3 options, même structure)
+ ],
+ "conseil": "[Conseil sur la gestion du temps ou le choix du directeur]"}"""
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def _loads(text):
+    """json.loads tolérant aux virgules finales ; None si le texte reste invalide"""
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
+
+class IncrementalJSONParser:
+    """
+    Suit la structure du premier objet JSON du flux (chaînes, échappements, imbrication)
+    sans réanalyser le texte déjà lu. Les options terminées sont disponibles au fil
+    de l'eau ; complete passe à True à la fermeture de l'objet racine.
+    """
+    def __init__(self):
+        self.text = ""
+        self.options = []
+        self.data = None
+        self.complete = False
+        self._pos = 0
+        self._start = None
+        self._stack = []  # (caractère ouvrant, position)
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def started(self):
+        return self._start is not None
+
+    def feed(self, chunk):
+        """Ajoute un fragment ; retourne True quand l'objet racine est complet"""
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if self._start is None:
+                if c == "{":
+                    self._start = i
+                    self._stack.append((c, i))
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._stack.append((c, i))
+            elif c in "}]" and self._stack:
+                opener, position = self._stack.pop()
+                if c == "}" and len(self._stack) == 2 and self._stack[1][0] == "[":
+                    # Objet élément d'un tableau de l'objet racine : une option terminée
+                    option = _loads(text[position:i + 1])
+                    if isinstance(option, dict):
+                        self.options.append(option)
+                elif not self._stack:
+                    self.complete = True
+                    self._pos = i + 1
+                    self.data = self._finish(text[self._start:i + 1])
+                    return True
+        self._pos = len(text)
+        return False
+
+    def _finish(self, text):
+        data = _loads(text)
+        if not isinstance(data, dict):
+            # JSON racine invalide : on conserve les options lues au fil de l'eau
+            return {"options": self.options, "conseil": ""} if self.options else None
+        return data
+
+    def partial(self):
+        """Objet partiel (options terminées) pour l'affichage pendant la génération"""
+        if self.data is not None:
+            return self.data
+        return {"options": self.options, "conseil": ""}
+
+def parse_recommendation(text):
+    """Analyse une réponse complète ; retourne l'objet valide ou None"""
+    parser = IncrementalJSONParser()
+    parser.feed(text or "")
+    return parser.data if is_valid_recommendation(parser.data) else None
+
+def is_valid_recommendation(data, expected_options=3):
+    if not isinstance(data, dict):
+        return False
+    options = data.get("options")
+    if not isinstance(options, list) or len(options) < expected_options:
+        return False
+    return all(
+        isinstance(option, dict) and str(option.get("titre") or "").strip()
+        and str(option.get("problematique") or "").strip()
+        for option in options[:expected_options]
+    )
+
+def _keywords(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value if v)
+    return str(value or "")
+
+def render_markdown(data):
+    """Rendu au format Markdown du prompt (Option 1/2/3 + conseil)"""
+    sections = ["# 🎓 PROPOSITIONS DE RECHERCHE PERSONNALISÉES"]
+    for i, option in enumerate(data.get("options") or [], 1):
+        sections.append(f"""---
+## 🏆 Option {i} : {option.get('titre', '')}
+* **Problématique :** {option.get('problematique', '')}
+* **Lien avec les archives :** {option.get('lien_archives', '')}
+* **Méthodologie suggérée :** {option.get('methodologie', '')}
+* **Mots-clés :** {_keywords(option.get('mots_cles'))}""")
+    if data.get("conseil"):
+        sections.append(f"""---
+## 💡 CONSEIL DU PROFESSEUR
+{data['conseil']}""")
+    return "\n\n".join(sections)
+
+def response_header(text):
+    """En-tête d'une réponse formatée (requête, niveau, temps, note), avant le premier titre"""
+    header, separator, _ = (text or "").partition("\n# ")
+    return header if separator else ""
+
+def render_text(data, header=""):
+    """Rendu en texte simple (export PDF), précédé de l'en-tête de la réponse s'il est fourni"""
+    lines = [header.rstrip(), ""] if header.strip() else []
+    lines += ["PROPOSITIONS DE RECHERCHE PERSONNALISÉES", ""]
+    for i, option in enumerate(data.get("options") or [], 1):
+        lines += [
+            f"Option {i} : {option.get('titre', '')}",
+            f"  Problématique : {option.get('problematique', '')}",
+            f"  Lien avec les archives : {option.get('lien_archives', '')}",
+            f"  Méthodologie suggérée : {option.get('methodologie', '')}",
+            f"  Mots-clés : {_keywords(option.get('mots_cles'))}",
+            "",
+        ]
+    if data.get("conseil"):
+        lines += ["Conseil du professeur :", f"  {data['conseil']}"]
+    return "\n".join(lines)
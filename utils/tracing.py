@@ -0,0 +1,229 @@
+# utils/tracing.py
+"""
+Traçage des étapes du pipeline (spans) et export des métriques
+Chaque span est écrit dans un fichier JSONL à rotation (TRACE_FILE) et alimente
+un histogramme par étape et par backend, servi au format texte Prometheus
+sur un point d'accès local (METRICS_PORT, /metrics)
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+# Bornes des histogrammes (secondes)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class LatencyHistogram:
+    """Histogramme cumulatif (Prometheus) + fenêtre récente pour les quantiles p50/p95/p99"""
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1024):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds, error=False):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.errors += bool(error)
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Tracer:
+    """
+    Spans imbriqués (le parent est le span courant du contexte d'exécution),
+    écrits en JSONL et agrégés par (étape, backend)
+    """
+    def __init__(self, trace_file=None, max_bytes=5 * 1024 * 1024, backup_count=3, enabled=True):
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._logger = None
+        if enabled and trace_file:
+            try:
+                os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+                handler = RotatingFileHandler(trace_file, maxBytes=max_bytes, backupCount=backup_count,
+                                              encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger = logging.getLogger(f"traces.{trace_file}")
+                self._logger.handlers = [handler]
+                self._logger.setLevel(logging.INFO)
+                self._logger.propagate = False
+            except OSError as e:
+                print(f"⚠️ Fichier de traces indisponible ({trace_file}): {e}")
+
+    @staticmethod
+    def current():
+        """Span courant (dict) ou None"""
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Mesure le bloc ; les attributs peuvent être complétés pendant le span
+        (span['backend'] = ...). Le backend sert de label aux métriques.
+        """
+        if not self.enabled:
+            yield dict(attrs)
+            return
+        parent = _current_span.get()
+        span = dict(attrs)
+        span['_ids'] = self._ids(parent)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield span
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _current_span.reset(token)
+            ids = span.pop('_ids')
+            self._finish(name, time.perf_counter() - start, ids, span, error)
+
+    def record(self, name, seconds, parent=None, error=None, **attrs):
+        """Span déjà mesuré (générateurs, autre thread) ; parent par défaut : span courant"""
+        if not self.enabled:
+            return
+        parent = parent if parent is not None else _current_span.get()
+        self._finish(name, seconds, self._ids(parent), attrs, error)
+
+    @staticmethod
+    def _ids(parent):
+        if parent is None:
+            return {'trace_id': uuid.uuid4().hex, 'span_id': uuid.uuid4().hex[:16], 'parent_id': None}
+        ids = parent.get('_ids') or parent
+        return {'trace_id': ids['trace_id'], 'span_id': uuid.uuid4().hex[:16], 'parent_id': ids['span_id']}
+
+    def _finish(self, name, seconds, ids, attrs, error):
+        backend = str(attrs.get('backend') or "")
+        with self._lock:
+            histogram = self._histograms.get((name, backend))
+            if histogram is None:
+                histogram = self._histograms[(name, backend)] = LatencyHistogram()
+            histogram.observe(seconds, error is not None)
+        if self._logger is not None:
+            record = dict(ids, name=name, start=time.time() - seconds, duration_ms=round(seconds * 1000, 3),
+                          attrs=attrs)
+            if error is not None:
+                record['error'] = str(error)[:200]
+            try:
+                self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+            except Exception as e:
+                print(f"⚠️ Trace non écrite: {e}")
+
+    def get_stats(self):
+        """{(étape, backend): {'count', 'p50', 'p95', 'p99'}} en secondes"""
+        with self._lock:
+            return {
+                key: dict(
+                    count=h.count,
+                    errors=h.errors,
+                    **{f"p{int(q * 100)}": h.quantile(q) for q in QUANTILES}
+                )
+                for key, h in self._histograms.items()
+            }
+
+    def metrics_text(self):
+        """Exposition au format texte Prometheus"""
+        name = "recommender_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Durée des étapes du pipeline de recommandation",
+            f"# TYPE {name} histogram",
+        ]
+        quantile_lines, error_lines = [], []
+        with self._lock:
+            for (stage, backend), h in sorted(self._histograms.items()):
+                labels = f'stage="{_label(stage)}",backend="{_label(backend)}"'
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+                for q in QUANTILES:
+                    value = h.quantile(q)
+                    if value is not None:
+                        quantile_lines.append(f'{name}_quantile{{{labels},quantile="{q}"}} {value:.6f}')
+                error_lines.append(f"recommender_stage_errors_total{{{labels}}} {h.errors}")
+        lines += [
+            f"# HELP {name}_quantile p50/p95/p99 sur les {LatencyHistogram().recent.maxlen} dernières mesures",
+            f"# TYPE {name}_quantile gauge",
+        ] + quantile_lines
+        lines += [
+            "# HELP recommender_stage_errors_total Étapes terminées en erreur",
+            "# TYPE recommender_stage_errors_total counter",
+        ] + error_lines
+        return "\n".join(lines) + "\n"
+
+_tracer = None
+_tracer_lock = threading.Lock()
+_metrics_server = None
+
+def get_tracer():
+    """Traceur du processus (TRACING, TRACE_FILE : logs/traces.jsonl par défaut)"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(
+                trace_file=os.getenv("TRACE_FILE", "logs/traces.jsonl"),
+                enabled=os.getenv("TRACING", "true").lower() == "true"
+            )
+        return _tracer
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_tracer().metrics_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Sert /metrics dans un thread d'arrière-plan (METRICS_PORT, 9464 par défaut ; 0 : désactivé)
+    Un seul serveur par processus ; retourne None si le port est indisponible
+    """
+    global _metrics_server
+    port = int(port if port is not None else os.getenv("METRICS_PORT", "9464"))
+    with _tracer_lock:
+        if _metrics_server is not None or port == 0:
+            return _metrics_server
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"⚠️ Point d'accès des métriques indisponible (port {port}): {e}")
+            return None
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"📈 Métriques Prometheus : http://{host}:{port}/metrics")
+        return _metrics_server
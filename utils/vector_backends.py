@@ -0,0 +1,324 @@
+# utils/vector_backends.py
+"""
+Backends de recherche vectorielle : ChromaDB (persistant) ou NumPy (exact, en mémoire)
+"""
+import json
+import threading
+import numpy as np
+
+def matches_filter(metadata, where):
+    """
+    Évalue un filtre de métadonnées au format ChromaDB sur un dictionnaire
+    Opérateurs supportés : égalité, $eq, $ne, $in, $nin, $and, $or
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+    return True
+
+def empty_results(n_queries):
+    """Résultat vide au format ChromaDB (une ligne vide par requête)"""
+    return {'ids': [[] for _ in range(n_queries)], 'documents': [[] for _ in range(n_queries)],
+            'metadatas': [[] for _ in range(n_queries)], 'distances': [[] for _ in range(n_queries)]}
+
+class VectorBackend:
+    """Interface commune des backends vectoriels"""
+    name = "abstract"
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def list_ids(self):
+        """Itère sur tous les identifiants indexés"""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def count_matching(self, where):
+        """Nombre de documents satisfaisant le filtre (sélectivité)"""
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Oublie les statistiques en cache (collection modifiée par un autre processus)"""
+
+    def query(self, query_embeddings, n_results=5, where=None, query_texts=None):
+        """
+        Recherche des plus proches voisins
+        Retourne un dictionnaire au format ChromaDB (ids, documents, metadatas, distances)
+        query_texts n'est utilisé que par les backends hybrides (voir sparse_index)
+        """
+        raise NotImplementedError
+
+class ChromaBackend(VectorBackend):
+    """
+    Backend persistant s'appuyant sur une collection ChromaDB
+
+    Les filtres sont passés à ChromaDB. Quand un filtre est très sélectif, l'index HNSW
+    peut renvoyer moins de k résultats : on bascule alors sur un parcours exact des seuls
+    documents filtrés (exact_scan_threshold), sinon on sur-échantillonne progressivement.
+    """
+    name = "chroma"
+
+    def __init__(self, collection, exact_scan_threshold=2000, overfetch_factor=2):
+        self.collection = collection
+        self.exact_scan_threshold = exact_scan_threshold
+        self.overfetch_factor = overfetch_factor
+        self._match_counts = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.invalidate()
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._match_counts = {}
+
+    def list_ids(self, page_size=10000):
+        offset = 0
+        while True:
+            page = self.collection.get(include=[], limit=page_size, offset=offset)['ids']
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def count(self):
+        return self.collection.count()
+
+    def count_matching(self, where):
+        if not where:
+            return self.count()
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            if key not in self._match_counts:
+                self._match_counts[key] = len(self.collection.get(where=where, include=[])['ids'])
+            return self._match_counts[key]
+
+    def _exact_scan(self, query_embeddings, n_results, where):
+        """Parcours exact (distance L2 au carré, comme ChromaDB) des documents filtrés"""
+        candidates = self.collection.get(where=where, include=["embeddings", "documents", "metadatas"])
+        if not candidates['ids']:
+            return empty_results(len(query_embeddings))
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        matrix = np.asarray(candidates['embeddings'], dtype=np.float32).reshape(len(candidates['ids']), -1)
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            distances = ((matrix - query) ** 2).sum(axis=1)
+            top = np.argsort(distances)[:n_results]
+            results['ids'].append([candidates['ids'][i] for i in top])
+            results['documents'].append([candidates['documents'][i] for i in top])
+            results['metadatas'].append([candidates['metadatas'][i] for i in top])
+            results['distances'].append(distances[top].tolist())
+        return results
+
+    def query(self, query_embeddings, n_results=5, where=None, query_texts=None):
+        if not where:
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+        matching = self.count_matching(where)
+        if matching == 0:
+            # Aucun document ne satisfait le filtre (ex. niveau absent du corpus)
+            return empty_results(len(query_embeddings))
+        if matching <= self.exact_scan_threshold:
+            return self._exact_scan(query_embeddings, n_results, where)
+
+        fetch_k = n_results * self.overfetch_factor
+        while True:
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=min(fetch_k, matching),
+                where=where
+            )
+            if min(len(ids) for ids in results['ids']) >= n_results or fetch_k >= matching:
+                break
+            fetch_k *= self.overfetch_factor
+        # Les résultats sur-échantillonnés sont ramenés à k
+        for key in ('ids', 'documents', 'metadatas', 'distances'):
+            if results.get(key) is not None:
+                results[key] = [row[:n_results] for row in results[key]]
+        return results
+
+class NumpyBackend(VectorBackend):
+    """
+    Recherche exacte en mémoire : une matrice float32 contiguë de vecteurs normalisés,
+    un produit matrice-vecteur par requête et argpartition pour le top-k.
+    Les distances retournées sont des distances cosinus (1 - similarité).
+    """
+    name = "numpy"
+
+    def __init__(self, dim=None, initial_capacity=1024):
+        self.dim = dim
+        self._capacity = initial_capacity
+        self._matrix = None
+        self._size = 0
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._rows = {}        # id -> ligne
+        self._columns = {}     # cache colonnaire des métadonnées (pour les filtres)
+        self._lock = threading.RLock()
+
+    def _ensure_capacity(self, needed):
+        if self._matrix is None:
+            self._capacity = max(self._capacity, needed)
+            self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        elif needed > self._capacity:
+            while self._capacity < needed:
+                self._capacity *= 2
+            matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = self._normalize(embeddings)
+        if len(ids) == 0:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            self._ensure_capacity(self._size + len(ids))
+            for doc_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata or {})
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata or {}
+                self._matrix[row] = vector
+            self._columns = {}
+
+    def delete(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    # La dernière ligne prend la place de la ligne supprimée
+                    self._matrix[row] = self._matrix[last]
+                    self._ids[row] = self._ids[last]
+                    self._documents[row] = self._documents[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._documents.pop()
+                self._metadatas.pop()
+                self._size -= 1
+            self._columns = {}
+
+    def list_ids(self):
+        with self._lock:
+            return list(self._ids)
+
+    def count(self):
+        return self._size
+
+    def count_matching(self, where):
+        # Le filtre est déjà appliqué avant le produit matriciel (parcours exact)
+        with self._lock:
+            return int(self._mask(where).sum()) if where else self._size
+
+    def _column(self, key):
+        column = self._columns.get(key)
+        if column is None:
+            column = np.array([m.get(key) for m in self._metadatas], dtype=object)
+            self._columns[key] = column
+        return column
+
+    def _mask(self, where):
+        """Évaluation vectorisée d'un filtre ChromaDB sur les colonnes de métadonnées"""
+        mask = np.ones(self._size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._mask(sub)
+            elif key == "$or":
+                any_mask = np.zeros(self._size, dtype=bool)
+                for sub in condition:
+                    any_mask |= self._mask(sub)
+                mask &= any_mask
+            else:
+                column = self._column(key)
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for op, operand in condition.items():
+                    if op == "$eq":
+                        mask &= column == operand
+                    elif op == "$ne":
+                        mask &= column != operand
+                    elif op == "$in":
+                        mask &= np.isin(column, list(operand))
+                    elif op == "$nin":
+                        mask &= ~np.isin(column, list(operand))
+                    else:
+                        raise ValueError(f"Opérateur de filtre non supporté: {op}")
+        return mask
+
+    def query(self, query_embeddings, n_results=5, where=None, query_texts=None):
+        if self._matrix is None or self._size == 0:
+            # Index encore vide : aucun vecteur (ni dimension) connu
+            return empty_results(len(query_embeddings))
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        queries = self._normalize(query_embeddings)
+        with self._lock:
+            if self._size == 0:
+                candidates = np.empty(0, dtype=np.int64)
+            elif where:
+                candidates = np.flatnonzero(self._mask(where))
+            else:
+                candidates = None
+            matrix = self._matrix[:self._size] if candidates is None else self._matrix[candidates]
+
+            for query in queries:
+                scores = matrix @ query
+                k = min(n_results, len(scores))
+                if k == 0:
+                    top = np.empty(0, dtype=np.int64)
+                else:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    top = top[np.argsort(-scores[top])]
+                rows = top if candidates is None else candidates[top]
+                results['ids'].append([self._ids[r] for r in rows])
+                results['documents'].append([self._documents[r] for r in rows])
+                results['metadatas'].append([self._metadatas[r] for r in rows])
+                results['distances'].append((1.0 - scores[top]).tolist())
+        return results
@@ -0,0 +1,190 @@
+# utils/vector_cache.py
+"""
+Cache persistant des embeddings, adressé par (modèle, hash du texte)
+Les vecteurs sont stockés en fragments .npy ouverts en mémoire mappée
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+
+def text_hash(text):
+    """Empreinte SHA-1 d'un texte"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    Cache d'embeddings partagé entre processus.
+
+    Chaque écriture produit un nouveau fragment immuable (vecteurs .npy + clés .json).
+    Les fragments sont lus en mmap : plusieurs processus peuvent les partager en
+    lecture seule sans copier les vecteurs en RAM. Au-delà de max_shards fragments,
+    ils sont compactés en un seul (nombre de fichiers ouverts borné).
+    """
+    def __init__(self, model_name, cache_dir="embedding_cache", read_only=False, max_shards=16):
+        self.model_name = model_name
+        self.read_only = read_only
+        # Au-delà de max_shards fragments, ils sont fusionnés en un seul (un mmap, un fd par fragment)
+        self.max_shards = max_shards
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.directory = os.path.join(cache_dir, slug)
+        self.hits = 0
+        self.misses = 0
+        self._shards = []       # matrices mmap
+        self._shard_names = set()
+        self._index = {}        # hash -> (fragment, ligne)
+        self._dir_mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _complete_shards(self):
+        """Noms des fragments complets (le fichier de clés est écrit en dernier)"""
+        return sorted(name[:-len(".keys.json")] for name in os.listdir(self.directory)
+                      if name.endswith(".keys.json"))
+
+    def refresh(self, force=False):
+        """
+        Charge les fragments écrits depuis le dernier appel (par ce processus ou un autre)
+        Sans changement du dossier (mtime), aucune relecture ; si des fragments ont été
+        fusionnés par un compactage, l'index est reconstruit (les anciens mmap sont libérés)
+        """
+        if not os.path.isdir(self.directory):
+            return
+        with self._lock:
+            mtime = os.stat(self.directory).st_mtime_ns
+            # mtime récent : une écriture de la même tic d'horloge a pu passer inaperçue
+            if not force and mtime == self._dir_mtime and time.time_ns() - mtime > 2_000_000_000:
+                return
+            self._dir_mtime = mtime
+            names = self._complete_shards()
+            if not self._shard_names.issubset(names):
+                self._shards, self._shard_names, self._index = [], set(), {}
+            for shard_name in names:
+                if shard_name in self._shard_names:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, shard_name + ".keys.json"), 'r', encoding='utf-8') as f:
+                        keys = json.load(f)
+                    vectors = np.load(os.path.join(self.directory, shard_name + ".npy"), mmap_mode='r')
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ Fragment de cache ignoré ({shard_name}): {e}")
+                    continue
+                shard_idx = len(self._shards)
+                self._shards.append(vectors)
+                self._shard_names.add(shard_name)
+                for row, key in enumerate(keys):
+                    self._index.setdefault(key, (shard_idx, row))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get_many(self, keys):
+        """
+        Retourne la liste des vecteurs trouvés (None pour les absents)
+        """
+        if any(key not in self._index for key in keys):
+            self.refresh()
+        vectors = []
+        # Verrou : un compactage peut reconstruire l'index et la liste des fragments
+        with self._lock:
+            for key in keys:
+                location = self._index.get(key)
+                if location is None:
+                    self.misses += 1
+                    vectors.append(None)
+                else:
+                    self.hits += 1
+                    shard_idx, row = location
+                    vectors.append(self._shards[shard_idx][row])
+        return vectors
+
+    def put_many(self, keys, vectors):
+        """
+        Ajoute un fragment contenant les vecteurs qui ne sont pas encore en cache
+        """
+        if self.read_only:
+            return
+        fresh = {}
+        for key, vector in zip(keys, vectors):
+            if key not in self._index:
+                fresh.setdefault(key, vector)
+        if not fresh:
+            return
+        try:
+            self._write_shard(list(fresh), np.asarray(list(fresh.values()), dtype=np.float32))
+        except OSError as e:
+            print(f"⚠️ Écriture du cache d'embeddings impossible: {e}")
+            return
+        self.refresh(force=True)
+        if len(self._shards) > self.max_shards:
+            self.compact()
+
+    def _write_shard(self, keys, matrix):
+        """Écrit un fragment (vecteurs puis clés, chacun par renommage atomique)"""
+        os.makedirs(self.directory, exist_ok=True)
+        shard_name = f"shard_{time.time_ns()}_{os.getpid()}"
+        base = os.path.join(self.directory, shard_name)
+        with open(base + ".npy.tmp", 'wb') as f:
+            np.save(f, matrix)
+        os.replace(base + ".npy.tmp", base + ".npy")
+        with open(base + ".keys.json.tmp", 'w', encoding='utf-8') as f:
+            json.dump(keys, f)
+        os.replace(base + ".keys.json.tmp", base + ".keys.json")
+        return shard_name
+
+    def compact(self):
+        """
+        Fusionne les fragments connus en un seul puis supprime les anciens
+        Un seul processus compacte à la fois (fichier verrou) ; les fragments écrits
+        pendant le compactage par d'autres processus sont conservés
+        """
+        if self.read_only:
+            return False
+        lock_path = os.path.join(self.directory, "compact.lock")
+        try:
+            if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > 300:
+                os.remove(lock_path)  # verrou abandonné par un processus interrompu
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            return False
+        try:
+            with self._lock:
+                merged = list(self._shard_names)
+                keys = list(self._index)
+                matrix = np.asarray([self._shards[i][row] for i, row in self._index.values()], dtype=np.float32)
+            self._write_shard(keys, matrix)
+            for shard_name in merged:
+                # Clés d'abord : un lecteur concurrent ne voit jamais un fragment à moitié supprimé
+                for suffix in (".keys.json", ".npy"):
+                    try:
+                        os.remove(os.path.join(self.directory, shard_name + suffix))
+                    except OSError:
+                        pass  # Windows : fragment encore ouvert ailleurs, supprimé au prochain compactage
+            print(f"🗜️ Cache d'embeddings compacté : {len(merged)} fragments → 1 ({len(keys)} vecteurs)")
+            return True
+        except OSError as e:
+            print(f"⚠️ Compactage du cache d'embeddings impossible: {e}")
+            return False
+        finally:
+            os.close(fd)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            self.refresh(force=True)
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._index),
+            'shards': len(self._shards),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,114 @@
+# utils/warmup.py
+"""
+Chargement des composants lourds en arrière-plan (modèle, index, LLM)
+"""
+import threading
+import time
+
+# Budget de démarrage à froid : délai cible pour que tous les composants soient prêts
+COLD_START_BUDGET_S = 20.0
+
+PENDING, LOADING, READY, FAILED = "en attente", "chargement", "prêt", "échec"
+
+class _Component:
+    def __init__(self, name, loader, depends_on):
+        self.name = name
+        self.loader = loader
+        self.depends_on = tuple(depends_on)
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.seconds = None
+        self.done = threading.Event()
+
+class Warmup:
+    """
+    Lance le chargement de chaque composant dans un thread dédié.
+    Un composant reçoit en arguments les résultats de ses dépendances.
+    """
+    def __init__(self, budget_s=COLD_START_BUDGET_S):
+        self.budget_s = budget_s
+        self.components = {}
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add(self, name, loader, depends_on=()):
+        self.components[name] = _Component(name, loader, depends_on)
+        return self
+
+    def _run(self, component):
+        for dependency in component.depends_on:
+            self.components[dependency].done.wait()
+        dependencies = [self.components[d] for d in component.depends_on]
+        failed = [d.name for d in dependencies if d.state != READY]
+        start = time.perf_counter()
+        if failed:
+            component.state = FAILED
+            component.error = f"dépendance indisponible: {', '.join(failed)}"
+        else:
+            component.state = LOADING
+            try:
+                component.result = component.loader(*[d.result for d in dependencies])
+                component.state = READY
+            except Exception as e:
+                print(f"❌ Échec du chargement de '{component.name}': {e}")
+                component.error = str(e)
+                component.state = FAILED
+        component.seconds = time.perf_counter() - start
+        component.done.set()
+        self._check_finished()
+
+    def _check_finished(self):
+        with self._lock:
+            if self.finished_at is None and all(c.done.is_set() for c in self.components.values()):
+                self.finished_at = time.perf_counter()
+                report = self.report()
+                flag = "✅" if report['within_budget'] else "⚠️"
+                print(f"⏱️ Démarrage à froid: {report['cold_start_s']:.1f}s (budget {self.budget_s:.0f}s) {flag}")
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        for component in self.components.values():
+            threading.Thread(target=self._run, args=(component,), name=f"warmup-{component.name}", daemon=True).start()
+        return self
+
+    def result(self, name):
+        return self.components[name].result
+
+    def is_ready(self, *names):
+        names = names or tuple(self.components)
+        return all(self.components[n].state == READY for n in names)
+
+    def is_done(self):
+        return all(c.done.is_set() for c in self.components.values())
+
+    def failures(self):
+        return {c.name: c.error for c in self.components.values() if c.state == FAILED}
+
+    def wait(self, *names, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in names or tuple(self.components):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self.components[name].done.wait(remaining):
+                return False
+        return self.is_ready(*names)
+
+    def status(self):
+        return {
+            c.name: {'state': c.state, 'seconds': c.seconds, 'error': c.error}
+            for c in self.components.values()
+        }
+
+    def report(self):
+        """Temps de démarrage à froid comparé au budget"""
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return {
+            'cold_start_s': elapsed,
+            'budget_s': self.budget_s,
+            'within_budget': elapsed <= self.budget_s,
+            'done': self.finished_at is not None
+        }
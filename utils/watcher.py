@@ -0,0 +1,119 @@
+# utils/watcher.py
+"""
+Surveillance du CSV des sujets et réindexation incrémentale en arrière-plan
+"""
+import os
+import threading
+import time
+from utils.data_loader import load_subjects, build_subject_index
+from utils.ingestion import IngestionPipeline
+from utils.sparse_index import HybridBackend
+
+class CorpusWatcher:
+    """
+    Surveille le fichier CSV et synchronise la collection à chaque modification.
+
+    La version courante du corpus (DataFrame + index id -> sujet) est remplacée
+    d'un seul bloc une fois la synchronisation terminée : les lecteurs voient
+    toujours soit l'ancienne version complète, soit la nouvelle.
+
+    writer : ce processus synchronise la collection partagée ; sinon (autres workers
+    de l'API) seuls le corpus en mémoire et l'index BM25 local sont rechargés
+    """
+    def __init__(self, csv_path, embedding_manager, collection, df=None, interval=2.0, writer=True):
+        self.csv_path = csv_path
+        self.embedding_manager = embedding_manager
+        self.collection = collection
+        self.writer = writer
+        self.interval = interval
+        self.version = 0
+        self.last_sync = None
+        df = df if df is not None else load_subjects(csv_path)
+        self._current = (df, build_subject_index(df))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._file_signature()
+
+    def snapshot(self):
+        """Version courante du corpus : (DataFrame, index id -> sujet)"""
+        return self._current
+
+    @property
+    def df(self):
+        return self._current[0]
+
+    @property
+    def subjects(self):
+        return self._current[1]
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.csv_path)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def refresh(self):
+        """
+        Synchronise la collection avec le CSV puis publie la nouvelle version du corpus
+        """
+        with self._lock:
+            try:
+                if self.writer:
+                    pipeline = IngestionPipeline(self.embedding_manager, self.collection)
+                    result = pipeline.sync(self.csv_path)
+                df = load_subjects(self.csv_path)
+                if df.empty:
+                    print("⚠️ CSV vide ou illisible, version courante conservée")
+                    return None
+                if not self.writer:
+                    result = self._refresh_sparse(df)
+                # Remplacement atomique de la référence
+                self._current = (df, build_subject_index(df))
+                self.version += 1
+                self.last_sync = dict(result, version=self.version, timestamp=time.time())
+                return self.last_sync
+            except Exception as e:
+                print(f"❌ Erreur lors de la synchronisation: {e}")
+                return None
+
+    def _refresh_sparse(self, df):
+        """Lecteur : la collection est synchronisée par le rédacteur, seul l'index BM25 local suit le CSV"""
+        previous_ids = set(self.df['id'])
+        removed_ids = list(previous_ids - set(df['id']))
+        # Nombre de documents par filtre : recalculé depuis la collection mise à jour
+        self.collection.invalidate()
+        if isinstance(self.collection, HybridBackend):
+            self.collection.sparse.remove(removed_ids)
+            self.collection.index_sparse(
+                df['id'].tolist(),
+                df['texte_complet'].tolist(),
+                df[['departement', 'niveau']].to_dict('records')
+            )
+        return {'added': len(set(df['id']) - previous_ids), 'removed': len(removed_ids)}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.writer:
+                # Le rédacteur peut finir sa synchronisation après notre rechargement :
+                # les comptes par filtre (sélectivité) ne vivent qu'un intervalle
+                self.collection.invalidate()
+            signature = self._file_signature()
+            if signature is not None and signature != self._signature:
+                self._signature = signature
+                print(f"👀 Modification détectée: {self.csv_path}")
+                self.refresh()
+
+    def start(self):
+        """Démarre la surveillance dans un thread d'arrière-plan"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="corpus-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)